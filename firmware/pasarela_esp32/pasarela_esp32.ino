@@ -8,6 +8,11 @@
 const char* ssid = "mapache_test"; // Nombre del Punto de Acceso Wi-Fi
 const int pinLedAzul = 2;                 // Pin donde está conectado el LED azul (GPIO2)
 
+// Pines de los ambientes de la maqueta (mismo orden que AMBIENTES_ESP32 en control_red.py)
+const char* nombresAmbientes[] = {"descanso", "cocina", "principal", "cochera", "habitacion"};
+const int pinesAmbientes[] = {23, 22, 5, 4, 15};
+const int NUM_AMBIENTES = 5;
+
 // Configuración de la dirección IP estática del servidor
 IPAddress ipLocal(192, 168, 4, 1);    // IP estática del ESP32
 IPAddress gateway(192, 168, 4, 1);    // La puerta de enlace es la misma IP
@@ -38,6 +43,98 @@ void handleLedOff() {
   server.send(200, "text/plain", "LED apagado correctamente.");
 }
 
+/**
+ * @brief Aplica una acción ("on"/"off") sobre un ambiente o sobre "todas".
+ * @return true si el lugar y la acción son válidos.
+ */
+bool aplicarAccion(const String& lugar, const String& accion) {
+  if (accion != "on" && accion != "off") return false;
+  int valor = (accion == "on") ? HIGH : LOW;
+
+  if (lugar == "todas") {
+    for (int i = 0; i < NUM_AMBIENTES; i++) digitalWrite(pinesAmbientes[i], valor);
+    return true;
+  }
+  for (int i = 0; i < NUM_AMBIENTES; i++) {
+    if (lugar == nombresAmbientes[i]) {
+      digitalWrite(pinesAmbientes[i], valor);
+      return true;
+    }
+  }
+  return false;
+}
+
+/**
+ * @brief Enciende el LED azul si algún ambiente está encendido (indicador de depuración).
+ */
+void actualizarLedDebug() {
+  bool algunEncendido = false;
+  for (int i = 0; i < NUM_AMBIENTES; i++) {
+    if (digitalRead(pinesAmbientes[i]) == HIGH) {
+      algunEncendido = true;
+      break;
+    }
+  }
+  digitalWrite(pinLedAzul, algunEncendido ? HIGH : LOW);
+}
+
+/**
+ * @brief Maneja /control?lugar=cocina&accion=on (una acción por petición).
+ * Responde 400 si el lugar o la acción no son válidos (el sketch anterior respondía 200).
+ */
+void handleControl() {
+  String lugar = server.arg("lugar");
+  String accion = server.arg("accion");
+  bool ok = aplicarAccion(lugar, accion);
+  Serial.println("Peticion /control: " + lugar + " -> " + accion + (ok ? "" : " (invalida)"));
+  actualizarLedDebug();
+  server.send(ok ? 200 : 400, "text/plain", ok ? "OK" : "ERROR");
+}
+
+/**
+ * @brief Maneja /control/batch?cmds=cocina:on,cochera:off (N acciones por petición).
+ * Responde con el resultado de cada par en el mismo orden: "cocina:OK,cochera:OK".
+ */
+void handleControlBatch() {
+  String cmds = server.arg("cmds");
+  if (cmds.length() == 0) {
+    server.send(400, "text/plain", "Falta el parametro cmds");
+    return;
+  }
+
+  String respuesta = "";
+  int inicio = 0;
+  while (inicio < (int)cmds.length()) {
+    int fin = cmds.indexOf(',', inicio);
+    if (fin < 0) fin = cmds.length();
+    String par = cmds.substring(inicio, fin);
+    int separador = par.indexOf(':');
+    String lugar = (separador > 0) ? par.substring(0, separador) : par;
+    bool ok = (separador > 0) && aplicarAccion(lugar, par.substring(separador + 1));
+
+    if (respuesta.length() > 0) respuesta += ",";
+    respuesta += lugar + (ok ? ":OK" : ":ERROR");
+    inicio = fin + 1;
+  }
+
+  Serial.println("Peticion /control/batch: " + respuesta);
+  actualizarLedDebug();
+  server.send(200, "text/plain", respuesta);
+}
+
+/**
+ * @brief Maneja /estado: estado real de cada ambiente, "descanso:on,cocina:off,...".
+ * Lo consulta periódicamente el reconciliador de la sombra de estado del servidor.
+ */
+void handleEstado() {
+  String respuesta = "";
+  for (int i = 0; i < NUM_AMBIENTES; i++) {
+    if (i > 0) respuesta += ",";
+    respuesta += String(nombresAmbientes[i]) + (digitalRead(pinesAmbientes[i]) == HIGH ? ":on" : ":off");
+  }
+  server.send(200, "text/plain", respuesta);
+}
+
 /**
  * @brief Maneja las peticiones a la raíz del servidor.
  * Sirve para verificar que el servidor está activo.
@@ -75,6 +172,10 @@ void setup() {
   // 2. Configurar el pin del LED como salida
   pinMode(pinLedAzul, OUTPUT);
   digitalWrite(pinLedAzul, LOW); // Asegurarse de que el LED empieza apagado
+  for (int i = 0; i < NUM_AMBIENTES; i++) {
+    pinMode(pinesAmbientes[i], OUTPUT);
+    digitalWrite(pinesAmbientes[i], LOW); // Fuerza el apagado inicial
+  }
 
   // 3. Configurar y levantar el Punto de Acceso (Access Point)
   Serial.print("Configurando punto de acceso...");
@@ -93,6 +194,9 @@ void setup() {
   server.on("/", HTTP_GET, handleRoot);
   server.on("/led/on", HTTP_GET, handleLedOn);
   server.on("/led/off", HTTP_GET, handleLedOff);
+  server.on("/control", HTTP_GET, handleControl);
+  server.on("/control/batch", HTTP_GET, handleControlBatch);
+  server.on("/estado", HTTP_GET, handleEstado);
   server.onNotFound(handleNotFound);
 
   // 5. Iniciar el servidor web
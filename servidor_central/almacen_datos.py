@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo para el registro persistente de lecturas de sensores y comandos ejecutados.
+
+Las muestras y los resultados se acumulan en memoria (colas de solo-añadir, O(1), con
+un cerrojo que solo se retiene lo que dura el append) y un hilo escritor los vuelca por
+lotes a SQLite en modo WAL. Así ni el hilo serial ni las peticiones HTTP esperan al disco, y las consultas
+por rango de tiempo (indexadas) pueden leer mientras se escribe.
+"""
+
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+# --- Constantes de Configuración del Almacén ---
+RUTA_BASE_DATOS = os.environ.get("WASI_RUTA_BASE_DATOS",
+                                 os.path.join(os.path.dirname(os.path.abspath(__file__)), "registro_wasi.db"))
+INTERVALO_VOLCADO = 1.0          # Segundos entre volcados a disco
+MAX_PENDIENTES = 100_000         # Si el disco se atasca se descartan las muestras más antiguas
+RETENCION_DIAS = 30
+INTERVALO_RETENCION = 3600       # Segundos entre pasadas de limpieza/compactación
+MAX_FILAS_CONSULTA = 10_000
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS muestras (
+    ts REAL NOT NULL,
+    gas INTEGER,
+    temp REAL,
+    hum REAL,
+    distancia INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_muestras_ts ON muestras(ts);
+CREATE TABLE IF NOT EXISTS comandos (
+    ts REAL NOT NULL,
+    origen TEXT,
+    comando TEXT,
+    lugar TEXT,
+    accion TEXT,
+    exito INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_comandos_ts ON comandos(ts);
+"""
+
+
+class AlmacenDatos:
+    """
+    Registro de solo-añadir con escritura diferida por lotes a SQLite (WAL).
+    """
+
+    def __init__(self, ruta=RUTA_BASE_DATOS):
+        self.ruta = ruta
+        self._muestras = deque(maxlen=MAX_PENDIENTES)
+        self._comandos = deque(maxlen=MAX_PENDIENTES)
+        self._detener = threading.Event()
+        self._lock = threading.Lock()
+        self._lock_colas = threading.Lock()  # Encolar y devolver un lote deben ser atómicos
+        self._hilo = None
+
+        self.muestras_escritas = 0
+        self.comandos_escritos = 0
+        self.lotes = 0
+        self.lotes_fallidos = 0
+        self.filas_descartadas = 0
+        self.ultimo_volcado_ms = None
+        self.error = None
+        # El esquema existe desde el principio: consultar antes de iniciar() no falla
+        self._crear_esquema()
+
+    def _conectar(self):
+        conexion = sqlite3.connect(self.ruta, timeout=10)
+        conexion.execute("PRAGMA journal_mode=WAL")
+        # En WAL, NORMAL solo arriesga la última transacción ante un corte de luz
+        conexion.execute("PRAGMA synchronous=NORMAL")
+        return conexion
+
+    def _crear_esquema(self):
+        try:
+            conexion = sqlite3.connect(self.ruta)
+            try:
+                # auto_vacuum solo tiene efecto al crear la base; permite devolver espacio sin VACUUM completo
+                conexion.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                conexion.executescript(_ESQUEMA)
+            finally:
+                conexion.close()
+        except sqlite3.Error as e:
+            self.error = str(e)
+            print(f"[ALMACEN] No se pudo crear el esquema en {self.ruta}: {e}")
+            return False
+        return True
+
+    def iniciar(self):
+        """Arranca el hilo escritor (idempotente); reintenta el esquema si falló al crearse."""
+        with self._lock:
+            if self._hilo is not None:
+                return
+            if self.error is not None and self._crear_esquema():
+                self.error = None
+            self._hilo = threading.Thread(target=self._bucle_escritor, daemon=True)
+            self._hilo.start()
+            atexit.register(self.detener)
+
+    # --- Registro (llamado desde el hilo serial y las peticiones) ---
+
+    def _encolar(self, cola, fila):
+        with self._lock_colas:
+            if len(cola) == cola.maxlen:
+                self.filas_descartadas += 1  # El append expulsa la más antigua
+            cola.append(fila)
+
+    def registrar_muestra(self, instante, lecturas):
+        """Encola los campos de una línea serial (solo un append a memoria)."""
+        self._encolar(self._muestras, (instante, lecturas.get('gas'), lecturas.get('temp'),
+                                       lecturas.get('hum'), lecturas.get('distancia')))
+
+    def registrar_comando(self, origen, comando, resultados):
+        """
+        Encola el resultado de un comando.
+
+        Args:
+            origen (str): 'texto', 'voz', 'manual'...
+            comando (str): Texto de la orden (o descripción de la acción manual).
+            resultados (list): Lista de {'accion', 'lugar', 'exito'}; vacía si no se ejecutó nada.
+        """
+        instante = time.time()
+        if not resultados:
+            self._encolar(self._comandos, (instante, origen, comando, None, None, 0))
+        for r in resultados:
+            self._encolar(self._comandos, (instante, origen, comando, r.get('lugar'), r.get('accion'),
+                                           int(bool(r.get('exito')))))
+
+    # --- Hilo escritor ---
+
+    def _vaciar(self, cola):
+        with self._lock_colas:
+            filas = list(cola)
+            cola.clear()
+        return filas
+
+    def _devolver(self, cola, filas):
+        """
+        Reinserta al frente un lote no escrito. Si no cabe todo, se pierden las filas más
+        antiguas (las del principio del lote), nunca las recién llegadas.
+        """
+        with self._lock_colas:
+            todas = filas + list(cola)
+            conservar = todas[-cola.maxlen:]
+            cola.clear()
+            cola.extend(conservar)
+            self.filas_descartadas += len(todas) - len(conservar)
+
+    def _volcar(self, conexion):
+        muestras = self._vaciar(self._muestras)
+        comandos = self._vaciar(self._comandos)
+        if not muestras and not comandos:
+            return
+        inicio = time.perf_counter()
+        try:
+            with conexion:  # Una sola transacción por lote
+                if muestras:
+                    conexion.executemany("INSERT INTO muestras VALUES (?, ?, ?, ?, ?)", muestras)
+                if comandos:
+                    conexion.executemany("INSERT INTO comandos VALUES (?, ?, ?, ?, ?, ?)", comandos)
+        except sqlite3.Error:
+            # Base bloqueada, disco lleno...: el lote vuelve a la cola para el próximo volcado
+            self._devolver(self._muestras, muestras)
+            self._devolver(self._comandos, comandos)
+            self.lotes_fallidos += 1
+            raise
+        self.ultimo_volcado_ms = round((time.perf_counter() - inicio) * 1000, 2)
+        self.muestras_escritas += len(muestras)
+        self.comandos_escritos += len(comandos)
+        self.lotes += 1
+
+    def _aplicar_retencion(self, conexion):
+        limite = time.time() - RETENCION_DIAS * 86400
+        with conexion:
+            conexion.execute("DELETE FROM muestras WHERE ts < ?", (limite,))
+            conexion.execute("DELETE FROM comandos WHERE ts < ?", (limite,))
+        conexion.execute("PRAGMA incremental_vacuum")
+        conexion.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def _bucle_escritor(self):
+        conexion = self._conectar()
+        proxima_retencion = time.monotonic()
+        try:
+            while not self._detener.wait(INTERVALO_VOLCADO):
+                try:
+                    self._volcar(conexion)
+                    if time.monotonic() >= proxima_retencion:
+                        self._aplicar_retencion(conexion)
+                        proxima_retencion = time.monotonic() + INTERVALO_RETENCION
+                    self.error = None
+                except sqlite3.Error as e:
+                    self.error = str(e)
+                    print(f"[ALMACEN] Error escribiendo en {self.ruta}: {e}")
+            self._volcar(conexion)  # Último lote al detener
+        finally:
+            conexion.close()
+
+    def detener(self):
+        """Vuelca lo pendiente y detiene el hilo escritor."""
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=5)
+
+    # --- Consultas ---
+
+    def _consultar(self, sql, parametros):
+        # Conexión propia por consulta: en WAL los lectores no bloquean al escritor
+        conexion = self._conectar()
+        try:
+            conexion.row_factory = sqlite3.Row
+            return [dict(fila) for fila in conexion.execute(sql, parametros)]
+        finally:
+            conexion.close()
+
+    def consultar_muestras(self, desde, hasta, limite=MAX_FILAS_CONSULTA):
+        return self._consultar(
+            "SELECT ts, gas, temp, hum, distancia FROM muestras WHERE ts >= ? AND ts < ? ORDER BY ts LIMIT ?",
+            (desde, hasta, max(1, min(limite, MAX_FILAS_CONSULTA))))
+
+    def consultar_comandos(self, desde, hasta, limite=MAX_FILAS_CONSULTA):
+        return self._consultar(
+            "SELECT ts, origen, comando, lugar, accion, exito FROM comandos WHERE ts >= ? AND ts < ? ORDER BY ts LIMIT ?",
+            (desde, hasta, max(1, min(limite, MAX_FILAS_CONSULTA))))
+
+    def estado(self):
+        return {
+            'ruta': self.ruta,
+            'pendientes_muestras': len(self._muestras),
+            'pendientes_comandos': len(self._comandos),
+            'muestras_escritas': self.muestras_escritas,
+            'comandos_escritos': self.comandos_escritos,
+            'lotes': self.lotes,
+            'lotes_fallidos': self.lotes_fallidos,
+            'filas_descartadas': self.filas_descartadas,
+            'ultimo_volcado_ms': self.ultimo_volcado_ms,
+            'error': self.error,
+        }
+
+
+# Instancia única para todo el proceso
+almacen_datos = AlmacenDatos()
@@ -6,140 +6,266 @@ Este servidor expone una API para ser consumida por un frontend (panel de contro
 Reemplaza la lógica de `principal.py` para operar en un entorno web.
 """
 
-from flask import Flask, request, jsonify, render_template
+import time
+_INICIO_ARRANQUE = time.perf_counter()  # Para el informe de arranque (núcleo frente a subsistemas)
+
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-import speech_recognition as sr
-from pydub import AudioSegment
-import io
 import traceback
-import time
 import threading
-import serial
-import serial.tools.list_ports
-import re
+import queue
+import os
+import io
+import json
+from types import SimpleNamespace
 
 # --- Importaciones de Módulos Propios ---
-from control_red import controlar_maqueta
-from gestion_ia import procesar_comando_voz
+from control_red import controlar_maqueta, controlar_maqueta_lote, leer_estado_pasarela, monitor_pasarela, cliente_gateway
+from gestion_ia import procesar_comando_voz, estadisticas_ia, precargar_modelo_ia, llm
+from difusion_sensores import difusor_sensores
+from parser_serial import interpretar_linea
+from historial_sensores import historial_sensores, CANALES_HISTORIAL
+from almacen_datos import almacen_datos, MAX_FILAS_CONSULTA
+from escritor_arduino import escritor_arduino
+from trabajos import gestor_trabajos
+from estado_dispositivos import sombra_dispositivos
+from metricas import metricas
+from motor_reglas import MotorReglas, cargar_reglas
+from recursos_estaticos import RecursosEstaticos, CACHE_INMUTABLE, CACHE_INDICE
+from registro_eventos import (registro_eventos, RegistroPeticion, registrar, nivel_desde_texto, MAX_EVENTOS_CONSULTA,
+                              INFO, ADVERTENCIA, ERROR)
+from subsistemas import Subsistema, SubsistemaNoDisponible, informe_subsistemas, imprimir_informe_arranque, memoria_residente_mb
+# La voz (PyAV, Whisper/torch) y el serial (pyserial) se importan al cargar su subsistema
 
 # --- Configuración de la Aplicación Flask ---
 app = Flask(__name__)
 # Habilitar CORS para permitir peticiones desde el frontend
 CORS(app)
+# Modo depuración de Flask (WASI_DEPURACION=si): solo en desarrollo, nunca en la pasarela
+MODO_DEPURACION = os.environ.get('WASI_DEPURACION', 'no').strip().lower() == 'si'
 
 # --- Configuración Serial (Arduino - Sensor Gas) ---
-# IMPORTANTE: Cambia 'COM3' por el puerto USB real de tu Arduino
-ARDUINO_PORT = 'COM4' 
+# IMPORTANTE: Cambia 'COM4' por el puerto USB real de tu Arduino (o define WASI_ARDUINO_PORT)
+ARDUINO_PORT = os.environ.get('WASI_ARDUINO_PORT', 'COM4')
 ARDUINO_BAUD = 9600
+# Activa la impresión de cada línea recibida (solo para depurar: cuesta E/S por línea)
+DEPURACION_SERIAL = False
 latest_gas_level = 0
 latest_temp = 0.0
 latest_hum = 0.0
 latest_distance = 0
 
-# Variable global para la conexión serial
-arduino_serial = None
-
-def leer_sensor_arduino():
-    """Hilo en segundo plano para leer el puerto serial sin bloquear Flask."""
-    global latest_gas_level, latest_temp, latest_hum, latest_distance, arduino_serial
+# Placas serie adicionales: WASI_PLACAS_SERIAL="sotano=/dev/ttyUSB1,jardin=COM7".
+# La placa 'principal' (ARDUINO_PORT) es la de los actuadores (servo y LED de alarma).
+PLACA_PRINCIPAL = 'principal'
+
+def configurar_placas():
+    """Devuelve {nombre: puerto} con la placa principal y las adicionales del entorno."""
+    placas = {PLACA_PRINCIPAL: ARDUINO_PORT}
+    for definicion in os.environ.get('WASI_PLACAS_SERIAL', '').split(','):
+        nombre, _, puerto = definicion.partition('=')
+        if nombre.strip() and puerto.strip():
+            placas[nombre.strip()] = puerto.strip()
+    return placas
+
+def procesar_linea_serial(placa, linea):
+    """Callback del multiplexor serial: interpreta una línea y la reparte (sin bloquear)."""
+    global latest_gas_level, latest_temp, latest_hum, latest_distance
+    # [DEBUG] Imprimir lo que llega solo si la depuración serial está activa
+    if DEPURACION_SERIAL: print(f"[SERIAL RAW] {placa.nombre}: '{linea}'")
+
+    inicio_linea = time.perf_counter()
+    metricas.marcar("serial_lineas")
+    if placa.nombre == PLACA_PRINCIPAL:
+        # Cada línea es una vuelta de loop() del sketch: marca el ritmo del escritor
+        escritor_arduino.notificar_linea()
+
+    # Parsear línea: "Distancia: 45cm | Gas: 120 | Temp: 24.50C | Hum: 60.00%"
+    lectura = interpretar_linea(linea)
+    if lectura is not None and lectura.descartados:
+        metricas.contar("serial_campos_descartados_total", lectura.descartados)
+        if DEPURACION_SERIAL: print(f"[SERIAL] {placa.nombre}: {lectura.descartados} campo(s) corrupto(s) en '{linea}'")
+
+    # Campos presentes en esta línea (NaN del DHT22 -> None para el frontend)
+    lecturas = lectura.campos() if lectura is not None else {}
+    if not lecturas:
+        metricas.contar("serial_lineas_total", resultado="descartada")
+        return
+    placa.lecturas.update(lecturas)
+
+    if placa.nombre == PLACA_PRINCIPAL:
+        canales = lecturas
+        if 'gas' in lecturas: latest_gas_level = lecturas['gas']
+        if 'temp' in lecturas: latest_temp = lecturas['temp']
+        if 'hum' in lecturas: latest_hum = lecturas['hum']
+        if 'distancia' in lecturas:
+            latest_distance = lecturas['distancia']
+            if DEPURACION_SERIAL: print(f"[SENSOR DISTANCIA] Objeto a: {latest_distance} cm")
+        historial_sensores.registrar(lecturas)
+        almacen_datos.registrar_muestra(lectura.timestamp, lecturas)
+        difusor_sensores.publicar(lecturas)
+    else:
+        # Las demás placas se difunden con su nombre como espacio: {'sotano.gas': 140}
+        canales = {f"{placa.nombre}.{campo}": valor for campo, valor in lecturas.items()}
+        difusor_sensores.publicar(canales)
+
+    # Automatizaciones: se evalúan aquí, sin depender de que haya un panel abierto
+    motor_reglas.evaluar(canales, inicio_linea)
+
+    metricas.contar("serial_lineas_total", resultado="procesada")
+    metricas.observar("serial_linea_segundos", time.perf_counter() - inicio_linea)
+
+def al_conectar_placa(placa):
+    # Las escrituras las hace solo el hilo escritor; el reactor solo lee
+    if placa.nombre == PLACA_PRINCIPAL:
+        escritor_arduino.asignar_puerto(placa.serial)
+
+# --- Automatizaciones del Servidor (Motor de Reglas) ---
+# WASI_REGLAS: ruta a un JSON con las reglas; sin ella se usan las predeterminadas
+RUTA_REGLAS = os.environ.get('WASI_REGLAS')
+
+def ejecutar_accion_regla(accion):
+    """Ejecuta una acción de regla: orden del Arduino ("LED:1", "SERVO:90") o "lugar:accion" del ESP32."""
+    clave, _, valor = accion.partition(':')
+    if clave.upper() == 'LED':
+        with metricas.medir("etapa", etapa="arduino"):
+            escritor_arduino.enviar(f"LED:{valor}")
+        sombra_dispositivos.actualizar('alarma', 'on' if valor == '1' else 'off', origen='regla')
+        return {'accion': 'ON' if valor == '1' else 'OFF', 'lugar': 'alarma', 'exito': True}
+    if clave.upper() == 'SERVO':
+        with metricas.medir("etapa", etapa="arduino"):
+            escritor_arduino.enviar(f"SERVO:{int(valor)}")
+        sombra_dispositivos.actualizar('puerta', int(valor), origen='regla')
+        return {'accion': str(int(valor)), 'lugar': 'puerta', 'exito': True}
+    logs = RegistroPeticion()
+    with metricas.medir("etapa", etapa="esp32"):
+        exito = controlar_maqueta(clave, valor, logs)
+    return {'accion': valor.upper(), 'lugar': clave.lower(), 'exito': exito}
+
+def al_ejecutar_regla(regla, resultados):
+    almacen_datos.registrar_comando('regla', regla.nombre, resultados)
+    metricas.contar("reglas_disparos_total", regla=regla.nombre)
+
+motor_reglas = MotorReglas(ejecutar_accion_regla, al_ejecutar=al_ejecutar_regla,
+                           al_medir=lambda regla, s: metricas.observar("regla_reaccion_segundos", s, regla=regla.nombre))
+try:
+    motor_reglas.cargar(cargar_reglas(RUTA_REGLAS))
+except (OSError, ValueError) as e:
+    print(f"[ADVERTENCIA] No se pudieron cargar las reglas de '{RUTA_REGLAS}': {e}. Automatizaciones desactivadas.")
+
+# --- Subsistema Serial (WASI_SERIAL) ---
+def _cargar_serial():
+    # Importación diferida: pyserial solo hace falta en los nodos con placas conectadas
+    from multiplexor_serial import MultiplexorSerial
+    multiplexor = MultiplexorSerial(procesar_linea_serial, al_conectar_placa)
+    for nombre_placa, puerto_placa in configurar_placas().items():
+        multiplexor.agregar_placa(nombre_placa, puerto_placa, ARDUINO_BAUD)
+    # Un hilo para todas las placas (con use_reloader=False no hay proceso duplicado)
+    multiplexor.iniciar()
+    return multiplexor
+
+subsistema_serial = Subsistema('serial', _cargar_serial, "placas Arduino por puerto serie")
+
+def arduino_conectado():
+    """True si la placa de los actuadores está lista; en modo diferido, la primera consulta arranca el reactor."""
     try:
-        # Asignamos a la variable global para poder usarla en otras funciones
-        arduino_serial = serial.Serial(ARDUINO_PORT, ARDUINO_BAUD, timeout=1)
-        print(f"[ARDUINO] Conectado exitosamente en {ARDUINO_PORT}")
-        while True:
-            if arduino_serial.in_waiting > 0:
-                try:
-                    linea = arduino_serial.readline().decode('utf-8', errors='ignore').strip()
-                    # [DEBUG] Imprimir lo que llega para verificar
-                    if linea: print(f"[SERIAL RAW] Recibido: '{linea}'")
-                    
-                    # Parsear línea: "Gas: 120 | Temp: 24.50C | Hum: 60.00% | Dist: 45"
-                    
-                    # 1. Gas
-                    match_gas = re.search(r'Gas:\s*(\d+)', linea)
-                    if match_gas:
-                        latest_gas_level = int(match_gas.group(1))
-                    
-                    # 2. Temperatura
-                    # Modificado para aceptar negativos y 'nan'
-                    match_temp = re.search(r'Temp:\s*([-\d\w\.]+)', linea)
-                    if match_temp:
-                        val_str = match_temp.group(1)
-                        # Limpiar unidad 'C' si fue capturada por el regex
-                        val_str = val_str.replace('C', '').replace('c', '').strip()
-                        
-                        # Si es 'nan', enviamos None (null en JSON) para no romper el frontend
-                        if 'nan' in val_str.lower():
-                            latest_temp = None
-                        else:
-                            try:
-                                latest_temp = float(val_str)
-                            except ValueError:
-                                latest_temp = None
-                        
-                    # 3. Humedad
-                    match_hum = re.search(r'Hum:\s*([-\d\w\.]+)', linea)
-                    if match_hum:
-                        val_str = match_hum.group(1)
-                        # Limpieza preventiva de '%'
-                        val_str = val_str.replace('%', '').strip()
-                        
-                        if 'nan' in val_str.lower():
-                            latest_hum = None
-                        else:
-                            try:
-                                latest_hum = float(val_str)
-                            except ValueError:
-                                latest_hum = None
-                        
-                    # 4. Distancia (HC-SR04)
-                    match_dist = re.search(r'Distancia:\s*(\d+)', linea)
-                    if match_dist:
-                        latest_distance = int(match_dist.group(1))
-                        print(f"[SENSOR DISTANCIA] Objeto a: {latest_distance} cm")
-
-                except Exception as e:
-                    print(f"[SERIAL ERROR] {e}")
-            else:
-                # Solo dormimos si no hay datos en el buffer, para leer lo más rápido posible
-                time.sleep(0.01)
-    except serial.SerialException as e:
-        print(f"[ADVERTENCIA] Error conectando al Arduino en {ARDUINO_PORT}: {e}")
-        if "Access is denied" in str(e) or "PermissionError" in str(e):
-            print(f"[SOLUCION] El puerto {ARDUINO_PORT} está ocupado. Cierra el 'Monitor Serie' del Arduino IDE o terminales anteriores.")
-
-        # Listar puertos disponibles para ayudar al usuario
-        puertos_disponibles = [p.device for p in serial.tools.list_ports.comports()]
-        print(f"[AYUDA] Puertos COM detectados en tu PC: {puertos_disponibles}")
-        print(f"[ACCION] Actualiza la variable 'ARDUINO_PORT' (línea 30) con uno de estos valores.")
+        subsistema_serial.obtener()
+    except SubsistemaNoDisponible:
+        return False
+    return escritor_arduino.conectado
+
+@app.errorhandler(SubsistemaNoDisponible)
+def handle_subsistema_no_disponible(e):
+    return jsonify({"status": "error", "message": str(e)}), 503
+
+# --- Logs de las Peticiones Síncronas ---
+
+def _logs_peticion(data=None):
+    """
+    Logs de una petición: van al registro compartido con un id de petición y solo se
+    devuelven en la respuesta si el cliente pide `?verbose=1` (o `"verbose": true` en el JSON).
+    """
+    detallado = request.values.get('verbose', '').lower() in ('1', 'true', 'si')
+    if isinstance(data, dict) and data.get('verbose') is True:
+        detallado = True
+    return RegistroPeticion(detallado=detallado)
+
+def _respuesta_con_logs(logs, codigo=200, **campos):
+    """JSON de la respuesta con su `request_id` (para buscarla en /api/logs) y los logs si se pidieron."""
+    campos['request_id'] = logs.peticion
+    if logs.detallado:
+        campos['logs'] = list(logs)
+    return jsonify(campos), codigo
 
 # --- Definición de Rutas de la API ---
 
+# --- Recursos Estáticos del Panel (minificados, versionados y precomprimidos) ---
+recursos_estaticos = RecursosEstaticos(app.static_folder, os.path.join(app.root_path, app.template_folder), app.jinja_env)
+
+def _servir_recurso(recurso, cache_control):
+    """Variante comprimida que acepte el cliente, con ETag; 304 sin cuerpo si ya la tiene."""
+    codificacion, datos, etag = recurso.elegir(lambda cod: request.accept_encodings[cod] > 0)
+    respuesta = Response(datos, content_type=recurso.tipo_mime)
+    if codificacion != 'identity':
+        respuesta.headers['Content-Encoding'] = codificacion
+    respuesta.headers['Cache-Control'] = cache_control
+    respuesta.vary.add('Accept-Encoding')
+    respuesta.set_etag(etag)
+    # Rangos solo sin comprimir: el <audio> de la alarma los pide en algunos navegadores
+    return respuesta.make_conditional(request, accept_ranges=codificacion == 'identity',
+                                      complete_length=len(datos))
+
 @app.route("/")
 def index():
     """
-    Ruta raíz que sirve el panel de control web.
+    Ruta raíz que sirve el panel de control web (pre-renderizado con las URLs versionadas).
     """
-    return render_template('index.html')
+    return _servir_recurso(recursos_estaticos.indice(), CACHE_INDICE)
+
+@app.route("/recursos/<nombre>")
+def handle_recurso_estatico(nombre):
+    """
+    style.css, script.js y alarm.mp3 con el hash del contenido en el nombre: caché inmutable.
+    """
+    recurso = recursos_estaticos.obtener(nombre)
+    if recurso is None:
+        return jsonify({"status": "error", "message": "Recurso no encontrado (¿versión anterior del panel?)"}), 404
+    return _servir_recurso(recurso, CACHE_INMUTABLE)
 
 # --- Función Auxiliar para Lógica de Domótica ---
-def ejecutar_logica_domotica(comando_usuario, logs):
-    """Procesa el texto del comando y ejecuta la acción correspondiente."""
-    global arduino_serial
+def ejecutar_logica_domotica(comando_usuario, logs, origen='texto', progreso=None, forzar=False):
+    """
+    Procesa el texto del comando y ejecuta la acción correspondiente.
+
+    `progreso(etapa, datos)` (opcional) se llama al reconocer la intención y tras cada
+    acción, para que los trabajos asíncronos informen del avance. Con `forzar` se envían
+    también las órdenes que la sombra de estado considera sin efecto.
+    """
+    with metricas.medir("comando", origen=origen):
+        status, resultados = _ejecutar_acciones(comando_usuario, logs, progreso or (lambda etapa, datos=None: None), forzar)
+    metricas.contar("comandos_total", origen=origen, estado=status)
+    # Registro persistente del comando (se escribe a disco en segundo plano)
+    almacen_datos.registrar_comando(origen, comando_usuario, resultados)
+    return status, resultados
+
+def _ejecutar_acciones(comando_usuario, logs, progreso, forzar):
     # 2. Procesar el comando con el modelo de IA
     try:
-        resultado_ia = procesar_comando_voz(comando_usuario, logs)
+        with metricas.medir("etapa", etapa="ia"):
+            resultado_ia = procesar_comando_voz(comando_usuario, logs)
         lista_acciones = resultado_ia.get('acciones', [])
     except Exception as e:
-        logs.append(f"[ERROR_IA] Fallo durante el procesamiento de la IA: {e}")
+        registrar(logs, ERROR, 'ERROR_IA', "Fallo durante el procesamiento de la IA: %s", e)
         return "error", []
 
     # 3. Actuar según la intención reconocida
     resultados_ejecucion = []
+    pendientes_red = []
     exito_global = False
     
+    progreso('intencion', {'acciones': lista_acciones})
     if not lista_acciones:
-        logs.append("[SISTEMA] No se han detectado acciones válidas en el comando.")
+        registrar(logs, ADVERTENCIA, 'SISTEMA', "No se han detectado acciones válidas en el comando.")
         return "failed", []
 
     for item in lista_acciones:
@@ -149,49 +275,59 @@ def ejecutar_logica_domotica(comando_usuario, logs):
         # --- Lógica Especial para ALARMA (Arduino) ---
         if lugar == 'alarma' or lugar == 'alarmas':
             try:
-                if arduino_serial and arduino_serial.is_open:
-                    comando = "LED:1\n" if accion == 'ON' else "LED:0\n"
-                    arduino_serial.write(comando.encode())
-                    logs.append(f"[ARDUINO] Comando de voz Alarma: {accion}")
+                if arduino_conectado():
+                    with metricas.medir("etapa", etapa="arduino"):
+                        ack = escritor_arduino.enviar("LED:1" if accion == 'ON' else "LED:0")
+                    registrar(logs, INFO, 'ARDUINO', "Comando de voz Alarma: %s (~%s ms)", accion, ack['total_estimado_ms'])
+                    sombra_dispositivos.actualizar('alarma', 'on' if accion == 'ON' else 'off')
                     resultados_ejecucion.append({'accion': accion, 'lugar': 'alarma', 'exito': True})
+                    progreso('accion', resultados_ejecucion[-1])
                     exito_global = True
             except Exception as e:
-                logs.append(f"[ERROR] No se pudo controlar la alarma: {e}")
+                registrar(logs, ERROR, 'ERROR', "No se pudo controlar la alarma: %s", e)
         
         # --- Lógica Especial para PUERTA/SERVO (Arduino) ---
         elif lugar == 'puerta' or lugar == 'servo':
             try:
-                if arduino_serial and arduino_serial.is_open:
+                if arduino_conectado():
                     # Mapeamos acciones: ON/OPEN -> 90, OFF/CLOSE -> 0
                     if accion in ['ON', 'OPEN', 'ABRIR']:
                         angulo = 90
                     elif accion in ['OFF', 'CLOSE', 'CERRAR']:
                         angulo = 0
                     else:
-                        logs.append(f"[ADVERTENCIA] Acción '{accion}' no válida para puerta.")
+                        registrar(logs, ADVERTENCIA, 'ADVERTENCIA', "Acción '%s' no válida para puerta.", accion)
                         continue
 
-                    comando = f"SERVO:{angulo}\n"
-                    arduino_serial.write(comando.encode())
-                    logs.append(f"[ARDUINO] Comando de voz Puerta: {accion} -> {angulo}°")
+                    with metricas.medir("etapa", etapa="arduino"):
+                        ack = escritor_arduino.enviar(f"SERVO:{angulo}")
+                    registrar(logs, INFO, 'ARDUINO', "Comando de voz Puerta: %s -> %s° (~%s ms)", accion, angulo, ack['total_estimado_ms'])
+                    sombra_dispositivos.actualizar('puerta', angulo)
                     resultados_ejecucion.append({'accion': accion, 'lugar': 'puerta', 'exito': True})
+                    progreso('accion', resultados_ejecucion[-1])
                     exito_global = True
             except Exception as e:
-                logs.append(f"[ERROR] No se pudo controlar la puerta: {e}")
+                registrar(logs, ERROR, 'ERROR', "No se pudo controlar la puerta: %s", e)
 
         elif accion in ['ON', 'OFF']:
-            try:
-                logs.append(f"[SISTEMA] Ejecutando: {accion} en {lugar.upper()}")
-                exito = controlar_maqueta(lugar, accion, logs)
-                resultados_ejecucion.append({'accion': accion, 'lugar': lugar, 'exito': exito})
-                if exito: exito_global = True
-                # Pequeño retraso para evitar saturar el ESP32 con peticiones seguidas
-                time.sleep(0.3)
-            except Exception as e:
-                logs.append(f"[ERROR_HW] Fallo al controlar {lugar}: {e}")
-                resultados_ejecucion.append({'accion': accion, 'lugar': lugar, 'exito': False})
+            # Las acciones del ESP32 se agrupan y se envían en un único lote al final
+            registrar(logs, INFO, 'SISTEMA', "Ejecutando: %s en %s", accion, lugar.upper())
+            resultado = {'accion': accion, 'lugar': lugar, 'exito': False}
+            resultados_ejecucion.append(resultado)
+            pendientes_red.append(resultado)
         else:
-            logs.append(f"[SISTEMA] Acción desconocida ignorada: {accion}")
+            registrar(logs, ADVERTENCIA, 'SISTEMA', "Acción desconocida ignorada: %s", accion)
+
+    if pendientes_red:
+        try:
+            with metricas.medir("etapa", etapa="esp32"):
+                exitos = controlar_maqueta_lote([(r['lugar'], r['accion']) for r in pendientes_red], logs, forzar)
+            for resultado, exito in zip(pendientes_red, exitos):
+                resultado['exito'] = exito
+                progreso('accion', resultado)
+                if exito: exito_global = True
+        except Exception as e:
+            registrar(logs, ERROR, 'ERROR_HW', "Fallo al controlar %s: %s", ', '.join(r['lugar'] for r in pendientes_red), e)
 
     return ("success" if exito_global else "failed"), resultados_ejecucion
 
@@ -202,9 +338,6 @@ def handle_command():
     Espera un JSON con la clave 'command'.
     Ej: {"command": "enciende la luz"}
     """
-    # Lista para recolectar todos los logs generados durante esta petición
-    logs = []
-    
     # 1. Obtener datos de la petición
     data = request.json
     if not data or 'command' not in data:
@@ -214,53 +347,356 @@ def handle_command():
     if not comando_usuario.strip():
         return jsonify({"status": "error", "message": "El comando no puede estar vacío."}), 400
 
-    status, resultados = ejecutar_logica_domotica(comando_usuario, logs)
+    # Logs de esta petición (en el registro compartido; en la respuesta solo con 'verbose')
+    logs = _logs_peticion(data)
+    status, resultados = ejecutar_logica_domotica(comando_usuario, logs, forzar=bool(data.get('forzar')))
+
+    return _respuesta_con_logs(logs, status=status, resultados=resultados)
+
+def transcribir_audio(origen_audio, logs, progreso=None):
+    """
+    Decodifica y transcribe un audio del navegador.
 
-    return jsonify({"status": status, "resultados": resultados, "logs": logs})
+    Args:
+        origen_audio: Fichero o flujo binario con el audio (WebM/Opus, WAV...).
+        logs (list): Lista para registrar los pasos.
+        progreso (callable): Callback opcional de etapa ('decodificado', 'transcrito').
+
+    Returns:
+        str: El texto transcrito ("" si el audio no contenía voz).
+    """
+    # 1. Decodificar WebM/Opus (navegador) en proceso a float32 mono 16 kHz,
+    # sin subproceso ffmpeg ni WAV intermedio
+    voz = subsistema_voz.obtener()
+    registrar(logs, INFO, 'VOZ', "Procesando archivo de audio recibido...")
+    with metricas.medir("etapa", etapa="decodificacion"):
+        muestras = voz.decodificar_audio(origen_audio)
+    segundos = muestras.size / voz.FRECUENCIA_MUESTREO
+    registrar(logs, INFO, 'VOZ', "Audio decodificado: %.2fs a %s Hz", segundos, voz.FRECUENCIA_MUESTREO)
+    if progreso: progreso('decodificado', {'segundos': round(segundos, 2)})
+    return transcribir_muestras(muestras, logs, progreso)
+
+def transcribir_muestras(muestras, logs, progreso=None):
+    """
+    Recorta el silencio y transcribe audio ya decodificado (float32 mono a 16 kHz).
+
+    Returns:
+        str: El texto transcrito ("" si el audio no contenía voz).
+    """
+    voz = subsistema_voz.obtener()
+    motor_asr = voz.motor_asr
+    segundos = muestras.size / voz.FRECUENCIA_MUESTREO
+    # 2. Recortar el silencio (VAD por energía) y descartar clips sin voz antes de Whisper
+    with metricas.medir("etapa", etapa="vad"):
+        vad = voz.detector_voz.analizar(muestras)
+    metricas.contar("voz_audio_recortado_segundos_total", vad.segundos_recortados)
+    if not vad.hay_voz:
+        # Sin voz no se llama a Whisper: se ahorra una inferencia completa del modelo principal
+        voz.detector_voz.registrar_ahorro(motor_asr.inferencia_media or 0.0)
+        metricas.contar("voz_sin_voz_total")
+        registrar(logs, INFO, 'VOZ', "No se detectó voz en %.2fs de audio; se omite la transcripción.", segundos)
+        if progreso: progreso('transcrito', {'texto': '', 'sin_voz': True})
+        return ""
+    registrar(logs, INFO, 'VOZ', "VAD: %.2fs con voz (%.2fs de silencio recortados)", vad.segundos_voz, vad.segundos_recortados)
+
+    # 3. Transcribir con el motor Whisper residente (modelo ya cargado en memoria);
+    # las órdenes cortas van al modelo pequeño cuantizado si está disponible
+    motor = voz.elegir_motor(vad.segundos_voz)
+    registrar(logs, INFO, 'VOZ', "Transcribiendo audio localmente (Whisper '%s')...", motor.nombre_modelo)
+    # fp16=False es CRUCIAL para evitar errores en CPUs (laptops); lo fija el motor
+    with metricas.medir("etapa", etapa="whisper"):
+        texto_transcrito = motor.transcribir(vad.muestras, logs)
+    if motor is not motor_asr and motor_asr.inferencia_media and motor.inferencia_media:
+        ahorro = motor_asr.inferencia_media - motor.inferencia_media
+        voz.detector_voz.registrar_ahorro(ahorro)
+        registrar(logs, INFO, 'VOZ', "Ahorro estimado de inferencia frente a '%s': %.2fs", motor_asr.nombre_modelo, ahorro)
+    registrar(logs, INFO, 'VOZ', "Texto detectado: '%s'", texto_transcrito)
+    if progreso: progreso('transcrito', {'texto': texto_transcrito})
+    return texto_transcrito
+
+def _registrar_error_voz(e, logs):
+    traceback.print_exc() # Muestra el error real en la terminal del servidor
+    # Detectar error de conexión al intentar descargar el modelo por primera vez
+    if "getaddrinfo failed" in str(e):
+        registrar(logs, ERROR, 'ERROR_RED', "Se requiere internet la primera vez para descargar el modelo Whisper.")
+    registrar(logs, ERROR, 'ERROR_VOZ', "Fallo al procesar audio: %r", e)
 
 @app.route("/api/voice-command", methods=['POST'])
 def handle_voice_command():
     """
     Recibe un archivo de audio (blob), lo transcribe localmente y ejecuta el comando.
+    Versión síncrona: el panel usa /api/jobs/voice.
     """
-    logs = []
     if 'audio' not in request.files:
         return jsonify({"status": "error", "message": "No se recibió archivo de audio"}), 400
-        
-    audio_file = request.files['audio']
-    texto_transcrito = ""
+    subsistema_voz.obtener()
+    logs = _logs_peticion()
 
     try:
-        # 1. Convertir WebM (navegador) a WAV (compatible con SpeechRecognition)
-        # Requiere ffmpeg instalado en el sistema
-        logs.append("[VOZ] Procesando archivo de audio recibido...")
-        song = AudioSegment.from_file(audio_file) # pydub detecta formato automáticamente
-        wav_io = io.BytesIO()
-        song.export(wav_io, format="wav")
-        wav_io.seek(0)
-        
-        # 2. Transcribir usando SpeechRecognition + Whisper (Local)
-        recognizer = sr.Recognizer()
-        with sr.AudioFile(wav_io) as source:
-            audio_data = recognizer.record(source)
-            logs.append("[VOZ] Transcribiendo audio localmente (Whisper)...")
-            # 'recognize_whisper' usa el modelo local de OpenAI Whisper
-            # fp16=False es CRUCIAL para evitar errores en CPUs (laptops)
-            texto_transcrito = recognizer.recognize_whisper(audio_data, language="spanish", fp16=False)
-            logs.append(f"[VOZ] Texto detectado: '{texto_transcrito}'")
-            
+        texto_transcrito = transcribir_audio(request.files['audio'].stream, logs)
     except Exception as e:
-        traceback.print_exc() # Muestra el error real en la terminal del servidor
-        # Detectar error de conexión al intentar descargar el modelo por primera vez
-        if "getaddrinfo failed" in str(e):
-            logs.append("[ERROR_RED] Se requiere internet la primera vez para descargar el modelo Whisper.")
-        logs.append(f"[ERROR_VOZ] Fallo al procesar audio: {repr(e)}")
-        return jsonify({"status": "error", "message": str(e), "logs": logs}), 500
+        _registrar_error_voz(e, logs)
+        return _respuesta_con_logs(logs, 500, status="error", message=str(e))
+
+    if not texto_transcrito:
+        return _respuesta_con_logs(logs, status="failed", resultados=[], transcription="")
 
     # 3. Ejecutar la lógica con el texto transcrito
-    status, resultados = ejecutar_logica_domotica(texto_transcrito, logs)
+    status, resultados = ejecutar_logica_domotica(texto_transcrito, logs, origen='voz')
     
-    return jsonify({"status": status, "resultados": resultados, "logs": logs, "transcription": texto_transcrito})
+    return _respuesta_con_logs(logs, status=status, resultados=resultados, transcription=texto_transcrito)
+
+# --- Trabajos Asíncronos (voz y lenguaje natural) ---
+
+def _trabajo_comando(comando_usuario, forzar, logs, progreso):
+    status, resultados = ejecutar_logica_domotica(comando_usuario, logs, origen='texto', progreso=progreso, forzar=forzar)
+    return status, {"status": status, "resultados": resultados}
+
+def _trabajo_voz(datos_audio, logs, progreso):
+    try:
+        texto_transcrito = transcribir_audio(io.BytesIO(datos_audio), logs, progreso)
+    except Exception as e:
+        _registrar_error_voz(e, logs)
+        return "error", {"status": "error", "message": str(e)}
+    if not texto_transcrito:
+        return "failed", {"status": "failed", "resultados": [], "transcription": ""}
+    status, resultados = ejecutar_logica_domotica(texto_transcrito, logs, origen='voz', progreso=progreso)
+    return status, {"status": status, "resultados": resultados, "transcription": texto_transcrito}
+
+def _trabajo_voz_sesion(sesion, logs, progreso):
+    # El audio ya se decodificó mientras llegaba: solo queda drenar el último fragmento
+    muestras = sesion.muestras()
+    segundos = muestras.size / subsistema_voz.obtener().FRECUENCIA_MUESTREO
+    registrar(logs, INFO, 'VOZ', "Sesión en streaming cerrada (%s): %.2fs en %d fragmentos", sesion.motivo_fin, segundos, sesion.fragmentos)
+    if progreso: progreso('decodificado', {'segundos': round(segundos, 2)})
+    try:
+        texto_transcrito = transcribir_muestras(muestras, logs, progreso)
+    except Exception as e:
+        _registrar_error_voz(e, logs)
+        return "error", {"status": "error", "message": str(e)}
+    if not texto_transcrito:
+        return "failed", {"status": "failed", "resultados": [], "transcription": ""}
+    status, resultados = ejecutar_logica_domotica(texto_transcrito, logs, origen='voz', progreso=progreso)
+    # Latencia percibida: desde que el usuario dejó de hablar hasta ejecutar la orden
+    reaccion = time.perf_counter() - sesion.fin_voz_en
+    metricas.observar("voz_fin_a_accion_segundos", reaccion)
+    registrar(logs, INFO, 'VOZ', "Orden ejecutada %.0f ms después del fin de la voz", reaccion * 1000)
+    return status, {"status": status, "resultados": resultados, "transcription": texto_transcrito}
+
+def _al_finalizar_sesion_voz(sesion):
+    trabajo = gestor_trabajos.enviar('voz', _trabajo_voz_sesion, sesion)
+    sesion.job_id = trabajo.id if trabajo is not None else None
+    sesion.rechazada = trabajo is None
+
+def _transcribir_parcial(muestras):
+    # Solo con el modelo corto y si está libre: las parciales nunca retrasan una orden final
+    motor_corto = subsistema_voz.obtener().motor_asr_corto
+    if motor_corto is None or not motor_corto.libre:
+        return None
+    return motor_corto.transcribir(muestras, [])
+
+# --- Subsistema de Voz (WASI_VOZ) ---
+def _cargar_voz():
+    # Importación diferida: PyAV y Whisper (torch) son, con diferencia, lo más pesado del servidor
+    from motor_voz import motor_asr, motor_asr_corto, elegir_motor, FRECUENCIA_MUESTREO
+    from deteccion_voz import detector_voz
+    from decodificador_audio import decodificar_audio
+    from sesiones_voz import GestorSesionesVoz
+    # Whisper se importa aquí y no solo en el hilo de carga: si falta, el subsistema
+    # queda en 'error' en lugar de aceptar audio que luego fallaría en cada trabajo
+    import whisper  # noqa: F401
+    # Cargar y calentar Whisper en segundo plano para que el primer comando de voz no pague la carga
+    motor_asr.iniciar()
+    if motor_asr_corto: motor_asr_corto.iniciar()
+    return SimpleNamespace(
+        motor_asr=motor_asr, motor_asr_corto=motor_asr_corto, elegir_motor=elegir_motor,
+        FRECUENCIA_MUESTREO=FRECUENCIA_MUESTREO, detector_voz=detector_voz, decodificar_audio=decodificar_audio,
+        sesiones=GestorSesionesVoz(_al_finalizar_sesion_voz, _transcribir_parcial),
+    )
+
+def _verificar_voz(voz):
+    # La carga del modelo sigue en segundo plano: un fallo posterior también desactiva la voz
+    error = voz.motor_asr.error_carga
+    return f"{type(error).__name__}: {error}" if error is not None else None
+
+subsistema_voz = Subsistema('voz', _cargar_voz, "Whisper, VAD y decodificación de audio", verificar=_verificar_voz)
+
+def _respuesta_trabajo(trabajo):
+    if trabajo is None:
+        return jsonify({"status": "error", "message": "Demasiados trabajos en cola, inténtalo de nuevo."}), 503
+    return jsonify({"status": "accepted", "job_id": trabajo.id, "url": f"/api/jobs/{trabajo.id}"}), 202
+
+@app.route("/api/jobs/command", methods=['POST'])
+def handle_job_command():
+    """
+    Encola un comando de texto y responde al instante (202) con el id del trabajo.
+    Espera JSON: {"command": "enciende la luz"}
+    """
+    data = request.json
+    if not data or not str(data.get('command', '')).strip():
+        return jsonify({"status": "error", "message": "Petición inválida. Se requiere un JSON con la clave 'command'."}), 400
+    return _respuesta_trabajo(gestor_trabajos.enviar('comando', _trabajo_comando, data['command'], bool(data.get('forzar'))))
+
+@app.route("/api/jobs/voice", methods=['POST'])
+def handle_job_voice():
+    """
+    Encola un audio (multipart, campo 'audio') y responde al instante (202) con el id del trabajo.
+    """
+    if 'audio' not in request.files:
+        return jsonify({"status": "error", "message": "No se recibió archivo de audio"}), 400
+    subsistema_voz.obtener()
+    # El flujo de subida se cierra al terminar la petición: se copia a memoria
+    datos_audio = request.files['audio'].read()
+    return _respuesta_trabajo(gestor_trabajos.enviar('voz', _trabajo_voz, datos_audio))
+
+@app.route("/api/voice/stream", methods=['POST'])
+def handle_voice_stream_start():
+    """
+    Abre una sesión de voz en streaming. El panel envía después cada fragmento de
+    MediaRecorder a /api/voice/stream/<sesion> según se graba.
+    """
+    sesion = subsistema_voz.obtener().sesiones.crear()
+    if sesion is None:
+        return jsonify({"status": "error", "message": "Demasiadas sesiones de voz abiertas."}), 503
+    return jsonify({"status": "success", "sesion": sesion.id}), 201
+
+@app.route("/api/voice/stream/<sesion_id>", methods=['POST'])
+def handle_voice_stream_chunk(sesion_id):
+    """
+    Recibe un fragmento (cuerpo binario tal cual sale de MediaRecorder); `?fin=1` cierra la grabación.
+    Responde 200 con el progreso (segundos, voz detectada, transcripción parcial) o 202 con
+    el `job_id` en cuanto el servidor detecta el fin del enunciado: el panel deja de grabar
+    y sigue el trabajo como con /api/jobs/voice.
+    """
+    sesion = subsistema_voz.obtener().sesiones.obtener(sesion_id)
+    if sesion is None:
+        return jsonify({"status": "error", "message": "Sesión de voz desconocida o caducada."}), 404
+    finalizada = sesion.agregar(request.get_data(), fin=request.args.get('fin') == '1')
+    resumen = sesion.resumen()
+    if not finalizada:
+        return jsonify({"status": "success", **resumen})
+    if sesion.rechazada:
+        return jsonify({"status": "error", "message": "Demasiados trabajos en cola, inténtalo de nuevo.", **resumen}), 503
+    if sesion.job_id is None:
+        return jsonify({"status": "error", "message": "No se pudo encolar la orden de voz.", **resumen}), 500
+    return jsonify({"status": "accepted", "url": f"/api/jobs/{sesion.job_id}", **resumen}), 202
+
+@app.route("/api/jobs/<job_id>", methods=['GET'])
+def handle_job_status(job_id):
+    """
+    Estado de un trabajo y sus eventos desde el número `desde`.
+    Con `espera=S` (máx 25) hace long-polling hasta que haya eventos nuevos.
+    """
+    trabajo = gestor_trabajos.obtener(job_id)
+    if trabajo is None:
+        return jsonify({"status": "error", "message": "Trabajo no encontrado"}), 404
+    try:
+        desde = max(int(request.args.get('desde', 0)), 0)
+        espera = min(max(float(request.args.get('espera', 0)), 0), 25)
+    except ValueError:
+        return jsonify({"status": "error", "message": "'desde' y 'espera' deben ser numéricos"}), 400
+    if espera:
+        trabajo.esperar_eventos(desde, espera)
+    return jsonify(dict(trabajo.resumen(desde), status="success"))
+
+@app.route("/api/jobs/<job_id>/stream", methods=['GET'])
+def handle_job_stream(job_id):
+    """
+    Flujo Server-Sent Events con los eventos del trabajo (logs, etapas y fin).
+    """
+    trabajo = gestor_trabajos.obtener(job_id)
+    if trabajo is None:
+        return jsonify({"status": "error", "message": "Trabajo no encontrado"}), 404
+
+    def generar():
+        enviados = 0
+        while True:
+            eventos = trabajo.esperar_eventos(enviados, 15)
+            if not eventos:
+                yield ": ping\n\n"
+                continue
+            for evento in eventos:
+                yield f"data: {json.dumps(evento)}\n\n"
+            enviados += len(eventos)
+            if eventos[-1]['tipo'] == 'fin':
+                return
+
+    return Response(stream_with_context(generar()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route("/api/jobs/status", methods=['GET'])
+def handle_jobs_overview():
+    """
+    Ocupación del grupo de trabajadores.
+    """
+    return jsonify({"status": "success", "trabajos": gestor_trabajos.estado()})
+
+@app.route("/api/voice/status", methods=['GET'])
+def handle_voice_status():
+    """
+    Devuelve el estado del motor de voz: carga de los modelos, profundidad de la cola y ahorro del VAD.
+    Consultarlo no carga el subsistema si aún no se ha usado.
+    """
+    if not subsistema_voz.cargado:
+        return jsonify({"status": "success", "subsistema": subsistema_voz.estado()})
+    voz = subsistema_voz.obtener()
+    return jsonify({"status": "success", "subsistema": subsistema_voz.estado(), "motor": voz.motor_asr.estado(),
+                    "motor_corto": voz.motor_asr_corto.estado() if voz.motor_asr_corto else None,
+                    "vad": voz.detector_voz.estado(),
+                    "streaming": voz.sesiones.estado()})
+
+@app.route("/api/ia/stats", methods=['GET'])
+def handle_ia_stats():
+    """
+    Devuelve los contadores de la capa de IA (aciertos de la ruta rápida frente al LLM).
+    """
+    return jsonify({"status": "success", "estadisticas": estadisticas_ia()})
+
+@app.route("/api/logs", methods=['GET'])
+def handle_logs():
+    """
+    Eventos del registro compartido desde el cursor `desde`, filtrados por `nivel`
+    (depuracion/info/advertencia/error), `peticion` (request_id o job_id) y `categoria`.
+    La respuesta trae `siguiente` para pedir la página siguiente.
+    """
+    try:
+        desde = max(int(request.args.get('desde', 0)), 0)
+        limite = min(max(int(request.args.get('limite', MAX_EVENTOS_CONSULTA)), 1), MAX_EVENTOS_CONSULTA)
+        nivel = nivel_desde_texto(request.args.get('nivel'), 0)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"Parámetros inválidos: {e}"}), 400
+    pagina = registro_eventos.consultar(desde, nivel, request.args.get('peticion'),
+                                        request.args.get('categoria'), limite)
+    return jsonify({"status": "success", **pagina, "registro": registro_eventos.estado()})
+
+@app.route("/api/logs/stream", methods=['GET'])
+def handle_logs_stream():
+    """
+    Flujo Server-Sent Events con los eventos nuevos del registro (mismos filtros que /api/logs).
+    Sin `desde` empieza por los eventos que lleguen a partir de ahora.
+    """
+    try:
+        desde = request.args.get('desde')
+        desde = max(int(desde), 0) if desde is not None else registro_eventos.estado()['emitidos']
+        nivel = nivel_desde_texto(request.args.get('nivel'), 0)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"Parámetros inválidos: {e}"}), 400
+    peticion = request.args.get('peticion')
+    categoria = request.args.get('categoria')
+
+    def generar():
+        cursor = desde
+        while True:
+            if not registro_eventos.esperar(cursor, 15):
+                yield ": ping\n\n"
+                continue
+            pagina = registro_eventos.consultar(cursor, nivel, peticion, categoria)
+            for evento in pagina['eventos']:
+                yield f"data: {json.dumps(evento)}\n\n"
+            cursor = pagina['siguiente']
+
+    return Response(stream_with_context(generar()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route("/api/device/control", methods=['POST'])
 def handle_device_control():
@@ -268,7 +704,6 @@ def handle_device_control():
     Endpoint para control manual directo (botones del frontend).
     Evita el procesamiento de IA para una respuesta más rápida.
     """
-    logs = []
     data = request.json
     lugar = data.get('lugar')
     accion = data.get('accion')
@@ -276,15 +711,17 @@ def handle_device_control():
     if not lugar or not accion:
         return jsonify({"status": "error", "message": "Faltan parámetros 'lugar' o 'accion'."}), 400
 
-    logs.append(f"[MANUAL] Usuario activó botón: {accion} en {lugar.upper()}")
+    logs = _logs_peticion(data)
+    registrar(logs, INFO, 'MANUAL', "Usuario activó botón: %s en %s", accion, lugar.upper())
     
-    # Llamada directa al hardware
-    exito = controlar_maqueta(lugar, accion, logs)
+    # Llamada directa al hardware (se omite si la sombra ya lo da en ese estado, salvo 'forzar')
+    exito = controlar_maqueta(lugar, accion, logs, forzar=bool(data.get('forzar')))
     
     # Mantenemos compatibilidad de estructura devolviendo una lista de un solo elemento
     resultados = [{'accion': accion, 'lugar': lugar, 'exito': exito}]
+    almacen_datos.registrar_comando('manual', f"{accion} {lugar}", resultados)
     
-    return jsonify({"status": "success" if exito else "error", "resultados": resultados, "logs": logs})
+    return _respuesta_con_logs(logs, status="success" if exito else "error", resultados=resultados)
 
 @app.route("/api/servo", methods=['POST'])
 def handle_servo_control():
@@ -304,11 +741,13 @@ def handle_servo_control():
         if angle < 0: angle = 0
         if angle > 90: angle = 90
 
-        if arduino_serial and arduino_serial.is_open:
-            comando = f"SERVO:{angle}\n"
-            arduino_serial.write(comando.encode())
-            print(f"[ARDUINO SEND] Enviado comando servo: {comando.strip()}")
-            return jsonify({"status": "success", "angle": angle})
+        if arduino_conectado():
+            # Las ráfagas del deslizador se fusionan: solo se transmite el último ángulo en cola
+            ack = escritor_arduino.enviar(f"SERVO:{angle}")
+            if DEPURACION_SERIAL: print(f"[ARDUINO SEND] Enviado comando servo: {ack['comando']}")
+            sombra_dispositivos.actualizar('puerta', angle)
+            almacen_datos.registrar_comando('manual', f"SERVO:{angle}", [{'accion': str(angle), 'lugar': 'puerta', 'exito': True}])
+            return jsonify({"status": "success", "angle": angle, "ack": ack})
         else:
             return jsonify({"status": "error", "message": "Arduino no conectado"}), 500
     except ValueError:
@@ -329,16 +768,62 @@ def handle_arduino_led():
         return jsonify({"status": "error", "message": "Estado inválido"}), 400
         
     try:
-        if arduino_serial and arduino_serial.is_open:
-            comando = "LED:1\n" if state == 'ON' else "LED:0\n"
-            arduino_serial.write(comando.encode())
-            print(f"[ARDUINO SEND] Enviado comando LED: {comando.strip()}")
-            return jsonify({"status": "success", "state": state})
+        if arduino_conectado():
+            ack = escritor_arduino.enviar("LED:1" if state == 'ON' else "LED:0")
+            if DEPURACION_SERIAL: print(f"[ARDUINO SEND] Enviado comando LED: {ack['comando']}")
+            sombra_dispositivos.actualizar('alarma', state)
+            almacen_datos.registrar_comando('manual', ack['comando'], [{'accion': state, 'lugar': 'alarma', 'exito': True}])
+            return jsonify({"status": "success", "state": state, "ack": ack})
         else:
             return jsonify({"status": "error", "message": "Arduino no conectado"}), 500
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
+@app.route("/metrics", methods=['GET'])
+def handle_metrics():
+    """
+    Latencias por etapa (histogramas y p50/p95/p99), contadores y tasas en formato Prometheus.
+    """
+    return Response(metricas.exportar(), mimetype='text/plain; version=0.0.4')
+
+@app.route("/api/gateway/status", methods=['GET'])
+def handle_gateway_status():
+    """
+    Salud de la pasarela ESP32 (activo/degradado/caido), estado del cortocircuito y despacho.
+    """
+    return jsonify({"status": "success", "pasarela": monitor_pasarela.estado(), "despacho": cliente_gateway.estado()})
+
+@app.route("/api/state", methods=['GET'])
+def handle_state():
+    """
+    Último estado conocido de cada dispositivo, servido desde memoria (sin tocar el hardware).
+    """
+    return Response(sombra_dispositivos.json(), mimetype='application/json')
+
+@app.route("/api/serial/status", methods=['GET'])
+def handle_serial_status():
+    """
+    Estado de cada placa serie: conexión, líneas recibidas y últimas lecturas propias.
+    """
+    return jsonify({"status": "success", "placas": subsistema_serial.obtener().estado()})
+
+@app.route("/api/rules/status", methods=['GET'])
+def handle_rules_status():
+    """
+    Estado de las automatizaciones: cada regla con su condición, si está activa,
+    cuántas veces se ha disparado y la última latencia de la lectura a la escritura.
+    """
+    return jsonify({"status": "success", **motor_reglas.estado(),
+                    "latencia": {r.nombre: metricas.percentiles("regla_reaccion_segundos", regla=r.nombre)
+                                 for r in motor_reglas.reglas}})
+
+@app.route("/api/arduino/status", methods=['GET'])
+def handle_arduino_status():
+    """
+    Estado del escritor serial: órdenes en cola, fusionadas y deduplicadas.
+    """
+    return jsonify({"status": "success", "escritor": escritor_arduino.estado()})
+
 @app.route("/api/sensor/gas", methods=['GET'])
 def handle_gas_sensor():
     """
@@ -361,14 +846,166 @@ def handle_distance_sensor():
         "distance": latest_distance
     })
 
+@app.route("/api/sensor/stream", methods=['GET'])
+def handle_sensor_stream():
+    """
+    Flujo Server-Sent Events con la instantánea combinada de sensores.
+    Se envía un mensaje en cuanto el hilo serial interpreta una lectura nueva.
+    """
+    suscripcion = difusor_sensores.suscribir()
+    if suscripcion is None:
+        return jsonify({"status": "error", "message": "Demasiados clientes conectados. Usa /api/sensor/poll."}), 503
+
+    def generar():
+        try:
+            yield "retry: 2000\n\n"
+            while True:
+                try:
+                    mensaje = suscripcion.cola.get(timeout=15)
+                except queue.Empty:
+                    # Comentario SSE como latido para detectar clientes desconectados
+                    yield ": ping\n\n"
+                    continue
+                if mensaje is None:
+                    break  # Cliente expulsado por no vaciar su cola a tiempo
+                yield f"data: {mensaje}\n\n"
+        finally:
+            difusor_sensores.cancelar(suscripcion)
+
+    return Response(stream_with_context(generar()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route("/api/sensor/poll", methods=['GET'])
+def handle_sensor_poll():
+    """
+    Alternativa de long-polling al flujo SSE.
+    Espera (máx. 25 s) a que haya una versión posterior a `?version=N` y la devuelve.
+    """
+    try:
+        version = int(request.args.get('version', -1))
+    except ValueError:
+        return jsonify({"status": "error", "message": "El parámetro 'version' debe ser un entero"}), 400
+    instantanea = difusor_sensores.esperar_cambio(version, timeout=25)
+    return jsonify({"status": "success", **instantanea})
+
+@app.route("/api/sensor/history", methods=['GET'])
+def handle_sensor_history():
+    """
+    Historial reducido de un canal: ?canal=gas&desde=-86400&puntos=200
+    `desde`/`hasta` son marcas epoch en segundos; un valor negativo en `desde` significa
+    "hace N segundos". Devuelve mín/máx/media por cubeta en columnas.
+    """
+    canal = request.args.get('canal', 'gas')
+    if canal not in CANALES_HISTORIAL:
+        return jsonify({"status": "error", "message": f"Canal inválido. Opciones: {list(CANALES_HISTORIAL)}"}), 400
+    try:
+        ahora = time.time()
+        hasta = float(request.args.get('hasta', ahora))
+        desde = float(request.args.get('desde', -3600))
+        puntos = int(request.args.get('puntos', 200))
+    except ValueError:
+        return jsonify({"status": "error", "message": "'desde', 'hasta' y 'puntos' deben ser numéricos"}), 400
+    if desde < 0:
+        desde = ahora + desde
+    if desde >= hasta:
+        return jsonify({"status": "error", "message": "'desde' debe ser anterior a 'hasta'"}), 400
+
+    datos = historial_sensores.consultar(canal, desde, hasta, puntos)
+    return jsonify({"status": "success", "canal": canal, "desde": desde, "hasta": hasta, **datos})
+
+def _rango_tiempo_registro():
+    """Lee ?desde=&hasta=&limite= (epoch en segundos; `desde` negativo = hace N segundos)."""
+    ahora = time.time()
+    hasta = float(request.args.get('hasta', ahora))
+    desde = float(request.args.get('desde', -3600))
+    # LIMIT -1 en SQLite es "sin límite": se acota por ambos lados
+    limite = max(1, min(int(request.args.get('limite', 1000)), MAX_FILAS_CONSULTA))
+    return (ahora + desde if desde < 0 else desde), hasta, limite
+
+@app.route("/api/registro/muestras", methods=['GET'])
+def handle_registro_muestras():
+    """
+    Lecturas de sensores persistidas en un rango de tiempo (para análisis de incidentes).
+    """
+    try:
+        desde, hasta, limite = _rango_tiempo_registro()
+        filas = almacen_datos.consultar_muestras(desde, hasta, limite)
+    except ValueError:
+        return jsonify({"status": "error", "message": "'desde', 'hasta' y 'limite' deben ser numéricos"}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    return jsonify({"status": "success", "desde": desde, "hasta": hasta, "muestras": filas})
+
+@app.route("/api/registro/comandos", methods=['GET'])
+def handle_registro_comandos():
+    """
+    Comandos ejecutados (texto, voz y manuales) y su resultado en un rango de tiempo.
+    """
+    try:
+        desde, hasta, limite = _rango_tiempo_registro()
+        filas = almacen_datos.consultar_comandos(desde, hasta, limite)
+    except ValueError:
+        return jsonify({"status": "error", "message": "'desde', 'hasta' y 'limite' deben ser numéricos"}), 400
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 500
+    return jsonify({"status": "success", "desde": desde, "hasta": hasta, "comandos": filas})
+
+@app.route("/api/registro/status", methods=['GET'])
+def handle_registro_status():
+    """
+    Estado del almacén persistente: filas pendientes de volcar, escritas, lotes fallidos,
+    filas descartadas y duración del último volcado.
+    """
+    return jsonify({"status": "success", "almacen": almacen_datos.estado()})
+
+@app.route("/api/system/status", methods=['GET'])
+def handle_system_status():
+    """
+    Informe de arranque: tiempo del núcleo, memoria residente y estado de cada subsistema
+    opcional (modo, si está cargado, cuándo, tiempo de carga y memoria añadida).
+    """
+    memoria = memoria_residente_mb()
+    return jsonify({"status": "success", "arranque_nucleo_s": round(tiempo_arranque_nucleo, 4),
+                    "memoria_mb": round(memoria, 1) if memoria is not None else None,
+                    "subsistemas": informe_subsistemas(), "recursos_estaticos": recursos_estaticos.estado()})
+
+# Núcleo importado y configurado: lo que tarde a partir de aquí corresponde a los subsistemas
+tiempo_arranque_nucleo = time.perf_counter() - _INICIO_ARRANQUE
+
 # --- Bloque de Ejecución ---
 if __name__ == "__main__":
-    # Iniciar el hilo de lectura serial aquí para evitar duplicidad de procesos
-    hilo_serial = threading.Thread(target=leer_sensor_arduino, daemon=True)
-    hilo_serial.start()
+    # Registro persistente (SQLite en WAL) con su hilo escritor por lotes
+    almacen_datos.iniciar()
+
+    # Sondeo de salud del ESP32 (abre/cierra el cortocircuito de las órdenes)
+    monitor_pasarela.iniciar()
+
+    # Refresco periódico de la sombra de estado con lo que reporta la pasarela
+    sombra_dispositivos.iniciar_reconciliacion(leer_estado_pasarela)
+
+    # Hilo que ejecuta las acciones de las reglas (la evaluación va en el reactor serial)
+    motor_reglas.iniciar()
+
+    # Subsistemas opcionales en modo 'si' (WASI_SERIAL, WASI_VOZ, WASI_LLM): se cargan ya;
+    # los 'diferido' esperan a la primera petición que los necesite y los 'no' quedan fuera
+    subsistema_serial.iniciar()
+    subsistema_voz.iniciar()
+    llm.iniciar()
+
+    # Fijar llama3 en memoria de Ollama para que la primera orden no espere a la carga del modelo
+    if llm.cargado:
+        threading.Thread(target=precargar_modelo_ia, daemon=True).start()
+
+    imprimir_informe_arranque(tiempo_arranque_nucleo)
+
+    # Panel minificado y precomprimido una sola vez (se reconstruye si cambian las fuentes)
+    recursos_estaticos.construir()
+    estado_recursos = recursos_estaticos.estado()
+    print(f"[ARRANQUE] Panel: {len(estado_recursos['recursos'])} recursos precomprimidos en "
+          f"{estado_recursos['tiempo_construccion_ms']} ms (brotli: {'sí' if estado_recursos['brotli'] else 'no'})")
 
     # Iniciar el servidor de desarrollo de Flask
     # IMPORTANTE: use_reloader=False es OBLIGATORIO al usar puertos Serial y Threads.
     # Evita que Flask cree un proceso hijo que no pueda acceder al puerto COM.
     print("Iniciando servidor Flask en http://0.0.0.0:5000")
-    app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False)
+    app.run(host='0.0.0.0', port=int(os.environ.get('WASI_PUERTO_HTTP', 5000)), debug=MODO_DEPURACION, use_reloader=False)
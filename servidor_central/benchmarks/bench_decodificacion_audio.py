@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de la etapa de decodificación de audio del endpoint de voz.
+
+Compara, por clip, la latencia y el pico de memoria de:
+  - Ruta anterior: pydub (subproceso ffmpeg) -> WAV en BytesIO -> sr.AudioFile -> PCM 16 kHz.
+  - Ruta actual:   PyAV en proceso -> float32 mono 16 kHz (decodificador_audio).
+
+Uso:
+    python benchmarks/bench_decodificacion_audio.py [clip.webm ...] [--repeticiones N]
+
+Si no se indican clips se generan grabaciones WebM/Opus sintéticas de 3 y 5 segundos
+(la duración típica que envía el panel).
+"""
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+
+import av
+import numpy as np
+
+try:
+    import resource  # Solo POSIX: en Windows no se mide el RSS de los subprocesos
+except ImportError:
+    resource = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from decodificador_audio import decodificar_audio  # noqa: E402
+from motor_voz import FRECUENCIA_MUESTREO  # noqa: E402
+
+
+def generar_clip_webm(segundos, frecuencia=48000):
+    """Genera en memoria un clip WebM/Opus similar al que produce MediaRecorder."""
+    salida = io.BytesIO()
+    with av.open(salida, mode="w", format="webm") as contenedor:
+        pista = contenedor.add_stream("libopus", rate=frecuencia)
+        pista.layout = "mono"
+        t = np.arange(int(segundos * frecuencia)) / frecuencia
+        senal = (0.3 * np.sin(2 * np.pi * 220 * t) + 0.05 * np.random.randn(t.size)).astype(np.float32)
+        for inicio in range(0, senal.size, 960):
+            bloque = senal[inicio:inicio + 960].reshape(1, -1)
+            frame = av.AudioFrame.from_ndarray(bloque, format="flt", layout="mono")
+            frame.sample_rate = frecuencia
+            for paquete in pista.encode(frame):
+                contenedor.mux(paquete)
+        for paquete in pista.encode(None):
+            contenedor.mux(paquete)
+    return salida.getvalue()
+
+
+def ruta_anterior(datos):
+    """Réplica de la ruta pydub -> WAV -> AudioFile que usaba handle_voice_command."""
+    import speech_recognition as sr
+    from pydub import AudioSegment
+
+    song = AudioSegment.from_file(io.BytesIO(datos))
+    wav_io = io.BytesIO()
+    song.export(wav_io, format="wav")
+    wav_io.seek(0)
+    recognizer = sr.Recognizer()
+    with sr.AudioFile(wav_io) as source:
+        audio_data = recognizer.record(source)
+    pcm = audio_data.get_raw_data(convert_rate=FRECUENCIA_MUESTREO, convert_width=2)
+    return np.frombuffer(pcm, np.int16).astype(np.float32) / 32768.0
+
+
+def ruta_actual(datos):
+    return decodificar_audio(io.BytesIO(datos))
+
+
+def medir(funcion, datos, repeticiones):
+    """
+    Devuelve latencias (ms), pico de memoria Python (KiB) y el RSS máximo de los hijos
+    (KiB; None sin el módulo `resource`). Ese RSS es el máximo acumulado de todos los
+    subprocesos terminados desde que arrancó el benchmark, no una medida solo de esta ruta.
+    """
+    funcion(datos)  # Calentamiento (carga de códecs, imports perezosos)
+    latencias = []
+    pico = 0
+    for _ in range(repeticiones):
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        funcion(datos)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        pico = max(pico, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    rss_hijos = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss if resource is not None else None
+    return latencias, pico / 1024, rss_hijos
+
+
+def imprimir(nombre, latencias, pico_kib, rss_hijos_kib=None):
+    p50 = statistics.median(latencias)
+    p95 = sorted(latencias)[max(0, int(len(latencias) * 0.95) - 1)]
+    linea = f"  {nombre:<8} p50={p50:8.2f} ms  p95={p95:8.2f} ms  pico_py={pico_kib:9.1f} KiB"
+    if rss_hijos_kib is not None:
+        linea += f"  rss_hijos_max_acum={rss_hijos_kib} KiB"
+    print(linea)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("clips", nargs="*", help="Rutas a clips de audio reales (WebM/Opus, WAV, ...)")
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.clips:
+        clips = [(os.path.basename(ruta), open(ruta, "rb").read()) for ruta in args.clips]
+    else:
+        clips = [(f"sintetico_{s}s.webm", generar_clip_webm(s)) for s in (3, 5)]
+
+    for nombre, datos in clips:
+        print(f"\nClip {nombre} ({len(datos) / 1024:.1f} KiB)")
+        latencias, pico, _ = medir(ruta_actual, datos, args.repeticiones)
+        imprimir("actual", latencias, pico)  # Sin subprocesos: todo ocurre en proceso
+        try:
+            imprimir("anterior", *medir(ruta_anterior, datos, args.repeticiones))
+        except Exception as e:
+            # pydub necesita el binario ffmpeg en el PATH
+            print(f"  anterior no disponible: {e}")
+
+    print("\nNota: 'pico_py' mide asignaciones vistas por tracemalloc (incluye NumPy); "
+          "'rss_hijos_max_acum' es el RSS máximo de cualquier subproceso ffmpeg lanzado por pydub "
+          "hasta ese momento (acumulado sobre todos los clips; no disponible en Windows).")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de extremo a extremo del servidor sin la maqueta física.
+
+Levanta una pasarela ESP32 simulada, un Ollama simulado y un Arduino simulado sobre
+un pseudo-terminal (ver benchmarks/simuladores.py), arranca `app.py` como proceso
+aparte apuntando a ellos (variables WASI_*) y lanza cada escenario con N clientes
+concurrentes. Por escenario informa de peticiones/s, latencia p50/p95/p99/máx,
+errores, CPU consumida por el servidor y líneas seriales procesadas por segundo.
+
+Los resultados se guardan en JSON; con --comparar se contrastan con una ejecución
+anterior y se marcan las regresiones.
+
+Uso:
+    python benchmarks/bench_e2e.py [--duracion S] [--concurrencia N] [--escenarios a,b]
+        [--latencia-esp32 S] [--fallos-esp32 P] [--retardo-ollama S] [--lineas-serial N]
+        [--salida resultados.json] [--comparar anterior.json]
+
+Requiere Linux o macOS (pty). La transcripción de voz no se mide aquí (depende de
+Whisper y del audio); ver bench_decodificacion_audio.py.
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from simuladores import AMBIENTES, ArduinoSimulado, OllamaSimulado, PasarelaSimulada  # noqa: E402
+
+DIRECTORIO_SERVIDOR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TIMEOUT_ARRANQUE = 60
+UMBRAL_REGRESION = 0.10   # 10 % peor en peticiones/s o p95 se marca como regresión
+
+COMANDOS_PARSER = [
+    "enciende la cocina", "apaga la cochera", "enciende la sala y la cochera",
+    "apaga todas", "enciende todas menos la cocina", "apaga el dormitorio",
+]
+
+
+# --- Escenarios: cada uno hace una petición y devuelve True si tuvo éxito ---
+
+def _estado(sesion, base, n):
+    return sesion.get(f"{base}/api/state", timeout=10).status_code == 200
+
+
+def _historial(sesion, base, n):
+    r = sesion.get(f"{base}/api/sensor/history", params={'canal': 'gas', 'desde': -60, 'puntos': 100}, timeout=10)
+    return r.status_code == 200
+
+
+def _comando_parser(sesion, base, n):
+    r = sesion.post(f"{base}/api/command", json={'command': random.choice(COMANDOS_PARSER), 'forzar': True}, timeout=30)
+    return r.status_code == 200 and r.json().get('status') == 'success'
+
+
+def _comando_llm(sesion, base, n):
+    # Orden que la gramática no entiende y distinta cada vez (sin acierto de caché)
+    r = sesion.post(f"{base}/api/command", json={'command': f"deja la cocina como estaba la vez {n}", 'forzar': True}, timeout=60)
+    return r.status_code == 200 and r.json().get('status') == 'success'
+
+
+def _control_manual(sesion, base, n):
+    cuerpo = {'lugar': random.choice(AMBIENTES), 'accion': random.choice(['ON', 'OFF']), 'forzar': True}
+    r = sesion.post(f"{base}/api/device/control", json=cuerpo, timeout=30)
+    return r.status_code == 200 and r.json().get('status') == 'success'
+
+
+def _servo(sesion, base, n):
+    r = sesion.post(f"{base}/api/servo", json={'angle': random.randint(0, 90)}, timeout=10)
+    return r.status_code == 200
+
+
+def _trabajo_comando(sesion, base, n):
+    r = sesion.post(f"{base}/api/jobs/command", json={'command': random.choice(COMANDOS_PARSER), 'forzar': True}, timeout=10)
+    if r.status_code != 202:
+        return False
+    id_trabajo, desde = r.json()['job_id'], 0
+    while True:
+        trabajo = sesion.get(f"{base}/api/jobs/{id_trabajo}", params={'desde': desde, 'espera': 10}, timeout=30).json()
+        desde = trabajo['siguiente']
+        if trabajo['estado'] in ('completado', 'error'):
+            return trabajo['estado'] == 'completado'
+
+
+def _mixto(sesion, base, n):
+    # Panel típico: muchas lecturas de estado, algunos botones y órdenes de texto
+    escenario = random.choices([_estado, _historial, _control_manual, _comando_parser, _servo],
+                               weights=[50, 10, 15, 15, 10])[0]
+    return escenario(sesion, base, n)
+
+
+ESCENARIOS = {
+    'estado': _estado,
+    'historial': _historial,
+    'comando_parser': _comando_parser,
+    'comando_llm': _comando_llm,
+    'control_manual': _control_manual,
+    'servo': _servo,
+    'trabajo_comando': _trabajo_comando,
+    'mixto': _mixto,
+}
+
+
+# --- Medición ---
+
+def cpu_proceso(pid):
+    """Segundos de CPU (usuario + sistema) del proceso, leídos de /proc. None si no hay /proc."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            campos = f.read().rsplit(')', 1)[1].split()
+        return (int(campos[11]) + int(campos[12])) / os.sysconf('SC_CLK_TCK')
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def lineas_serial_procesadas(base):
+    """Contador de líneas seriales procesadas según /metrics."""
+    try:
+        texto = requests.get(f"{base}/metrics", timeout=5).text
+    except requests.exceptions.RequestException:
+        return None
+    total = 0
+    for linea in texto.splitlines():
+        if linea.startswith('wasi_serial_lineas_total{') and 'procesada' in linea:
+            total += float(linea.rsplit(' ', 1)[1])
+    return total
+
+
+def percentil(valores, q):
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(q * len(ordenados)))]
+
+
+def ejecutar_escenario(nombre, base, pid, duracion, concurrencia):
+    funcion = ESCENARIOS[nombre]
+    latencias, errores = [], [0]
+    contador = [0]
+    lock = threading.Lock()
+    fin = time.monotonic() + duracion
+
+    def cliente():
+        sesion = requests.Session()
+        while time.monotonic() < fin:
+            with lock:
+                contador[0] += 1
+                n = contador[0]
+            inicio = time.perf_counter()
+            try:
+                ok = funcion(sesion, base, n)
+            except requests.exceptions.RequestException:
+                ok = False
+            duracion_peticion = time.perf_counter() - inicio
+            with lock:
+                latencias.append(duracion_peticion)
+                if not ok:
+                    errores[0] += 1
+
+    cpu_inicio, lineas_inicio, t_inicio = cpu_proceso(pid), lineas_serial_procesadas(base), time.perf_counter()
+    hilos = [threading.Thread(target=cliente) for _ in range(concurrencia)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    transcurrido = time.perf_counter() - t_inicio
+    cpu_fin, lineas_fin = cpu_proceso(pid), lineas_serial_procesadas(base)
+
+    cpu = None if cpu_inicio is None or cpu_fin is None else cpu_fin - cpu_inicio
+    ms = lambda v: None if v is None else round(v * 1000, 2)
+    return {
+        'peticiones': len(latencias),
+        'errores': errores[0],
+        'duracion_s': round(transcurrido, 2),
+        'peticiones_por_s': round(len(latencias) / transcurrido, 1),
+        'p50_ms': ms(percentil(latencias, 0.50)),
+        'p95_ms': ms(percentil(latencias, 0.95)),
+        'p99_ms': ms(percentil(latencias, 0.99)),
+        'max_ms': ms(max(latencias) if latencias else None),
+        'cpu_servidor_s': None if cpu is None else round(cpu, 2),
+        'cpu_servidor_pct': None if cpu is None else round(100 * cpu / transcurrido, 1),
+        'lineas_serial_por_s': None if lineas_inicio is None or lineas_fin is None
+        else round((lineas_fin - lineas_inicio) / transcurrido, 1),
+    }
+
+
+# --- Servidor bajo prueba ---
+
+def arrancar_servidor(pasarela, ollama, arduino, directorio_temporal):
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        puerto = s.getsockname()[1]
+    entorno = dict(os.environ,
+                   WASI_IP_ESP32=f"127.0.0.1:{pasarela.puerto}",
+                   WASI_URL_OLLAMA=f"http://127.0.0.1:{ollama.puerto}/api/generate",
+                   WASI_ARDUINO_PORT=arduino.ruta,
+                   WASI_PUERTO_HTTP=str(puerto),
+                   WASI_RUTA_BASE_DATOS=os.path.join(directorio_temporal, "registro_bench.db"),
+                   WASI_RUTA_CACHE_INTENCIONES=os.path.join(directorio_temporal, "cache_intenciones_bench.json"))
+    ruta_log = os.path.join(directorio_temporal, "servidor.log")
+    log = open(ruta_log, "w")
+    proceso = subprocess.Popen([sys.executable, "app.py"], cwd=DIRECTORIO_SERVIDOR, env=entorno,
+                               stdout=log, stderr=subprocess.STDOUT)
+    base = f"http://127.0.0.1:{puerto}"
+    limite = time.monotonic() + TIMEOUT_ARRANQUE
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            raise RuntimeError(f"El servidor terminó al arrancar; ver {ruta_log}")
+        try:
+            if requests.get(f"{base}/api/state", timeout=1).status_code == 200:
+                return proceso, base, ruta_log
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.2)
+    proceso.kill()
+    raise RuntimeError(f"El servidor no respondió en {TIMEOUT_ARRANQUE}s; ver {ruta_log}")
+
+
+def comparar(actual, ruta_anterior):
+    with open(ruta_anterior, encoding="utf-8") as f:
+        anterior = json.load(f)
+    print(f"\nComparación con {ruta_anterior} ({anterior.get('fecha')}, {anterior.get('commit')}):")
+    regresiones = 0
+    for nombre, datos in actual['escenarios'].items():
+        previo = anterior.get('escenarios', {}).get(nombre)
+        if not previo:
+            continue
+        d_rps = (datos['peticiones_por_s'] - previo['peticiones_por_s']) / max(previo['peticiones_por_s'], 1e-9)
+        d_p95 = ((datos['p95_ms'] or 0) - (previo['p95_ms'] or 0)) / max(previo['p95_ms'] or 0, 1e-9)
+        regresion = d_rps < -UMBRAL_REGRESION or d_p95 > UMBRAL_REGRESION
+        regresiones += regresion
+        print(f"  {nombre:<16} pet/s {d_rps:+7.1%}   p95 {d_p95:+7.1%}" + ("   <- REGRESIÓN" if regresion else ""))
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duracion", type=float, default=10.0, help="Segundos por escenario")
+    parser.add_argument("--concurrencia", type=int, default=8)
+    parser.add_argument("--escenarios", default=",".join(ESCENARIOS))
+    parser.add_argument("--latencia-esp32", type=float, default=0.02)
+    parser.add_argument("--fallos-esp32", type=float, default=0.0)
+    parser.add_argument("--retardo-ollama", type=float, default=0.15, help="Segundos hasta el primer token")
+    parser.add_argument("--lineas-serial", type=float, default=20, help="Líneas por segundo del Arduino simulado")
+    parser.add_argument("--salida", default=None, help="Ruta del JSON de resultados")
+    parser.add_argument("--comparar", default=None, help="JSON de una ejecución anterior")
+    args = parser.parse_args()
+
+    escenarios = [e.strip() for e in args.escenarios.split(',') if e.strip()]
+    desconocidos = [e for e in escenarios if e not in ESCENARIOS]
+    if desconocidos:
+        parser.error(f"Escenarios desconocidos: {desconocidos}. Disponibles: {list(ESCENARIOS)}")
+
+    pasarela = PasarelaSimulada(latencia=args.latencia_esp32, tasa_fallos=args.fallos_esp32).iniciar()
+    ollama = OllamaSimulado(retardo_primer_token=args.retardo_ollama).iniciar()
+    arduino = ArduinoSimulado(lineas_por_segundo=args.lineas_serial).iniciar()
+    directorio_temporal = tempfile.mkdtemp(prefix="wasi_bench_")
+    proceso, base, ruta_log = arrancar_servidor(pasarela, ollama, arduino, directorio_temporal)
+    print(f"Servidor en {base} (log: {ruta_log})")
+    print(f"{args.concurrencia} clientes, {args.duracion:.0f}s por escenario\n")
+
+    resultados = {}
+    try:
+        for nombre in escenarios:
+            datos = ejecutar_escenario(nombre, base, proceso.pid, args.duracion, args.concurrencia)
+            resultados[nombre] = datos
+            print(f"  {nombre:<16} {datos['peticiones_por_s']:8.1f} pet/s  p50 {datos['p50_ms']} ms  "
+                  f"p95 {datos['p95_ms']} ms  p99 {datos['p99_ms']} ms  errores {datos['errores']}  "
+                  f"CPU {datos['cpu_servidor_pct']}%  serial {datos['lineas_serial_por_s']} l/s")
+    finally:
+        proceso.terminate()
+        proceso.wait(timeout=10)
+        arduino.detener()
+        pasarela.detener()
+        ollama.detener()
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=DIRECTORIO_SERVIDOR,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    informe = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'commit': commit,
+        'python': sys.version.split()[0],
+        'configuracion': vars(args),
+        'simuladores': {'peticiones_esp32': pasarela.peticiones, 'fallos_esp32': pasarela.fallos,
+                        'peticiones_ollama': ollama.peticiones, 'lineas_serial_enviadas': arduino.lineas_enviadas,
+                        'ordenes_arduino_recibidas': len(arduino.ordenes)},
+        'escenarios': resultados,
+    }
+    salida = args.salida or f"resultados_e2e_{datetime.now():%Y%m%d_%H%M%S}.json"
+    with open(salida, "w", encoding="utf-8") as f:
+        json.dump(informe, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {salida}")
+
+    if args.comparar:
+        sys.exit(1 if comparar(informe, args.comparar) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de las capas de interpretación de órdenes previas al LLM.
+
+Sobre el corpus etiquetado `corpus_comandos.json` (órdenes exactas, con sinónimos,
+con errores de Whisper, de varios ambientes y ajenas a la domótica) mide, para la
+gramática sola y para la gramática seguida del clasificador:
+  - cobertura: órdenes de domótica resueltas sin llegar al LLM,
+  - precisión: de las resueltas, cuántas coinciden con la etiqueta,
+  - falsos positivos: órdenes ajenas que se resolvieron igualmente,
+  - latencia p50/p99 por orden.
+Además mide la carga del índice precalculado frente a reconstruirlo.
+
+Uso:
+    python benchmarks/bench_intenciones.py [--repeticiones N] [--detalle]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clasificador_intenciones import ClasificadorIntenciones, construir_indice  # noqa: E402
+from gestion_ia import LUGARES_VALIDOS  # noqa: E402
+from parser_intenciones import ParserIntenciones  # noqa: E402
+
+RUTA_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus_comandos.json")
+
+
+def sin_confianza(resultado):
+    if resultado is None:
+        return None
+    return [{'accion': a['accion'], 'lugar': a['lugar']} for a in resultado['acciones']]
+
+
+def evaluar(nombre, interpretar, corpus, repeticiones, detalle):
+    aciertos = resueltas = dominio = falsos_positivos = 0
+    latencias = []
+    for entrada in corpus:
+        for _ in range(repeticiones):
+            inicio = time.perf_counter()
+            acciones = interpretar(entrada['texto'])
+            latencias.append(time.perf_counter() - inicio)
+
+        esperado = entrada['acciones']
+        if esperado is None:
+            falsos_positivos += acciones is not None
+        else:
+            dominio += 1
+            resueltas += acciones is not None
+            aciertos += acciones == esperado
+        if detalle and acciones != esperado and not (acciones is None and esperado is not None):
+            print(f"    [{nombre}] '{entrada['texto']}' -> {acciones} (esperado {esperado})")
+
+    p50, p99 = np.percentile(np.array(latencias) * 1e6, [50, 99])
+    ajenas = len(corpus) - dominio
+    print(f"  {nombre:<22} cobertura {resueltas:>3}/{dominio} ({100 * resueltas / dominio:5.1f}%)  "
+          f"precisión {100 * aciertos / max(resueltas, 1):5.1f}%  "
+          f"falsos positivos {falsos_positivos}/{ajenas}  "
+          f"p50 {p50:7.1f} µs  p99 {p99:7.1f} µs")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=50)
+    parser.add_argument("--detalle", action="store_true", help="Muestra las órdenes mal resueltas")
+    args = parser.parse_args()
+
+    with open(RUTA_CORPUS, encoding="utf-8") as f:
+        corpus = json.load(f)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta_indice = os.path.join(directorio, "indice_intenciones.npz")
+        inicio = time.perf_counter()
+        indice = construir_indice(LUGARES_VALIDOS)
+        np.savez_compressed(ruta_indice, **indice)
+        construccion = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        clasificador = ClasificadorIntenciones(LUGARES_VALIDOS, ruta_indice=ruta_indice).cargar()
+        carga = time.perf_counter() - inicio
+    gramatica = ParserIntenciones(LUGARES_VALIDOS)
+
+    def solo_gramatica(texto):
+        resultado = gramatica.interpretar(texto)
+        return resultado['acciones'] if resultado else None
+
+    def gramatica_y_clasificador(texto):
+        resultado = gramatica.interpretar(texto)
+        if resultado is not None:
+            return resultado['acciones']
+        return sin_confianza(clasificador.clasificar(texto))
+
+    print(f"{len(corpus)} órdenes, {args.repeticiones} repeticiones; índice de {len(indice['frases'])} frases: "
+          f"construcción {construccion * 1000:.1f} ms, carga {carga * 1000:.1f} ms\n")
+    evaluar("gramática", solo_gramatica, corpus, args.repeticiones, args.detalle)
+    evaluar("clasificador", lambda t: sin_confianza(clasificador.clasificar(t)), corpus, args.repeticiones, args.detalle)
+    evaluar("gramática+clasificador", gramatica_y_clasificador, corpus, args.repeticiones, args.detalle)
+    print("\n  El resto de órdenes de domótica (y todas las ajenas) llega al LLM.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark de la carga del panel de control (índice, CSS, JS y sonido de la alarma).
+
+Compara peticiones y bytes transferidos en una primera visita y en una visita repetida:
+  - Ruta anterior: plantilla renderizada y /static/ sin comprimir ni caché de larga duración
+    (el navegador revalida cada recurso en cada visita).
+  - Ruta actual:   índice pre-renderizado y /recursos/ minificados, versionados por hash
+    y precomprimidos; en la visita repetida solo se revalida el índice (304).
+
+Uso:
+    python benchmarks/bench_panel.py [--repeticiones N]
+"""
+
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+
+os.environ.setdefault("WASI_VOZ", "no")
+os.environ.setdefault("WASI_LLM", "no")
+os.environ.setdefault("WASI_SERIAL", "no")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import render_template  # noqa: E402
+
+from app import app, recursos_estaticos  # noqa: E402
+
+ACEPTA = {'Accept-Encoding': 'gzip, deflate, br'}
+
+
+def visita_anterior(cliente, etags):
+    """Índice renderizado en cada petición + /static/ revalidado recurso a recurso."""
+    with app.test_request_context():
+        html = render_template('index.html')
+    peticiones, transferidos = 1, len(html.encode('utf-8'))
+    for url in re.findall(r'(?:href|src)="(/static/[^"]+)"', html):
+        cabeceras = {'If-None-Match': etags[url]} if url in etags else {}
+        respuesta = cliente.get(url, headers=cabeceras)
+        etags[url] = respuesta.headers.get('ETag')
+        peticiones += 1
+        transferidos += len(respuesta.data)
+        respuesta.close()
+    return peticiones, transferidos
+
+
+def visita_actual(cliente, etags, en_cache):
+    """Índice revalidado por ETag; los recursos versionados no se piden si ya están en caché."""
+    cabeceras = dict(ACEPTA, **({'If-None-Match': etags['/']} if '/' in etags else {}))
+    respuesta = cliente.get('/', headers=cabeceras)
+    etags['/'] = respuesta.headers.get('ETag')
+    peticiones, transferidos = 1, len(respuesta.data)
+    for url in (recursos['url'] for nombre, recursos in recursos_estaticos.estado()['recursos'].items()
+                if nombre != 'index.html'):
+        if url in en_cache:
+            continue
+        respuesta = cliente.get(url, headers=ACEPTA)
+        en_cache.add(url)
+        peticiones += 1
+        transferidos += len(respuesta.data)
+    return peticiones, transferidos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticiones", type=int, default=50)
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    recursos_estaticos.construir()
+    print(f"Construcción del panel: {(time.perf_counter() - inicio) * 1000:.1f} ms\n")
+
+    cliente = app.test_client()
+    for nombre, visita in (("anterior", lambda e, c: visita_anterior(cliente, e)),
+                           ("actual", lambda e, c: visita_actual(cliente, e, c))):
+        etags, en_cache = {}, set()
+        primera = visita(etags, en_cache)
+        repetida = visita(etags, en_cache)
+        tiempos = []
+        for _ in range(args.repeticiones):
+            inicio = time.perf_counter()
+            visita(etags, en_cache)
+            tiempos.append(time.perf_counter() - inicio)
+        print(f"  {nombre:<9} primera visita {primera[0]} peticiones, {primera[1] / 1024:7.1f} KB   "
+              f"visita repetida {repetida[0]} peticiones, {repetida[1] / 1024:6.1f} KB   "
+              f"servidor {statistics.median(tiempos) * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
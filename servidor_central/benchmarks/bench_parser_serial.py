@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark del intérprete de líneas seriales del Arduino.
+
+Compara líneas/segundo del código anterior de `leer_sensor_arduino` (cuatro
+re.search sin compilar, limpiezas encadenadas y un print por línea) con
+`parser_serial.interpretar_linea`, y estima qué fracción de un núcleo consume cada
+uno al ritmo máximo de líneas que admite el enlace a 9600 y 115200 baudios.
+
+Uso:
+    python benchmarks/bench_parser_serial.py [--lineas N]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from parser_serial import interpretar_linea  # noqa: E402
+
+# Mezcla representativa de lo que imprime el sketch (documentacion/arduino.md)
+LINEAS_MUESTRA = [
+    "Distancia: 45cm",
+    "Distancia: 120cm",
+    "Distancia: ---",
+    "Distancia: 38cm | Gas: 120 | Temp: 24.50C | Hum: 60.00%",
+    "Distancia: 12cm | Gas: 135 | Temp: nanC | Hum: nan%",
+    "ALERTA | Gas: 512",
+    "--- Puerta Abierta por Proximidad ---",
+]
+
+
+def interpretar_anterior(linea, estado):
+    """Réplica del cuerpo del bucle serial anterior (incluidos sus print de depuración)."""
+    if linea: print(f"[SERIAL RAW] Recibido: '{linea}'")
+    match_gas = re.search(r'Gas:\s*(\d+)', linea)
+    if match_gas:
+        estado['gas'] = int(match_gas.group(1))
+    match_temp = re.search(r'Temp:\s*([-\d\w\.]+)', linea)
+    if match_temp:
+        val_str = match_temp.group(1).replace('C', '').replace('c', '').strip()
+        if 'nan' in val_str.lower():
+            estado['temp'] = None
+        else:
+            try:
+                estado['temp'] = float(val_str)
+            except ValueError:
+                estado['temp'] = None
+    match_hum = re.search(r'Hum:\s*([-\d\w\.]+)', linea)
+    if match_hum:
+        val_str = match_hum.group(1).replace('%', '').strip()
+        if 'nan' in val_str.lower():
+            estado['hum'] = None
+        else:
+            try:
+                estado['hum'] = float(val_str)
+            except ValueError:
+                estado['hum'] = None
+    match_dist = re.search(r'Distancia:\s*(\d+)', linea)
+    if match_dist:
+        estado['distancia'] = int(match_dist.group(1))
+        print(f"[SENSOR DISTANCIA] Objeto a: {estado['distancia']} cm")
+
+
+def interpretar_actual(linea, estado):
+    lectura = interpretar_linea(linea)
+    if lectura is not None:
+        estado.update(lectura.campos())
+
+
+def medir(funcion, lineas):
+    estado = {}
+    # Los print van a un sumidero en memoria: se mide el formateo y la escritura, no la terminal
+    with contextlib.redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        for linea in lineas:
+            funcion(linea, estado)
+        duracion = time.perf_counter() - inicio
+    return len(lineas) / duracion
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lineas", type=int, default=200_000)
+    args = parser.parse_args()
+
+    lineas = (LINEAS_MUESTRA * (args.lineas // len(LINEAS_MUESTRA) + 1))[:args.lineas]
+    bytes_por_linea = sum(len(l) + 2 for l in LINEAS_MUESTRA) / len(LINEAS_MUESTRA)  # + "\r\n"
+
+    resultados = {
+        "anterior": medir(interpretar_anterior, lineas),
+        "actual": medir(interpretar_actual, lineas),
+    }
+
+    print(f"{args.lineas} líneas, {bytes_por_linea:.1f} bytes/línea de media\n")
+    for nombre, lps in resultados.items():
+        print(f"  {nombre:<8} {lps:12,.0f} líneas/s  ({1e6 / lps:6.2f} µs/línea)")
+    print(f"  mejora   x{resultados['actual'] / resultados['anterior']:.1f}\n")
+
+    # 8N1: 10 bits por byte en el cable
+    for baudios in (9600, 115200):
+        lineas_max = baudios / 10 / bytes_por_linea
+        print(f"  {baudios:>6} baudios -> hasta {lineas_max:7.0f} líneas/s; CPU usada: "
+              + ", ".join(f"{nombre} {100 * lineas_max / lps:.2f}%" for nombre, lps in resultados.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+# -*- coding: utf-8 -*-
+"""
+Sustitutos locales del hardware y de Ollama para los benchmarks de extremo a extremo.
+
+- PasarelaSimulada: servidor HTTP con las rutas del firmware del ESP32 (/, /control,
+  /control/batch, /estado) con latencia y tasa de fallos configurables. Atiende de una
+  petición en una, como el WebServer del ESP32.
+- OllamaSimulado: /api/generate con respuesta JSON fija, en streaming NDJSON como la
+  API real, con retardo configurable (primer token y por fragmento).
+- ArduinoSimulado: pseudo-terminal (pty) que emite líneas "Distancia: | Gas: | Temp: |
+  Hum:" al ritmo pedido y registra las órdenes (SERVO/LED) que escribe el servidor.
+  Solo disponible en sistemas con pty (Linux/macOS).
+"""
+
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+AMBIENTES = ['descanso', 'cocina', 'principal', 'cochera', 'habitacion']
+
+
+class _ServidorEnHilo:
+    """Arranca un servidor HTTP en un hilo y en un puerto libre."""
+
+    def iniciar(self):
+        self.servidor = self._crear(('127.0.0.1', 0))
+        self.puerto = self.servidor.server_address[1]
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        return self
+
+    def detener(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+
+class PasarelaSimulada(_ServidorEnHilo):
+    """
+    Pasarela ESP32 falsa.
+
+    Args:
+        latencia (float): Segundos que tarda cada petición.
+        tasa_fallos (float): Probabilidad (0-1) de no responder (se cierra la conexión).
+        soporta_lote (bool): Si False, /control/batch responde 404 como el firmware antiguo.
+    """
+
+    def __init__(self, latencia=0.02, tasa_fallos=0.0, soporta_lote=True):
+        self.latencia = latencia
+        self.tasa_fallos = tasa_fallos
+        self.soporta_lote = soporta_lote
+        self.estados = {a: 'off' for a in AMBIENTES}
+        self.peticiones = 0
+        self.fallos = 0
+
+    def _aplicar(self, lugar, accion):
+        if accion not in ('on', 'off'):
+            return False
+        destinos = AMBIENTES if lugar == 'todas' else [lugar]
+        if not all(d in self.estados for d in destinos):
+            return False
+        for destino in destinos:
+            self.estados[destino] = accion
+        return True
+
+    def _crear(self, direccion):
+        pasarela = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                pasarela.peticiones += 1
+                url = urlparse(self.path)
+                args = {k: v[0] for k, v in parse_qs(url.query).items()}
+                time.sleep(pasarela.latencia)
+                if random.random() < pasarela.tasa_fallos:
+                    pasarela.fallos += 1
+                    self.close_connection = True
+                    return
+
+                codigo, cuerpo = 200, "OK"
+                if url.path == '/':
+                    cuerpo = "Servidor ESP32 activo."
+                elif url.path == '/control':
+                    ok = pasarela._aplicar(args.get('lugar', ''), args.get('accion', ''))
+                    codigo, cuerpo = (200, "OK") if ok else (400, "ERROR")
+                elif url.path == '/control/batch' and pasarela.soporta_lote:
+                    partes = []
+                    for par in args.get('cmds', '').split(','):
+                        lugar, _, accion = par.partition(':')
+                        partes.append(f"{lugar}:{'OK' if pasarela._aplicar(lugar, accion) else 'ERROR'}")
+                    cuerpo = ",".join(partes)
+                elif url.path == '/estado':
+                    cuerpo = ",".join(f"{a}:{e}" for a, e in pasarela.estados.items())
+                else:
+                    codigo, cuerpo = 404, "Ruta no encontrada"
+
+                datos = cuerpo.encode()
+                self.send_response(codigo)
+                self.send_header('Content-Type', 'text/plain')
+                self.send_header('Content-Length', str(len(datos)))
+                # El WebServer del ESP32 cierra la conexión tras cada respuesta
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                self.wfile.write(datos)
+
+            def log_message(self, *args):
+                pass
+
+        # Un solo hilo: el ESP32 atiende las peticiones en serie
+        return HTTPServer(direccion, Manejador)
+
+
+class OllamaSimulado(_ServidorEnHilo):
+    """
+    API /api/generate falsa con respuesta fija.
+
+    Args:
+        retardo_primer_token (float): Segundos hasta el primer fragmento (prefill).
+        retardo_fragmento (float): Segundos entre fragmentos (decodificación).
+        acciones (list): Acciones que devuelve siempre.
+    """
+
+    def __init__(self, retardo_primer_token=0.15, retardo_fragmento=0.02, acciones=None):
+        self.retardo_primer_token = retardo_primer_token
+        self.retardo_fragmento = retardo_fragmento
+        self.acciones = acciones or [{'accion': 'ON', 'lugar': 'cocina'}]
+        self.peticiones = 0
+
+    def _crear(self, direccion):
+        ollama = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _fragmento(self, objeto):
+                datos = json.dumps(objeto).encode() + b"\n"
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(datos), datos))
+                self.wfile.flush()
+
+            def do_POST(self):
+                ollama.peticiones += 1
+                cuerpo = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b"{}")
+                if not cuerpo.get('prompt'):
+                    # Precarga del modelo (sin prompt)
+                    datos = json.dumps({"model": cuerpo.get("model"), "done": True}).encode()
+                    self.send_response(200)
+                    self.send_header('Content-Length', str(len(datos)))
+                    self.end_headers()
+                    self.wfile.write(datos)
+                    return
+
+                texto = json.dumps({"acciones": ollama.acciones})
+                # Fragmentos de unos pocos caracteres, como los tokens del modelo
+                fragmentos = [texto[i:i + 6] for i in range(0, len(texto), 6)]
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                try:
+                    time.sleep(ollama.retardo_primer_token)
+                    for fragmento in fragmentos:
+                        self._fragmento({"response": fragmento, "done": False})
+                        time.sleep(ollama.retardo_fragmento)
+                    self._fragmento({"response": "", "done": True})
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # El cliente corta en cuanto tiene el objeto completo
+
+            def log_message(self, *args):
+                pass
+
+        return ThreadingHTTPServer(direccion, Manejador)
+
+
+class ArduinoSimulado:
+    """
+    Dispositivo serial falso sobre un pseudo-terminal.
+
+    Args:
+        lineas_por_segundo (float): Ritmo de emisión de líneas de sensores.
+    """
+
+    def __init__(self, lineas_por_segundo=20):
+        self.lineas_por_segundo = lineas_por_segundo
+        self.lineas_enviadas = 0
+        self.ordenes = []          # (instante, orden) recibidas del servidor
+        self._detener = threading.Event()
+
+    def iniciar(self):
+        import pty
+        import tty
+        self._maestro, esclavo = pty.openpty()
+        tty.setraw(esclavo)  # Sin eco ni traducción de saltos de línea
+        self.ruta = os.ttyname(esclavo)
+        self._esclavo = esclavo
+        threading.Thread(target=self._emitir, daemon=True).start()
+        threading.Thread(target=self._recibir, daemon=True).start()
+        return self
+
+    def _emitir(self):
+        intervalo = 1.0 / self.lineas_por_segundo
+        siguiente = time.monotonic()
+        while not self._detener.is_set():
+            gas = random.randint(80, 700)
+            distancia = random.randint(5, 200)
+            linea = f"Distancia: {distancia}cm | Gas: {gas} | Temp: {random.uniform(18, 30):.2f}C | Hum: {random.uniform(30, 80):.2f}%\r\n"
+            try:
+                os.write(self._maestro, linea.encode())
+            except OSError:
+                return
+            self.lineas_enviadas += 1
+            siguiente += intervalo
+            time.sleep(max(0.0, siguiente - time.monotonic()))
+
+    def _recibir(self):
+        pendiente = b""
+        while not self._detener.is_set():
+            try:
+                datos = os.read(self._maestro, 1024)
+            except OSError:
+                return
+            pendiente += datos
+            while b"\n" in pendiente:
+                orden, pendiente = pendiente.split(b"\n", 1)
+                self.ordenes.append((time.time(), orden.decode(errors='ignore').strip()))
+
+    def detener(self):
+        self._detener.set()
+        for fd in (self._maestro, self._esclavo):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
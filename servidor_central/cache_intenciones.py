@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo con la caché de intenciones interpretadas por el modelo de lenguaje.
+
+Las mismas frases llegan una y otra vez desde los botones, el texto y la voz. Como el
+prompt es determinista salvo por el texto de la orden, la lista de acciones que
+devuelve el LLM puede reutilizarse mientras no cambien el modelo ni los lugares válidos.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from parser_intenciones import normalizar_texto
+
+# --- Constantes de Configuración de la Caché ---
+CAPACIDAD_CACHE = 256
+TTL_CACHE = 6 * 3600  # Segundos que una interpretación se considera válida
+
+# Muletillas y alucinaciones habituales de Whisper que no cambian la intención
+RELLENO_WHISPER = [
+    'eh', 'ehh', 'em', 'emm', 'mm', 'mmm', 'este', 'pues', 'bueno', 'oye', 'hola', 'a ver',
+    'por favor', 'porfa', 'gracias', 'vale', 'ok', 'okay',
+    'gracias por ver el video', 'subtitulos realizados por la comunidad de amara org',
+]
+_PATRON_RELLENO = re.compile(
+    r'\b(?:' + '|'.join(re.escape(r) for r in sorted(RELLENO_WHISPER, key=len, reverse=True)) + r')\b'
+)
+
+
+def normalizar_comando(texto):
+    """
+    Obtiene la clave de caché de una orden: minúsculas, sin tildes, espacios colapsados
+    y sin las muletillas de Whisper.
+    """
+    return ' '.join(_PATRON_RELLENO.sub(' ', normalizar_texto(texto)).split())
+
+
+class CacheIntenciones:
+    """
+    Caché LRU con caducidad (TTL) de listas de acciones, con volcado opcional a disco.
+    """
+
+    def __init__(self, capacidad=CAPACIDAD_CACHE, ttl=TTL_CACHE, ruta_disco=None):
+        self.capacidad = capacidad
+        self.ttl = ttl
+        self.ruta_disco = ruta_disco
+        self._entradas = OrderedDict()  # clave -> (expira_en, acciones)
+        self._lock = threading.Lock()
+        self._firma = None
+
+        self.aciertos = 0
+        self.fallos = 0
+        self.expiradas = 0
+        self.desalojadas = 0
+        self.invalidaciones = 0
+
+    def configurar_firma(self, firma):
+        """
+        Registra la configuración (modelo, lugares válidos...) con la que se generaron
+        las entradas. Si cambia, todas las interpretaciones anteriores se descartan.
+        """
+        with self._lock:
+            if firma != self._firma:
+                if self._entradas:
+                    self.invalidaciones += 1
+                self._entradas.clear()
+                self._firma = firma
+
+    def obtener(self, texto):
+        """
+        Busca la interpretación de una orden.
+
+        Returns:
+            list | None: Copia de la lista de acciones, o None si no está o ha caducado.
+        """
+        clave = normalizar_comando(texto)
+        ahora = time.time()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                self.fallos += 1
+                return None
+            expira_en, acciones = entrada
+            if expira_en <= ahora:
+                del self._entradas[clave]
+                self.expiradas += 1
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+        return [dict(accion) for accion in acciones]
+
+    def guardar(self, texto, acciones):
+        """Almacena la lista de acciones de una orden, desalojando la menos usada si hace falta."""
+        clave = normalizar_comando(texto)
+        if not clave or not acciones:
+            return
+        with self._lock:
+            self._entradas[clave] = (time.time() + self.ttl, [dict(accion) for accion in acciones])
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+                self.desalojadas += 1
+
+    def cargar_disco(self):
+        """Recupera las entradas vigentes guardadas en disco (si coinciden con la firma actual)."""
+        if not self.ruta_disco or not os.path.exists(self.ruta_disco):
+            return
+        try:
+            with open(self.ruta_disco, 'r', encoding='utf-8') as f:
+                datos = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[CACHE] No se pudo leer la caché de intenciones en disco: {e}")
+            return
+
+        ahora = time.time()
+        with self._lock:
+            if datos.get('firma') != self._firma:
+                return
+            for clave, expira_en, acciones in datos.get('entradas', []):
+                if expira_en > ahora:
+                    self._entradas[clave] = (expira_en, acciones)
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+
+    def volcar_disco(self):
+        """Guarda las entradas vigentes en disco para que sobrevivan a un reinicio."""
+        if not self.ruta_disco:
+            return
+        ahora = time.time()
+        with self._lock:
+            datos = {
+                'firma': self._firma,
+                'entradas': [[clave, expira_en, acciones]
+                             for clave, (expira_en, acciones) in self._entradas.items() if expira_en > ahora],
+            }
+        try:
+            temporal = self.ruta_disco + '.tmp'
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump(datos, f, ensure_ascii=False)
+            os.replace(temporal, self.ruta_disco)
+        except OSError as e:
+            print(f"[CACHE] No se pudo guardar la caché de intenciones en disco: {e}")
+
+    def estadisticas(self):
+        """Devuelve el tamaño de la caché y su tasa de aciertos."""
+        with self._lock:
+            consultas = self.aciertos + self.fallos
+            return {
+                'entradas': len(self._entradas),
+                'capacidad': self.capacidad,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'tasa_aciertos': round(self.aciertos / consultas, 4) if consultas else 0.0,
+                'expiradas': self.expiradas,
+                'desalojadas': self.desalojadas,
+                'invalidaciones': self.invalidaciones,
+            }
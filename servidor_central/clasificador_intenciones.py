@@ -0,0 +1,302 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo con el clasificador de intenciones ligero (capa intermedia antes del LLM).
+
+Entre la gramática exacta y una llamada a llama3 quedan las órdenes con variaciones:
+errores de Whisper ("encinde la cosina"), sinónimos ("pon", "quita") o nombres
+coloquiales ("luz del living"). Aquí cada orden se divide en cláusulas y de cada
+cláusula se toman todos los tramos de 1 a N palabras. Cada tramo se representa con
+n-gramas de caracteres (2 a 4) proyectados por hashing a un vector TF-IDF normalizado,
+y todos se puntúan a la vez contra la matriz de frases etiquetadas (verbos y nombres de
+lugares) con una sola multiplicación de NumPy. Los mejores tramos que no se solapan
+dan el verbo y los lugares; la confianza es la similitud del peor de ellos menos la de
+la mejor alternativa con otra etiqueta.
+
+La matriz se guarda en `indice_intenciones.npz`; al arrancar se carga de ahí (y se
+regenera si cambió el vocabulario).
+"""
+
+import hashlib
+import os
+import threading
+import zlib
+
+import numpy as np
+
+from cache_intenciones import normalizar_comando
+from parser_intenciones import CONJUNCIONES, EXCLUSIONES, RELLENO, SINONIMOS_LUGARES, VERBOS
+
+# --- Constantes de Configuración del Clasificador ---
+DIMENSION_HASH = 1 << 14
+TAMANOS_NGRAMA = (2, 3, 4)
+UMBRAL_SIMILITUD = 0.30     # Similitud mínima de un tramo con su frase etiquetada
+UMBRAL_CONFIANZA = 0.10     # Confianza mínima de la orden; por debajo decide el LLM
+RUTA_INDICE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "indice_intenciones.npz")
+
+# --- Frases Etiquetadas ---
+# Además del vocabulario de la gramática, sinónimos y giros que la gramática no admite
+VERBOS_EXTRA = {
+    'ON': ['pon', 'pone', 'ponle', 'ilumina', 'iluminar', 'dale luz', 'enciendeme', 'prendeme'],
+    'OFF': ['quita', 'quitale', 'quitar', 'corta', 'cortar', 'apagame', 'apaguemos'],
+    'ABRIR': ['abreme', 'abrime'],
+    'CERRAR': ['cierrame', 'asegura', 'tranca'],
+}
+LUGARES_EXTRA = {
+    'descanso': ['recamara', 'pieza', 'cuarto de dormir'],
+    'principal': ['living', 'salon principal', 'sala grande'],
+    'cochera': ['estacionamiento', 'cocheras'],
+    'habitacion': ['sala de relax', 'sala de estar'],
+    'puerta': ['porton', 'entrada', 'puerta principal'],
+    'alarma': ['sirena'],
+}
+# Palabras que pueden quedar fuera de los tramos reconocidos sin cambiar la orden
+PALABRAS_NEUTRAS = set(RELLENO)
+
+
+def frases_etiquetadas(lugares_validos):
+    """Vocabulario etiquetado: [(frase, tipo, codigo), ...] con tipo 'accion' o 'lugar'."""
+    frases = []
+    for accion, verbos in VERBOS.items():
+        frases.extend((verbo, 'accion', accion) for verbo in verbos + VERBOS_EXTRA.get(accion, []))
+    for lugar in list(lugares_validos) + ['todas']:
+        nombres = SINONIMOS_LUGARES.get(lugar, [lugar]) + LUGARES_EXTRA.get(lugar, [])
+        frases.extend((nombre, 'lugar', lugar) for nombre in nombres)
+    return frases
+
+
+def _ngramas(texto):
+    relleno = f" {texto} "
+    for n in TAMANOS_NGRAMA:
+        for i in range(len(relleno) - n + 1):
+            yield relleno[i:i + n]
+
+
+def _indices(texto):
+    """Posiciones (hashing) de los n-gramas de caracteres de un texto normalizado."""
+    return np.fromiter((zlib.crc32(g.encode()) & (DIMENSION_HASH - 1) for g in _ngramas(texto)), dtype=np.int64)
+
+
+def _conteos(texto):
+    """Vector denso de conteos de los n-gramas de una frase."""
+    return np.bincount(_indices(texto), minlength=DIMENSION_HASH).astype(np.float32)
+
+
+def construir_indice(lugares_validos):
+    """
+    Calcula el índice (IDF y matriz de frases normalizada) desde las frases etiquetadas.
+
+    Returns:
+        dict: Arrays listos para np.savez / ClasificadorIntenciones.
+    """
+    frases = frases_etiquetadas(lugares_validos)
+    conteos = np.stack([_conteos(f) for f, _, _ in frases])
+    # IDF suavizado: los n-gramas comunes a muchas frases ("de ", "ar ") pesan poco
+    documentos = (conteos > 0).sum(axis=0)
+    idf = (np.log((1 + len(frases)) / (1 + documentos)) + 1).astype(np.float32)
+    matriz = conteos * idf
+    matriz /= np.linalg.norm(matriz, axis=1, keepdims=True)
+    return {
+        'firma': np.array(firma_frases(lugares_validos)),
+        'idf': idf,
+        'matriz': matriz,
+        'frases': np.array([f for f, _, _ in frases]),
+        'tipos': np.array([t for _, t, _ in frases]),
+        'codigos': np.array([c for _, _, c in frases]),
+    }
+
+
+def firma_frases(lugares_validos):
+    """Huella del vocabulario: si cambia, el índice guardado ya no sirve."""
+    texto = repr((frases_etiquetadas(lugares_validos), DIMENSION_HASH, TAMANOS_NGRAMA))
+    return hashlib.sha1(texto.encode()).hexdigest()
+
+
+class ClasificadorIntenciones:
+    """
+    Clasificador por similitud de n-gramas de caracteres; devuelve acciones por lugar con su confianza.
+    """
+
+    def __init__(self, lugares_validos, ruta_indice=RUTA_INDICE, umbral=UMBRAL_CONFIANZA):
+        self.lugares_validos = list(lugares_validos)
+        self.ruta_indice = ruta_indice
+        self.umbral = umbral
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.bajo_umbral = 0
+        self._indice = None
+
+    def cargar(self):
+        """Carga el índice precalculado; lo regenera y guarda si falta o está desactualizado."""
+        firma = firma_frases(self.lugares_validos)
+        indice = None
+        if os.path.exists(self.ruta_indice):
+            try:
+                with np.load(self.ruta_indice) as datos:
+                    if str(datos['firma']) == firma:
+                        indice = {clave: datos[clave] for clave in datos.files}
+            except (OSError, ValueError, KeyError) as e:
+                print(f"[ADVERTENCIA] Índice de intenciones ilegible ({e}); se regenera.")
+        if indice is None:
+            indice = construir_indice(self.lugares_validos)
+            try:
+                np.savez_compressed(self.ruta_indice, **indice)
+            except OSError as e:
+                print(f"[ADVERTENCIA] No se pudo guardar el índice de intenciones: {e}")
+
+        self._matriz = indice['matriz']
+        self._idf = indice['idf']
+        self._tipos = indice['tipos']
+        self._codigos = indice['codigos']
+        self._max_palabras = max(len(str(f).split()) for f in indice['frases'])
+        # Para cada frase, qué frases tienen otra etiqueta (la alternativa que resta confianza)
+        etiquetas = np.char.add(np.char.add(self._tipos, ':'), self._codigos)
+        self._otra_etiqueta = etiquetas[:, None] != etiquetas[None, :]
+        self._indice = indice
+        return self
+
+    def _tramos(self, palabras):
+        """Tramos de 1..N palabras (N: la frase etiquetada más larga) con alguna palabra no neutra."""
+        for inicio in range(len(palabras)):
+            for fin in range(inicio + 1, min(inicio + self._max_palabras, len(palabras)) + 1):
+                if not PALABRAS_NEUTRAS.issuperset(palabras[inicio:fin]):
+                    yield inicio, fin
+
+    @staticmethod
+    def _clausulas(texto):
+        clausulas, actual = [], []
+        for palabra in texto.split():
+            if palabra in CONJUNCIONES:
+                if actual: clausulas.append(actual)
+                actual = []
+            else:
+                actual.append(palabra)
+        if actual: clausulas.append(actual)
+        return clausulas
+
+    def clasificar(self, texto):
+        """
+        Clasifica una orden.
+
+        Args:
+            texto (str): La orden en lenguaje natural.
+
+        Returns:
+            dict | None: {'acciones': [{'accion', 'lugar', 'confianza'}, ...], 'confianza': mínima}
+            o None si la orden no se reconoce o no alcanza el umbral (debe ir al LLM).
+        """
+        if self._indice is None:
+            self.cargar()
+        texto = normalizar_comando(texto)
+        palabras = texto.split()
+        if not palabras or set(EXCLUSIONES).intersection(palabras):
+            # "todas menos la cocina" lo resuelven la gramática o el LLM, no se adivina
+            return self._registrar(None)
+
+        clausulas = self._clausulas(texto)
+        tramos = [(n, inicio, fin) for n, c in enumerate(clausulas) for inicio, fin in self._tramos(c)]
+        if not tramos:
+            return self._registrar(None)
+
+        # Todos los tramos de todas las cláusulas se puntúan en una sola multiplicación por matriz,
+        # restringida a las columnas de los n-gramas que aparecen (unos cientos de 16384)
+        indices = [_indices(' '.join(clausulas[n][i:f])) for n, i, f in tramos]
+        filas = np.repeat(np.arange(len(tramos)), [len(i) for i in indices])
+        columnas, posiciones = np.unique(np.concatenate(indices), return_inverse=True)
+        vectores = np.zeros((len(tramos), columnas.size), dtype=np.float32)
+        np.add.at(vectores, (filas, posiciones), 1.0)
+        vectores *= self._idf[columnas]
+        vectores /= np.maximum(np.linalg.norm(vectores, axis=1, keepdims=True), 1e-9)
+        similitudes = vectores @ self._matriz[:, columnas].T
+        mejores = similitudes.argmax(axis=1)
+        puntuaciones = similitudes[np.arange(len(tramos)), mejores]
+        alternativas = np.where(self._otra_etiqueta[mejores], similitudes, 0.0).max(axis=1)
+
+        candidatos = [[] for _ in clausulas]
+        for fila, (n, inicio, fin) in enumerate(tramos):
+            if puntuaciones[fila] >= UMBRAL_SIMILITUD:
+                frase = mejores[fila]
+                confianza = float(puntuaciones[fila] - alternativas[fila])
+                candidatos[n].append((round(float(puntuaciones[fila]), 2), fin - inicio, inicio, fin,
+                                      str(self._tipos[frase]), str(self._codigos[frase]), confianza))
+
+        acciones = []
+        accion_anterior = None
+        for n, palabras_clausula in enumerate(clausulas):
+            resultado = self._resolver_clausula(palabras_clausula, candidatos[n])
+            if resultado is None:
+                return self._registrar(None)
+            accion, lugares = resultado
+            if accion is None:
+                # Cláusula sin verbo ("... y la cochera"): hereda el de la anterior
+                if accion_anterior is None:
+                    return self._registrar(None)
+                accion = accion_anterior
+            accion_anterior = accion
+            for lugar, confianza in lugares:
+                confianza = round(min(confianza, accion[1]), 4)
+                if accion[0] in ('ABRIR', 'CERRAR') and lugar != 'puerta':
+                    return self._registrar(None)
+                if not any(a['accion'] == accion[0] and a['lugar'] == lugar for a in acciones):
+                    acciones.append({'accion': accion[0], 'lugar': lugar, 'confianza': confianza})
+
+        confianza = min(a['confianza'] for a in acciones)
+        if confianza < self.umbral:
+            with self._lock:
+                self.bajo_umbral += 1
+            return self._registrar(None)
+        return self._registrar({'acciones': acciones, 'confianza': confianza})
+
+    @staticmethod
+    def _resolver_clausula(palabras, candidatos):
+        """
+        Elige los tramos sin solapamiento (mejor similitud primero, y el más largo en empate).
+
+        Returns:
+            tuple | None: ((accion, confianza) o None, [(lugar, confianza), ...]), o None si
+            quedan palabras sin explicar, hay más de un verbo o no hay ningún lugar.
+        """
+        ocupadas = [False] * len(palabras)
+        accion, lugares = None, []
+        for _, _, inicio, fin, tipo, codigo, confianza in sorted(candidatos, reverse=True):
+            if any(ocupadas[inicio:fin]):
+                continue
+            ocupadas[inicio:fin] = [True] * (fin - inicio)
+            if tipo == 'accion':
+                if accion is not None and accion[0] != codigo:
+                    return None
+                accion = (codigo, confianza)
+            elif all(l != codigo for l, _ in lugares):
+                lugares.append((codigo, confianza))
+
+        sin_explicar = [p for p, ocupada in zip(palabras, ocupadas) if not ocupada and p not in PALABRAS_NEUTRAS]
+        if sin_explicar or not lugares:
+            return None
+        return accion, lugares
+
+    def _registrar(self, resultado):
+        with self._lock:
+            if resultado is None:
+                self.fallos += 1
+            else:
+                self.aciertos += 1
+        return resultado
+
+    def estadisticas(self):
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'bajo_umbral': self.bajo_umbral,
+                'tasa_aciertos': round(self.aciertos / total, 4) if total else 0.0,
+                'umbral_confianza': self.umbral,
+            }
+
+
+if __name__ == '__main__':
+    # Regenera el índice precalculado: python clasificador_intenciones.py
+    from gestion_ia import LUGARES_VALIDOS
+    indice = construir_indice(LUGARES_VALIDOS)
+    np.savez_compressed(RUTA_INDICE, **indice)
+    print(f"Índice guardado en {RUTA_INDICE}: {len(indice['frases'])} frases etiquetadas")
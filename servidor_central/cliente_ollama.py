@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo con el cliente HTTP para la API local de Ollama.
+
+Mantiene una sesión con conexiones persistentes, fija el modelo en memoria con
+`keep_alive`, pide salida JSON estructurada con un presupuesto de tokens acotado y
+lee la respuesta en streaming, cortándola en cuanto llega un objeto JSON completo.
+"""
+
+import json
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# --- Constantes de Configuración del Cliente ---
+KEEP_ALIVE_OLLAMA = "30m"         # Tiempo que Ollama mantiene el modelo cargado tras cada uso
+MAX_TOKENS_OLLAMA = 160           # num_predict: una lista de 5-6 acciones cabe de sobra
+STOP_OLLAMA = ["```", "\n\n"]     # El JSON compacto nunca contiene una línea en blanco
+TIMEOUT_CONEXION_OLLAMA = 3.05
+TIMEOUT_LECTURA_OLLAMA = 30
+
+
+class ErrorOllama(Exception):
+    """La API de Ollama respondió con un código de error HTTP."""
+
+    def __init__(self, codigo, texto):
+        super().__init__(f"Ollama respondió {codigo}: {texto}")
+        self.codigo = codigo
+        self.texto = texto
+
+
+class ExtractorJSON:
+    """
+    Detecta, a medida que llegan fragmentos de texto, el momento en que se cierra el
+    primer objeto JSON de nivel superior (respetando cadenas y escapes).
+    """
+
+    def __init__(self):
+        self.texto = []
+        self._acumulado = 0
+        self._inicio = None
+        self._profundidad = 0
+        self._en_cadena = False
+        self._escape = False
+
+    def alimentar(self, fragmento):
+        """Añade un fragmento y devuelve el objeto completo si ya se cerró, o None."""
+        base = self._acumulado
+        self.texto.append(fragmento)
+        self._acumulado += len(fragmento)
+
+        for i, c in enumerate(fragmento):
+            if self._en_cadena:
+                if self._escape:
+                    self._escape = False
+                elif c == '\\':
+                    self._escape = True
+                elif c == '"':
+                    self._en_cadena = False
+            elif c == '"':
+                self._en_cadena = True
+            elif c == '{':
+                if self._profundidad == 0:
+                    self._inicio = base + i
+                self._profundidad += 1
+            elif c == '}' and self._profundidad > 0:
+                self._profundidad -= 1
+                if self._profundidad == 0:
+                    completo = ''.join(self.texto)[self._inicio:base + i + 1]
+                    try:
+                        return json.loads(completo)
+                    except json.JSONDecodeError:
+                        self._inicio = None
+        return None
+
+    def texto_completo(self):
+        return ''.join(self.texto)
+
+
+class ClienteOllama:
+    """
+    Cliente de /api/generate con sesión persistente y métricas de latencia.
+    """
+
+    def __init__(self, url_generate, modelo, keep_alive=KEEP_ALIVE_OLLAMA, max_tokens=MAX_TOKENS_OLLAMA):
+        self.url_generate = url_generate
+        self.modelo = modelo
+        self.keep_alive = keep_alive
+        self.max_tokens = max_tokens
+
+        self._sesion = requests.Session()
+        self._sesion.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0))
+        self._lock = threading.Lock()
+
+        self.peticiones = 0
+        self.errores = 0
+        self.cortes_anticipados = 0
+        self.ultimo_ttft = None
+        self.ultimo_total = None
+        self._suma_ttft = 0.0
+        self._suma_total = 0.0
+
+    def precargar(self):
+        """
+        Pide a Ollama que cargue el modelo y lo mantenga residente (petición sin prompt).
+
+        Returns:
+            bool: True si el modelo quedó cargado.
+        """
+        try:
+            respuesta = self._sesion.post(
+                self.url_generate,
+                json={"model": self.modelo, "keep_alive": self.keep_alive},
+                timeout=(TIMEOUT_CONEXION_OLLAMA, 120),
+            )
+            return respuesta.status_code == 200
+        except requests.exceptions.RequestException:
+            return False
+
+    def generar_json(self, prompt):
+        """
+        Envía el prompt en modo JSON y devuelve el primer objeto completo de la respuesta.
+
+        Returns:
+            tuple: (objeto dict o None si no se pudo extraer, texto bruto generado,
+                    {'ttft_ms', 'total_ms'} de esta llamada). Las latencias se devuelven
+                    por llamada porque `ultimo_*` lo sobrescribe cualquier otro hilo.
+
+        Raises:
+            ErrorOllama: Si la API responde con un código distinto de 200.
+            requests.exceptions.RequestException: Si falla la conexión.
+        """
+        payload = {
+            "model": self.modelo,
+            "prompt": prompt,
+            "stream": True,
+            "format": "json",
+            "keep_alive": self.keep_alive,
+            "options": {
+                "temperature": 0,
+                "num_predict": self.max_tokens,
+                "stop": STOP_OLLAMA,
+            },
+        }
+
+        extractor = ExtractorJSON()
+        objeto = None
+        ttft = None
+        corte_anticipado = False
+        inicio = time.perf_counter()
+        try:
+            with self._sesion.post(self.url_generate, json=payload, stream=True,
+                                   timeout=(TIMEOUT_CONEXION_OLLAMA, TIMEOUT_LECTURA_OLLAMA)) as respuesta:
+                if respuesta.status_code != 200:
+                    raise ErrorOllama(respuesta.status_code, respuesta.text)
+
+                for linea in respuesta.iter_lines():
+                    if not linea:
+                        continue
+                    fragmento = json.loads(linea)
+                    texto = fragmento.get("response", "")
+                    if texto and ttft is None:
+                        ttft = time.perf_counter() - inicio
+                    objeto = extractor.alimentar(texto) if texto else None
+                    if objeto is not None:
+                        # Cerramos el stream en cuanto el objeto está completo: el resto
+                        # de tokens (espacios de relleno del modo JSON) no aporta nada
+                        corte_anticipado = not fragmento.get("done", False)
+                        break
+                    if fragmento.get("done"):
+                        break
+        except Exception:
+            with self._lock:
+                self.peticiones += 1
+                self.errores += 1
+            raise
+
+        total = time.perf_counter() - inicio
+        with self._lock:
+            self.peticiones += 1
+            self.ultimo_ttft = ttft
+            self.ultimo_total = total
+            self._suma_ttft += ttft or 0.0
+            self._suma_total += total
+            if corte_anticipado:
+                self.cortes_anticipados += 1
+        latencias = {
+            'ttft_ms': round(ttft * 1000, 1) if ttft is not None else None,
+            'total_ms': round(total * 1000, 1),
+        }
+        return objeto, extractor.texto_completo(), latencias
+
+    def estadisticas(self):
+        """Devuelve las métricas de latencia (TTFT y total) en milisegundos."""
+        with self._lock:
+            exitosas = self.peticiones - self.errores
+            return {
+                "modelo": self.modelo,
+                "peticiones": self.peticiones,
+                "errores": self.errores,
+                "cortes_anticipados": self.cortes_anticipados,
+                "ultimo_ttft_ms": round(self.ultimo_ttft * 1000, 1) if self.ultimo_ttft is not None else None,
+                "ultimo_total_ms": round(self.ultimo_total * 1000, 1) if self.ultimo_total is not None else None,
+                "media_ttft_ms": round(self._suma_ttft / exitosas * 1000, 1) if exitosas else None,
+                "media_total_ms": round(self._suma_total / exitosas * 1000, 1) if exitosas else None,
+            }
@@ -4,45 +4,239 @@ Módulo para la gestión de la comunicación de red con los nodos de hardware,
 como el ESP32 que actúa como pasarela.
 """
 
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
-from datetime import datetime
+from requests.adapters import HTTPAdapter
+
+from estado_dispositivos import sombra_dispositivos
+from metricas import metricas
+from registro_eventos import DEPURACION, INFO, ADVERTENCIA, ERROR, RegistroPeticion, derivar, incorporar, registrar
 
 # --- Constantes de Configuración ---
-IP_ESP32 = "192.168.4.1"
+# WASI_IP_ESP32 permite apuntar a otra pasarela (ej: "127.0.0.1:8081" en los benchmarks)
+IP_ESP32 = os.environ.get("WASI_IP_ESP32", "192.168.4.1")
 URL_BASE_ESP32 = f"http://{IP_ESP32}"
+TIMEOUT_ESP32 = 5
+
+# Ambientes con pin propio en el ESP32 (a los que se expande 'todas')
+AMBIENTES_ESP32 = ['descanso', 'cocina', 'principal', 'cochera', 'habitacion']
+
+# Despacho concurrente: el WebServer del ESP32 atiende de una en una, así que el límite
+# de peticiones en vuelo se adapta a su tiempo de respuesta (AIMD) en lugar de dormir fijo.
+MAX_EN_VUELO_ESP32 = 3
+MIN_EN_VUELO_ESP32 = 1
+LATENCIA_OBJETIVO_ESP32 = 0.25  # Segundos; por encima se reduce el límite a la mitad
+ALFA_EWMA_ESP32 = 0.3
+
+# Monitor de salud y cortocircuito: con la pasarela caída las órdenes fallan al instante
+# en lugar de agotar TIMEOUT_ESP32 cada una
+INTERVALO_SONDEO_ESP32 = 5       # Segundos entre sondeos mientras responde
+TIMEOUT_SONDEO_ESP32 = 1.5
+FALLOS_APERTURA_ESP32 = 3        # Fallos de red consecutivos que abren el circuito
+ENFRIAMIENTO_ESP32 = 5           # Segundos con el circuito abierto antes de probar (se duplica hasta el máximo)
+MAX_ENFRIAMIENTO_ESP32 = 60
+LATENCIA_DEGRADADA_ESP32 = 0.5   # EWMA por encima de este valor = 'degradado'
+
+# Sesión compartida con pool de conexiones keep-alive hacia la pasarela
+_sesion_esp32 = requests.Session()
+_sesion_esp32.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=MAX_EN_VUELO_ESP32, max_retries=0))
 
 # --- Funciones de Logging ---
 
-def log_depuracion(mensaje, logs):
+def log_depuracion(mensaje, logs, *args, nivel=DEPURACION):
+    """
+    Registra un evento de la pasarela en nombre de `logs`. El mensaje se formatea con
+    `args` (estilo %) solo si el evento supera el nivel configurado y alguien lo lee.
+    """
+    registrar(logs, nivel, 'DEPURACION', mensaje, *args)
+
+# --- Salud de la Pasarela (Cortocircuito) ---
+
+class MonitorPasarela:
+    """
+    Estado de salud del ESP32 y cortocircuito para las órdenes.
+
+    Cerrado: las órdenes pasan. Tras FALLOS_APERTURA_ESP32 fallos de red seguidos se abre
+    y las órdenes fallan sin tocar la red. Pasado el enfriamiento queda semiabierto: una
+    sola petición (un sondeo u orden) comprueba si el nodo volvió; si responde se cierra,
+    si no vuelve a abrirse con el doble de enfriamiento.
+    """
+
+    def __init__(self):
+        self.circuito = 'cerrado'   # cerrado | abierto | semiabierto
+        self.latencia_ewma = None
+        self.fallos_seguidos = 0
+        self.ultimo_contacto = None
+        self.ultimo_error = None
+        self.aperturas = 0
+        self.rechazadas = 0
+        self.reconexiones = 0       # Veces que el circuito se cerró tras estar abierto
+        self._enfriamiento = ENFRIAMIENTO_ESP32
+        self._reintento_en = 0.0
+        self._sonda_en_curso = False
+        self._lock = threading.Lock()
+        self._hilo = None
+
+    def permitir(self, contar=True):
+        """
+        Indica si una petición puede ir a la red. Con el circuito semiabierto solo deja
+        pasar una (la sonda) hasta conocer su resultado.
+
+        Args:
+            contar (bool): Contar la negativa como orden rechazada (el sondeo no cuenta).
+        """
+        with self._lock:
+            if self.circuito == 'cerrado':
+                return True
+            if self.circuito == 'abierto' and time.monotonic() >= self._reintento_en:
+                self.circuito = 'semiabierto'
+            if self.circuito == 'semiabierto' and not self._sonda_en_curso:
+                self._sonda_en_curso = True
+                return True
+            if contar:
+                self.rechazadas += 1
+            return False
+
+    def registrar(self, exito, latencia=None, error=None):
+        """
+        Registra el resultado de una petición a la pasarela.
+
+        Args:
+            exito (bool): True si el nodo respondió (cualquier código HTTP).
+            latencia (float): Segundos hasta la respuesta.
+            error (str): Descripción del fallo de red, si lo hubo.
+        """
+        with self._lock:
+            self._sonda_en_curso = False
+            if exito:
+                if latencia is not None:
+                    self.latencia_ewma = latencia if self.latencia_ewma is None else \
+                        ALFA_EWMA_ESP32 * latencia + (1 - ALFA_EWMA_ESP32) * self.latencia_ewma
+                if self.circuito != 'cerrado':
+                    self.reconexiones += 1
+                    print(f"[PASARELA] El ESP32 ({IP_ESP32}) vuelve a responder. Circuito cerrado.")
+                self.circuito = 'cerrado'
+                self.fallos_seguidos = 0
+                self._enfriamiento = ENFRIAMIENTO_ESP32
+                self.ultimo_contacto = time.time()
+                return
+
+            self.fallos_seguidos += 1
+            self.ultimo_error = error
+            if self.circuito == 'semiabierto':
+                self._enfriamiento = min(self._enfriamiento * 2, MAX_ENFRIAMIENTO_ESP32)
+                self._abrir()
+            elif self.circuito == 'cerrado' and self.fallos_seguidos >= FALLOS_APERTURA_ESP32:
+                self._abrir()
+                print(f"[PASARELA] El ESP32 ({IP_ESP32}) no responde. Circuito abierto: las órdenes fallarán al instante.")
+
+    def _abrir(self):
+        self.circuito = 'abierto'
+        self.aperturas += 1
+        self._reintento_en = time.monotonic() + self._enfriamiento
+
+    @property
+    def salud(self):
+        if self.circuito != 'cerrado':
+            return 'caido'
+        if self.ultimo_contacto is None:
+            return 'desconocido'
+        if self.fallos_seguidos or (self.latencia_ewma or 0) > LATENCIA_DEGRADADA_ESP32:
+            return 'degradado'
+        return 'activo'
+
+    def iniciar(self):
+        """Arranca el hilo de sondeo periódico (idempotente)."""
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._bucle_sondeo, daemon=True)
+            self._hilo.start()
+
+    def _bucle_sondeo(self):
+        while True:
+            # Con el circuito abierto el propio permitir() marca cuándo toca la sonda; si ya
+            # hay una en curso (una orden) no se sondea ni se cuenta como rechazo
+            if self.permitir(contar=False):
+                verificar_conexion_nodo(RegistroPeticion("sondeo_esp32"), timeout=TIMEOUT_SONDEO_ESP32)
+            with self._lock:
+                espera = max(self._reintento_en - time.monotonic(), 0.1) if self.circuito == 'abierto' \
+                    else INTERVALO_SONDEO_ESP32
+            time.sleep(espera)
+
+    def estado(self):
+        with self._lock:
+            return {
+                'salud': self.salud,
+                'circuito': self.circuito,
+                'latencia_ewma_ms': round(self.latencia_ewma * 1000, 1) if self.latencia_ewma is not None else None,
+                'fallos_seguidos': self.fallos_seguidos,
+                'ultimo_contacto': self.ultimo_contacto,
+                'ultimo_error': self.ultimo_error,
+                'aperturas': self.aperturas,
+                'rechazadas': self.rechazadas,
+                'reconexiones': self.reconexiones,
+            }
+
+# Instancia única para todo el proceso
+monitor_pasarela = MonitorPasarela()
+
+class CircuitoAbierto(requests.exceptions.ConnectionError):
+    """La orden no llegó a enviarse: el cortocircuito de la pasarela está abierto."""
+
+
+def _peticion_pasarela(url, params=None, timeout=TIMEOUT_ESP32):
     """
-    Añade un mensaje de depuración a una lista de logs con marca de tiempo.
+    GET a la pasarela pasando por el cortocircuito.
+
+    Raises:
+        CircuitoAbierto: Inmediatamente, sin tocar la red, si el circuito está abierto.
+        requests.exceptions.RequestException: Fallo de red.
     """
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    logs.append(f"[DEPURACION] [{timestamp}] {mensaje}")
+    if not monitor_pasarela.permitir():
+        metricas.contar("esp32_rechazadas_circuito_total")
+        raise CircuitoAbierto(f"Circuito abierto: el ESP32 ({IP_ESP32}) no responde")
+    inicio = time.perf_counter()
+    try:
+        with metricas.medir("esp32_peticion", ruta=url[len(URL_BASE_ESP32):] or "/"):
+            response = _sesion_esp32.get(url, params=params, timeout=timeout)
+    except Exception as e:
+        # Cualquier fallo libera la sonda del estado semiabierto
+        monitor_pasarela.registrar(False, error=type(e).__name__)
+        raise
+    monitor_pasarela.registrar(True, time.perf_counter() - inicio)
+    return response
 
 # --- Funciones de Control de Hardware ---
 
-def verificar_conexion_nodo(logs):
+def verificar_conexion_nodo(logs, timeout=TIMEOUT_ESP32):
     """
     Intenta conectar con el nodo ESP32 para verificar que está en línea.
+    Lo usa el monitor de salud como sondeo periódico.
     """
-    log_depuracion(f"Intentando conexión con el nodo ESP32: {IP_ESP32}", logs)
+    log_depuracion("Intentando conexión con el nodo ESP32: %s", logs, IP_ESP32)
     try:
         # Se hace una petición a la raíz del servidor del ESP32.
         # El ESP32 actual solo tiene /control, por lo que la raíz puede devolver 404.
         # Consideramos conexión exitosa si responde 200 (OK) o 404 (Not Found pero online).
-        response = requests.get(URL_BASE_ESP32, timeout=5)
+        inicio = time.perf_counter()
+        response = _sesion_esp32.get(URL_BASE_ESP32, timeout=timeout)
+        monitor_pasarela.registrar(True, time.perf_counter() - inicio)
         if response.status_code in [200, 404]:
-            log_depuracion("Conexión con el nodo ESP32 establecida con éxito.", logs)
+            log_depuracion("Conexión con el nodo ESP32 establecida con éxito.", logs, nivel=INFO)
             return True
         else:
-            log_depuracion(f"Error de conexión. El nodo respondió con código: {response.status_code}", logs)
+            log_depuracion("Error de conexión. El nodo respondió con código: %s", logs, response.status_code, nivel=ADVERTENCIA)
             return False
     except requests.exceptions.RequestException as e:
-        log_depuracion(f"Fallo crítico de conexión con el nodo ESP32. Error: {e}", logs)
+        monitor_pasarela.registrar(False, error=type(e).__name__)
+        # ADVERTENCIA y no ERROR: con la pasarela caída el sondeo lo repetiría en consola cada pocos segundos
+        log_depuracion("Fallo crítico de conexión con el nodo ESP32. Error: %s", logs, e, nivel=ADVERTENCIA)
         return False
 
-def controlar_maqueta(lugar, estado, logs):
+def controlar_maqueta(lugar, estado, logs, forzar=False):
     """
     Envía un comando HTTP GET al ESP32 para controlar un ambiente específico.
 
@@ -50,6 +244,7 @@ def controlar_maqueta(lugar, estado, logs):
         lugar (str): El ambiente ('descanso', 'cocina', 'principal', 'cochera', 'habitacion', 'todas').
         estado (str): El estado deseado ('on' o 'off').
         logs (list): La lista para registrar los logs.
+        forzar (bool): Enviar aunque la sombra indique que ya está en ese estado.
 
     Returns:
         bool: True si el comando fue exitoso, False en caso contrario.
@@ -58,26 +253,263 @@ def controlar_maqueta(lugar, estado, logs):
     lugar_param = lugar.lower()
     estado_param = estado.lower()
 
+    if not forzar and sombra_dispositivos.es_redundante(lugar_param, estado_param):
+        log_depuracion("%s ya está en '%s'. Orden omitida.", logs, lugar_param, estado_param, nivel=INFO)
+        return True
+
     url_comando = f"{URL_BASE_ESP32}/control"
     params = {'lugar': lugar_param, 'accion': estado_param}
     
-    log_depuracion(f"Enviando comando a {url_comando} con params: {params}", logs)
+    log_depuracion("Enviando comando a %s con params: %s", logs, url_comando, params)
 
     try:
-        response = requests.get(url_comando, params=params, timeout=5)
+        response = _peticion_pasarela(url_comando, params=params)
         if response.status_code == 200:
-            log_depuracion(f"Respuesta del hardware: {response.status_code} OK - Acción completada.", logs)
+            log_depuracion("Respuesta del hardware: %s OK - Acción completada.", logs, response.status_code, nivel=INFO)
+            sombra_dispositivos.actualizar(lugar_param, estado_param)
             return True
         else:
-            log_depuracion(f"El hardware respondió con un error: {response.status_code}", logs)
+            log_depuracion("El hardware respondió con un error: %s", logs, response.status_code, nivel=ERROR)
             return False
     except requests.exceptions.RequestException as e:
+        # Sin respuesta no se sabe si el ESP32 aplicó la orden (salvo que ni se enviara)
+        if not isinstance(e, CircuitoAbierto):
+            sombra_dispositivos.actualizar(lugar_param, None)
         mensaje_error = f"Fallo en la petición HTTP al controlar el LED. Error: {e}"
         if "192.168.4.1" in URL_BASE_ESP32 and "ConnectTimeout" in str(e):
             mensaje_error += " [SUGERENCIA] Verifica que tu PC esté conectada a la red WiFi 'mapache_test'."
-        log_depuracion(mensaje_error, logs)
+        log_depuracion(mensaje_error, logs, nivel=ERROR)
         return False
 
+# --- Despacho Concurrente de Acciones ---
+
+class ClienteGateway:
+    """
+    Envía varias acciones independientes a la pasarela en paralelo, con un límite de
+    peticiones en vuelo que crece mientras el ESP32 responde rápido y se reduce en
+    cuanto se ralentiza o falla (incremento aditivo, reducción multiplicativa).
+    """
+
+    def __init__(self, max_en_vuelo=MAX_EN_VUELO_ESP32, latencia_objetivo=LATENCIA_OBJETIVO_ESP32):
+        self.max_en_vuelo = max_en_vuelo
+        self.latencia_objetivo = latencia_objetivo
+        self.limite = float(max_en_vuelo)
+        self.latencia_ewma = None
+        self._en_vuelo = 0
+        self._condicion = threading.Condition()
+        self._ejecutor = ThreadPoolExecutor(max_workers=max_en_vuelo, thread_name_prefix="esp32")
+
+    def _adquirir(self):
+        with self._condicion:
+            while self._en_vuelo >= max(MIN_EN_VUELO_ESP32, int(self.limite)):
+                self._condicion.wait()
+            self._en_vuelo += 1
+
+    def _liberar(self, latencia, exito):
+        with self._condicion:
+            self._en_vuelo -= 1
+            if self.latencia_ewma is None:
+                self.latencia_ewma = latencia
+            else:
+                self.latencia_ewma = ALFA_EWMA_ESP32 * latencia + (1 - ALFA_EWMA_ESP32) * self.latencia_ewma
+
+            if not exito or self.latencia_ewma > self.latencia_objetivo:
+                self.limite = max(float(MIN_EN_VUELO_ESP32), self.limite / 2)
+            else:
+                self.limite = min(float(self.max_en_vuelo), self.limite + 1 / self.limite)
+            self._condicion.notify_all()
+
+    def _ejecutar(self, lugar, estado, logs, forzar=False):
+        self._adquirir()
+        inicio = time.perf_counter()
+        exito = False
+        try:
+            exito = controlar_maqueta(lugar, estado, logs, forzar)
+        finally:
+            self._liberar(time.perf_counter() - inicio, exito)
+        return exito
+
+    def despachar(self, acciones, logs, forzar=False):
+        """
+        Ejecuta una lista de acciones (lugar, estado) de forma concurrente.
+
+        Args:
+            acciones (list): Pares (lugar, estado), ej: [('cocina', 'ON'), ('cochera', 'OFF')].
+            logs (list): La lista para registrar los logs.
+            forzar (bool): No omitir las acciones que la sombra considera redundantes.
+
+        Returns:
+            list: Un bool de éxito por acción, en el mismo orden que la entrada.
+        """
+        if not acciones:
+            return []
+        if len(acciones) == 1:
+            lugar, estado = acciones[0]
+            return [self._ejecutar(lugar, estado, logs, forzar)]
+
+        # Las acciones sobre un mismo ambiente ("apaga la cocina y enciende la cocina") van
+        # en orden dentro de una misma cadena; 'todas' afecta a cualquiera, así que con ella
+        # todo se serializa. Las cadenas de ambientes distintos sí corren en paralelo.
+        lugares = [lugar.lower() for lugar, _ in acciones]
+        if 'todas' in lugares:
+            cadenas = [list(range(len(acciones)))]
+        else:
+            por_lugar = {}
+            for i, lugar in enumerate(lugares):
+                por_lugar.setdefault(lugar, []).append(i)
+            cadenas = list(por_lugar.values())
+
+        # Cada acción registra en su propio registro derivado (mismo id de petición)
+        derivados = [derivar(logs) for _ in acciones]
+        futuros = [self._ejecutor.submit(self._ejecutar_cadena, cadena, acciones, derivados, forzar)
+                   for cadena in cadenas]
+        resultados = [False] * len(acciones)
+        for cadena, futuro in zip(cadenas, futuros):
+            try:
+                for i, exito in zip(cadena, futuro.result()):
+                    resultados[i] = exito
+            except Exception as e:
+                registrar(derivados[cadena[0]], ERROR, 'ERROR_HW', "Fallo inesperado en el despacho: %s", e)
+        # Los logs de cada acción se vuelcan en el orden de entrada, sin intercalarse
+        for derivado in derivados:
+            incorporar(logs, derivado)
+        return resultados
+
+    def _ejecutar_cadena(self, cadena, acciones, derivados, forzar):
+        return [self._ejecutar(*acciones[i], derivados[i], forzar) for i in cadena]
+
+    def estado(self):
+        """Devuelve el límite actual de peticiones en vuelo y la latencia media observada."""
+        with self._condicion:
+            return {
+                "limite_en_vuelo": round(self.limite, 2),
+                "en_vuelo": self._en_vuelo,
+                "latencia_ewma_ms": round(self.latencia_ewma * 1000, 1) if self.latencia_ewma is not None else None,
+            }
+
+# Instancia única para todo el proceso
+cliente_gateway = ClienteGateway()
+
+# --- Control por Lotes ---
+
+# Si el firmware de la pasarela no conoce /control/batch (responde 404) se usa el despacho
+# individual; el lote se vuelve a probar pasado un rato o cuando la pasarela se reconecta
+# (puede haberse actualizado el firmware mientras estaba caída)
+INTERVALO_REPROBAR_LOTE = 600    # Segundos
+_lote_no_soportado = None        # (instante monotonic, reconexiones del monitor) del último 404
+
+def _lote_disponible():
+    global _lote_no_soportado
+    if _lote_no_soportado is None:
+        return True
+    instante, reconexiones = _lote_no_soportado
+    if time.monotonic() - instante >= INTERVALO_REPROBAR_LOTE or monitor_pasarela.reconexiones != reconexiones:
+        _lote_no_soportado = None
+        return True
+    return False
+
+def expandir_acciones(acciones):
+    """
+    Expande 'todas' en un par por ambiente y normaliza a minúsculas.
+
+    Returns:
+        list: Pares (lugar, estado) expandidos y, por cada par original, los índices que le corresponden.
+    """
+    pares = []
+    indices = []
+    for lugar, estado in acciones:
+        lugar, estado = lugar.lower(), estado.lower()
+        destinos = AMBIENTES_ESP32 if lugar == 'todas' else [lugar]
+        indices.append(list(range(len(pares), len(pares) + len(destinos))))
+        pares.extend((destino, estado) for destino in destinos)
+    return pares, indices
+
+def controlar_maqueta_lote(acciones, logs, forzar=False):
+    """
+    Envía N acciones al ESP32 en una sola petición HTTP a /control/batch.
+
+    Args:
+        acciones (list): Pares (lugar, estado), ej: [('todas', 'ON'), ('cochera', 'OFF')].
+            'todas' se expande aquí en un par por ambiente dentro del mismo lote.
+        logs (list): La lista para registrar los logs.
+        forzar (bool): Enviar también los ambientes que la sombra ya da en ese estado.
+
+    Returns:
+        list: Un bool de éxito por acción original, en el mismo orden que la entrada.
+    """
+    global _lote_no_soportado
+    if not acciones:
+        return []
+    if not _lote_disponible():
+        return cliente_gateway.despachar(acciones, logs, forzar)
+
+    pares, indices = expandir_acciones(acciones)
+    # Los pares que no cambiarían nada se dan por buenos sin enviarlos
+    omitidos = set() if forzar else {i for i, (lugar, estado) in enumerate(pares)
+                                     if sombra_dispositivos.es_redundante(lugar, estado)}
+    if omitidos:
+        log_depuracion("Omitidas %d acciones sin efecto: %s", logs, len(omitidos),
+                       ", ".join(f"{pares[i][0]}:{pares[i][1]}" for i in sorted(omitidos)), nivel=INFO)
+    enviar = [i for i in range(len(pares)) if i not in omitidos]
+    if not enviar:
+        return [True] * len(acciones)
+    pares_enviados = [pares[i] for i in enviar]
+    url_lote = f"{URL_BASE_ESP32}/control/batch"
+    # Formato compacto: cmds=cocina:on,cochera:off
+    params = {'cmds': ','.join(f"{lugar}:{estado}" for lugar, estado in pares_enviados)}
+    log_depuracion("Enviando lote de %d acciones a %s: %s", logs, len(pares_enviados), url_lote, params['cmds'])
+
+    try:
+        response = _peticion_pasarela(url_lote, params=params)
+    except requests.exceptions.RequestException as e:
+        log_depuracion("Fallo en la petición HTTP del lote. Error: %s", logs, e, nivel=ERROR)
+        if not isinstance(e, CircuitoAbierto):
+            for lugar, _ in pares_enviados:
+                sombra_dispositivos.actualizar(lugar, None)
+        return [False] * len(acciones)
+
+    if response.status_code == 404:
+        log_depuracion("El firmware del ESP32 no soporta /control/batch. Se usará el despacho individual.", logs, nivel=ADVERTENCIA)
+        _lote_no_soportado = (time.monotonic(), monitor_pasarela.reconexiones)
+        return cliente_gateway.despachar(acciones, logs, forzar)
+    if response.status_code != 200:
+        log_depuracion("El hardware respondió al lote con un error: %s", logs, response.status_code, nivel=ERROR)
+        return [False] * len(acciones)
+
+    # Respuesta: "cocina:OK,cochera:ERROR" en el mismo orden que el lote
+    respuesta = [item.rpartition(':')[2] == 'OK' for item in response.text.strip().split(',')]
+    respuesta += [False] * (len(pares_enviados) - len(respuesta))
+    log_depuracion("Respuesta del lote: %s", logs, response.text.strip(), nivel=INFO)
+
+    estados = [True] * len(pares)
+    for i, ok in zip(enviar, respuesta):
+        estados[i] = ok
+        if ok:
+            sombra_dispositivos.actualizar(*pares[i])
+    return [all(estados[i] for i in grupo) for grupo in indices]
+
+def leer_estado_pasarela():
+    """
+    Lee el estado real de los ambientes desde /estado del ESP32 (para el reconciliador).
+
+    Returns:
+        dict | None: {ambiente: 'on'/'off'}, o None si la pasarela no respondió o su
+        firmware no tiene la ruta /estado.
+    """
+    try:
+        response = _peticion_pasarela(f"{URL_BASE_ESP32}/estado")
+    except requests.exceptions.RequestException:
+        return None
+    if response.status_code != 200:
+        return None
+    # Respuesta: "descanso:on,cocina:off,..."
+    estados = {}
+    for item in response.text.strip().split(','):
+        lugar, _, estado = item.partition(':')
+        if lugar in AMBIENTES_ESP32 and estado in ('on', 'off'):
+            estados[lugar] = estado
+    return estados
+
 # --- Espacio para Futuros Sensores ---
 
 def leer_sensor_temperatura_dht22(logs):
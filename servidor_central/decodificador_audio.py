@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo para decodificar en proceso el audio que envía el navegador.
+
+Convierte el blob WebM/Opus de MediaRecorder directamente en un array float32 mono
+a 16 kHz listo para Whisper, sin lanzar ffmpeg como subproceso ni escribir un WAV
+intermedio.
+"""
+
+import av
+import numpy as np
+
+from motor_voz import FRECUENCIA_MUESTREO
+
+# Factores de escala para llevar muestras enteras al rango [-1, 1]
+_ESCALA_ENTEROS = {
+    np.dtype(np.uint8): (128.0, 128.0),
+    np.dtype(np.int16): (0.0, 32768.0),
+    np.dtype(np.int32): (0.0, 2147483648.0),
+}
+
+
+def _frame_a_mono(frame):
+    """Convierte un frame de PyAV en un array float32 mono (promedio de canales)."""
+    datos = frame.to_ndarray()
+    canales = len(frame.layout.channels)
+    if not frame.format.is_planar:
+        # Formato entrelazado: (1, muestras * canales) -> (canales, muestras)
+        datos = datos.reshape(-1, canales).T
+
+    escala = _ESCALA_ENTEROS.get(datos.dtype)
+    if escala is not None:
+        desplazamiento, divisor = escala
+        datos = (datos.astype(np.float32) - desplazamiento) / divisor
+    elif datos.dtype != np.float32:
+        datos = datos.astype(np.float32)
+
+    return datos[0] if canales == 1 else datos.mean(axis=0, dtype=np.float32)
+
+
+def remuestrear(muestras, frecuencia_origen, frecuencia_destino=FRECUENCIA_MUESTREO):
+    """
+    Remuestrea un array mono en una única pasada vectorizada.
+
+    Si la frecuencia de origen es múltiplo exacto de la de destino (48 kHz de Opus
+    -> 16 kHz) se promedian bloques de muestras, lo que además actúa como filtro
+    anti-aliasing. En otro caso se usa interpolación lineal.
+    """
+    if frecuencia_origen == frecuencia_destino or muestras.size == 0:
+        return muestras.astype(np.float32, copy=False)
+
+    if frecuencia_origen % frecuencia_destino == 0:
+        factor = frecuencia_origen // frecuencia_destino
+        utiles = muestras.size - (muestras.size % factor)
+        return muestras[:utiles].reshape(-1, factor).mean(axis=1, dtype=np.float32)
+
+    total_destino = int(round(muestras.size * frecuencia_destino / frecuencia_origen))
+    posiciones = np.arange(total_destino, dtype=np.float64) * (frecuencia_origen / frecuencia_destino)
+    return np.interp(posiciones, np.arange(muestras.size), muestras).astype(np.float32)
+
+
+def iterar_audio(origen):
+    """
+    Decodifica un audio frame a frame, a medida que el origen entrega datos.
+
+    Con un origen que bloquea en read() hasta recibir el siguiente fragmento (subida
+    por trozos desde el navegador) las muestras salen mientras el usuario sigue hablando.
+
+    Args:
+        origen: Objeto tipo archivo o ruta.
+
+    Yields:
+        tuple: (bloque float32 mono en el rango [-1, 1], frecuencia de muestreo del bloque).
+    """
+    with av.open(origen, mode="r") as contenedor:
+        if not contenedor.streams.audio:
+            raise ValueError("El archivo recibido no contiene pistas de audio.")
+        pista = contenedor.streams.audio[0]
+        frecuencia = pista.codec_context.sample_rate or pista.rate
+
+        for frame in contenedor.decode(pista):
+            yield _frame_a_mono(frame), frame.sample_rate or frecuencia
+
+
+def decodificar_audio(origen):
+    """
+    Decodifica un clip de audio comprimido a muestras listas para el motor ASR.
+
+    Args:
+        origen: Objeto tipo archivo (ej: `request.files['audio'].stream`) o ruta.
+
+    Returns:
+        numpy.ndarray: Muestras float32 mono a 16 kHz en el rango [-1, 1].
+    """
+    bloques = []
+    frecuencia = FRECUENCIA_MUESTREO
+    for bloque, frecuencia in iterar_audio(origen):
+        bloques.append(bloque)
+
+    if not bloques:
+        return np.zeros(0, dtype=np.float32)
+
+    return remuestrear(np.concatenate(bloques), frecuencia)
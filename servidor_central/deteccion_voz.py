@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de detección de actividad de voz (VAD) por energía, previo a Whisper.
+
+El navegador envía la grabación completa, con el silencio que queda antes de hablar y
+hasta que salta el límite de tiempo. Aquí se calcula la energía de tramas de 30 ms en
+una sola pasada vectorizada con NumPy, se estima el ruido de fondo del propio clip y
+se recorta el audio al tramo con voz (más un pequeño margen). Los clips sin voz se
+rechazan sin llegar a Whisper.
+
+Para la subida por trozos, `SegmentadorVoz` aplica el mismo criterio de forma
+incremental y detecta el fin del enunciado (silencio tras haber oído voz).
+"""
+
+import threading
+
+import numpy as np
+
+from motor_voz import FRECUENCIA_MUESTREO
+
+# --- Constantes de Configuración del Detector ---
+DURACION_TRAMA = 0.03          # Segundos por trama de análisis
+MARGEN_VOZ = 0.2               # Segundos que se conservan antes y después de la voz
+MIN_VOZ = 0.15                 # Segundos de tramas con voz para aceptar el clip
+PERCENTIL_RUIDO = 10           # Percentil de energía que se toma como ruido de fondo
+UMBRAL_SOBRE_RUIDO_DB = 12     # La voz supera el ruido de fondo en al menos esto
+RANGO_VOZ_DB = 25              # ...o está a menos de esto del pico (clips sin silencio)
+MARGEN_MINIMO_RUIDO_DB = 3     # Pero nunca por debajo de esto sobre el ruido (clips sin voz)
+PISO_ABSOLUTO_DB = -50         # Por debajo de esto nunca es voz (micrófono silenciado)
+SILENCIO_FIN_ENUNCIADO = 0.5   # Segundos de silencio tras la voz que cierran la orden
+
+
+class ResultadoVAD:
+    """Resultado del análisis de un clip: audio recortado y segundos ahorrados."""
+
+    def __init__(self, muestras, segundos_originales, hay_voz, umbral_db):
+        self.muestras = muestras
+        self.segundos_originales = segundos_originales
+        self.segundos_voz = muestras.size / FRECUENCIA_MUESTREO
+        self.segundos_recortados = segundos_originales - self.segundos_voz
+        self.hay_voz = hay_voz
+        self.umbral_db = umbral_db
+
+
+def _energia_db(muestras, longitud):
+    """Energía media en dBFS de cada trama completa (una sola operación sobre la matriz de tramas)."""
+    n_tramas = muestras.size // longitud
+    tramas = muestras[:n_tramas * longitud].reshape(n_tramas, longitud)
+    energia = np.einsum('ij,ij->i', tramas, tramas) / longitud
+    return 10.0 * np.log10(energia + 1e-10)
+
+
+def _umbral_db(db):
+    ruido = np.percentile(db, PERCENTIL_RUIDO)
+    umbral = min(ruido + UMBRAL_SOBRE_RUIDO_DB, db.max() - RANGO_VOZ_DB)
+    return max(PISO_ABSOLUTO_DB, ruido + MARGEN_MINIMO_RUIDO_DB, umbral)
+
+
+def detectar_voz(muestras, frecuencia=FRECUENCIA_MUESTREO):
+    """
+    Recorta el silencio inicial y final de un clip.
+
+    Args:
+        muestras (numpy.ndarray): Audio float32 mono en el rango [-1, 1].
+        frecuencia (int): Frecuencia de muestreo.
+
+    Returns:
+        ResultadoVAD: Con `muestras` vacías y `hay_voz=False` si no se detectó voz.
+    """
+    segundos = muestras.size / frecuencia
+    longitud = int(frecuencia * DURACION_TRAMA)
+    n_tramas = muestras.size // longitud
+    if n_tramas == 0:
+        return ResultadoVAD(muestras[:0], segundos, False, None)
+
+    db = _energia_db(muestras, longitud)
+    umbral = _umbral_db(db)
+    activas = db > umbral
+    # Al menos 2 de cada 3 tramas seguidas: descarta chasquidos aislados
+    activas = np.convolve(activas, np.ones(3, dtype=np.int8), mode='same') >= 2
+
+    indices = np.flatnonzero(activas)
+    if indices.size * DURACION_TRAMA < MIN_VOZ:
+        return ResultadoVAD(muestras[:0], segundos, False, float(umbral))
+
+    margen = int(MARGEN_VOZ * frecuencia)
+    inicio = max(indices[0] * longitud - margen, 0)
+    fin = min((indices[-1] + 1) * longitud + margen, muestras.size)
+    return ResultadoVAD(muestras[inicio:fin], segundos, True, float(umbral))
+
+
+class SegmentadorVoz:
+    """
+    Detección incremental del fin de enunciado sobre audio que llega por bloques.
+
+    Solo se calcula la energía de las tramas nuevas; el umbral se reevalúa con el
+    historial de energías (unos pocos cientos de valores por orden).
+    """
+
+    def __init__(self, frecuencia=FRECUENCIA_MUESTREO):
+        self.longitud = int(frecuencia * DURACION_TRAMA)
+        self._resto = np.zeros(0, dtype=np.float32)
+        self._db = []
+        self.segundos = 0.0
+        self.segundos_voz = 0.0
+        self.silencio_final = 0.0
+        self.hubo_voz = False
+
+    def agregar(self, muestras):
+        """
+        Añade un bloque de audio.
+
+        Returns:
+            bool: True cuando, tras haber oído voz, el silencio final alcanza SILENCIO_FIN_ENUNCIADO.
+        """
+        datos = np.concatenate((self._resto, muestras)) if self._resto.size else muestras
+        completas = datos.size // self.longitud * self.longitud
+        self._resto = datos[completas:].copy()
+        if not completas:
+            return False
+
+        self._db.extend(_energia_db(datos[:completas], self.longitud).tolist())
+        self.segundos = len(self._db) * DURACION_TRAMA
+        db = np.asarray(self._db)
+        activas = db > _umbral_db(db)
+        # Al menos 2 de cada 3 tramas seguidas, como en detectar_voz
+        activas = np.convolve(activas, np.ones(3, dtype=np.int8), mode='same') >= 2
+        indices = np.flatnonzero(activas)
+
+        self.segundos_voz = indices.size * DURACION_TRAMA
+        self.hubo_voz = self.segundos_voz >= MIN_VOZ
+        if self.hubo_voz:
+            # La última trama aún no tiene vecina por la derecha: no cuenta como silencio seguro
+            self.silencio_final = (len(db) - 1 - indices[-1]) * DURACION_TRAMA
+        return self.hubo_voz and self.silencio_final >= SILENCIO_FIN_ENUNCIADO
+
+
+class DetectorVoz:
+    """
+    Aplica el VAD y acumula lo ahorrado (audio recortado e inferencia evitada).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clips = 0
+        self.sin_voz = 0
+        self.segundos_entrada = 0.0
+        self.segundos_recortados = 0.0
+        self.inferencia_ahorrada = 0.0
+
+    def analizar(self, muestras):
+        resultado = detectar_voz(muestras)
+        with self._lock:
+            self.clips += 1
+            self.segundos_entrada += resultado.segundos_originales
+            self.segundos_recortados += resultado.segundos_recortados
+            if not resultado.hay_voz:
+                self.sin_voz += 1
+        return resultado
+
+    def registrar_ahorro(self, segundos):
+        with self._lock:
+            self.inferencia_ahorrada += max(segundos, 0.0)
+
+    def estado(self):
+        with self._lock:
+            return {
+                'clips': self.clips,
+                'sin_voz': self.sin_voz,
+                'segundos_entrada': round(self.segundos_entrada, 2),
+                'segundos_recortados': round(self.segundos_recortados, 2),
+                'inferencia_ahorrada_s': round(self.inferencia_ahorrada, 2),
+            }
+
+
+# Instancia única para todo el proceso
+detector_voz = DetectorVoz()
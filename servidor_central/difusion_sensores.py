@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo para la difusión en tiempo real de las lecturas de sensores al panel.
+
+El hilo serial publica cada línea ya interpretada y este módulo la reparte a todos
+los suscriptores (Server-Sent Events) o a quien espere en long-polling. Cada cliente
+tiene una cola acotada: si no la vacía a tiempo se le desconecta en lugar de frenar
+al resto o acumular memoria.
+"""
+
+import json
+import queue
+import threading
+import time
+
+# --- Constantes de Configuración de la Difusión ---
+TAMANO_COLA_CLIENTE = 32
+MAX_SUSCRIPTORES = 32
+
+# Cambio mínimo para volver a publicar un campo (zona muerta) ...
+ZONA_MUERTA = {'gas': 3, 'temp': 0.1, 'hum': 0.5, 'distancia': 1}
+# ... e intervalo mínimo entre publicaciones del mismo campo, en segundos
+INTERVALO_MINIMO = {'gas': 0.2, 'temp': 1.0, 'hum': 1.0, 'distancia': 0.1}
+# Umbrales que el panel usa para colores y alarma: cruzarlos siempre se publica
+UMBRALES_CRUCE = {'gas': (300, 400, 600), 'distancia': (10, 50)}
+
+
+class Suscripcion:
+    """Cola acotada de mensajes pendientes de un cliente."""
+
+    def __init__(self, tamano=TAMANO_COLA_CLIENTE):
+        self.cola = queue.Queue(maxsize=tamano)
+        self.expulsada = False
+
+
+def _cruza_umbral(campo, anterior, nuevo):
+    return any((anterior > u) != (nuevo > u) for u in UMBRALES_CRUCE.get(campo, ()))
+
+
+class DifusorSensores:
+    """
+    Reparte instantáneas combinadas de los sensores a todos los clientes conectados.
+    """
+
+    def __init__(self):
+        self._suscriptores = set()
+        self._lock = threading.Lock()
+        self._condicion = threading.Condition(self._lock)
+        self._publicado = {}  # campo -> (valor, instante)
+        self.instantanea = {}
+        self.version = 0
+        self.expulsados = 0
+
+    def _debe_publicar(self, campo, valor, ahora):
+        previo = self._publicado.get(campo)
+        if previo is None:
+            return True
+        anterior, instante = previo
+        if anterior is None or valor is None:
+            return anterior is not valor
+        if _cruza_umbral(campo, anterior, valor):
+            return True
+        if ahora - instante < INTERVALO_MINIMO.get(campo, 0):
+            return False
+        return abs(valor - anterior) >= ZONA_MUERTA.get(campo, 0)
+
+    def publicar(self, lecturas):
+        """
+        Publica los campos leídos en una línea serial (solo los que cambian lo suficiente).
+
+        Args:
+            lecturas (dict): Campos presentes en la línea, ej: {'gas': 120, 'distancia': 45}.
+        """
+        ahora = time.monotonic()
+        with self._condicion:
+            cambios = {c: v for c, v in lecturas.items() if self._debe_publicar(c, v, ahora)}
+            if not cambios:
+                return
+            for campo, valor in cambios.items():
+                self._publicado[campo] = (valor, ahora)
+            self.instantanea.update(cambios)
+            self.version += 1
+            # Se serializa una sola vez y se comparte el mismo texto con todos los clientes
+            mensaje = json.dumps(dict(self.instantanea, version=self.version))
+            suscriptores = list(self._suscriptores)
+            self._condicion.notify_all()
+
+        for suscripcion in suscriptores:
+            try:
+                suscripcion.cola.put_nowait(mensaje)
+            except queue.Full:
+                self._expulsar(suscripcion)
+
+    def _expulsar(self, suscripcion):
+        with self._lock:
+            self._suscriptores.discard(suscripcion)
+            self.expulsados += 1
+        suscripcion.expulsada = True
+        # Vaciar la cola y dejar la marca de fin para que el generador SSE termine
+        try:
+            while True:
+                suscripcion.cola.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            suscripcion.cola.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def suscribir(self):
+        """
+        Registra un cliente nuevo; su cola empieza con la instantánea actual.
+
+        Returns:
+            Suscripcion | None: None si se alcanzó el máximo de clientes.
+        """
+        suscripcion = Suscripcion()
+        with self._lock:
+            if len(self._suscriptores) >= MAX_SUSCRIPTORES:
+                return None
+            self._suscriptores.add(suscripcion)
+            if self.instantanea:
+                suscripcion.cola.put_nowait(json.dumps(dict(self.instantanea, version=self.version)))
+        return suscripcion
+
+    def cancelar(self, suscripcion):
+        with self._lock:
+            self._suscriptores.discard(suscripcion)
+
+    def esperar_cambio(self, version, timeout):
+        """
+        Long-polling: bloquea hasta que haya una versión posterior a `version` o venza el plazo.
+
+        Returns:
+            dict: La instantánea actual con su número de versión.
+        """
+        with self._condicion:
+            self._condicion.wait_for(lambda: self.version > version, timeout=timeout)
+            return dict(self.instantanea, version=self.version)
+
+    def estado(self):
+        with self._lock:
+            return {'suscriptores': len(self._suscriptores), 'version': self.version, 'expulsados': self.expulsados}
+
+
+# Instancia única para todo el proceso
+difusor_sensores = DifusorSensores()
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo con el único escritor del puerto serial del Arduino.
+
+Todas las órdenes (servo, LED de alarma) pasan por una cola atendida por un hilo
+dedicado, así ninguna petición HTTP escribe directamente en el puerto. Mientras una
+orden espera turno se fusiona con las siguientes del mismo tipo: del servo solo se
+envía el último ángulo pedido y un LED que ya está en el estado solicitado no se
+reenvía. La alarma (LED) sale antes que el servo.
+
+El sketch lee una sola orden por vuelta de loop() (unos 50 ms, hasta 6 s mientras abre
+la puerta por proximidad) y su buffer de recepción es de 64 bytes, así que las
+escrituras no se espacian por los baudios sino por el propio sketch: cada vuelta imprime
+una línea de sensores, y tras escribir una orden se esperan LINEAS_CONSUMO líneas (la
+orden ya se leyó) antes de escribir la siguiente. Si el sketch no imprime nada se
+escribe igualmente pasado ESPERA_MAXIMA_CONSUMO.
+"""
+
+import threading
+import time
+
+# --- Constantes de Configuración del Escritor ---
+BAUDIOS_ARDUINO = 9600
+BITS_POR_BYTE = 10               # 8N1: bit de inicio + 8 datos + bit de parada
+# Una línea puede ser de la vuelta en curso (que ya pasó por la lectura); la segunda
+# garantiza una vuelta completa, y por tanto una lectura, después de escribir
+LINEAS_CONSUMO = 2
+ESPERA_MAXIMA_CONSUMO = 6.5      # Segundos: cubre el delay(5000) + delay(1000) de la apertura por proximidad
+TIMEOUT_ACK_ARDUINO = 8.0        # Una orden puede esperar a que el sketch consuma la anterior
+# Menor número = mayor prioridad
+PRIORIDAD_COMANDOS = {'LED': 0, 'SERVO': 1}
+
+
+class Envio:
+    """Orden pendiente de un tipo (LED, SERVO) y las peticiones que esperan su confirmación."""
+
+    def __init__(self, clave, valor, orden):
+        self.clave = clave
+        self.valor = valor
+        self.orden = orden
+        self.encolado = time.perf_counter()
+        self.esperas = []  # (evento, resultado) de cada petición fusionada en este envío
+
+
+def _separar(comando):
+    """'SERVO:90' -> ('SERVO', '90')."""
+    clave, _, valor = comando.strip().partition(':')
+    return clave.upper(), valor
+
+
+class EscritorArduino:
+    """
+    Hilo escritor único con fusión de órdenes, prioridad y límite de velocidad.
+    """
+
+    def __init__(self, baudios=BAUDIOS_ARDUINO):
+        self.baudios = baudios
+        self.puerto = None
+        self._pendientes = {}   # clave -> Envio
+        self._escrito = {}      # clave -> último valor escrito en el puerto
+        self._orden = 0
+        self._condicion = threading.Condition()
+        self._lineas = 0                # Líneas recibidas del sketch (cada vuelta de loop() imprime una)
+        self._lineas_al_escribir = 0
+        self._escrito_en = None         # Instante (monotonic) de la última escritura
+        self._hilo = None
+
+        self.escritos = 0
+        self.sin_eco = 0                # Escrituras que no esperaron al sketch (no imprimía)
+        self.fusionados = 0
+        self.deduplicados = 0
+        self.errores = 0
+
+    @property
+    def conectado(self):
+        return self.puerto is not None and self.puerto.is_open
+
+    def asignar_puerto(self, puerto):
+        """Registra el puerto abierto por el hilo de lectura y arranca el escritor (idempotente)."""
+        with self._condicion:
+            self.puerto = puerto
+            self._escrito.clear()  # Estado desconocido tras (re)conectar
+            self._escrito_en = None
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._bucle_escritor, daemon=True)
+                self._hilo.start()
+
+    def notificar_linea(self):
+        """La placa imprimió una línea: el sketch completó una vuelta de loop()."""
+        with self._condicion:
+            self._lineas += 1
+            if self._pendientes:
+                self._condicion.notify()
+
+    def _sketch_listo(self):
+        return self._escrito_en is None or self._lineas - self._lineas_al_escribir >= LINEAS_CONSUMO
+
+    def enviar(self, comando, esperar=True, timeout=TIMEOUT_ACK_ARDUINO):
+        """
+        Encola una orden para el Arduino.
+
+        Args:
+            comando (str): Ej: "SERVO:90" o "LED:1" (sin salto de línea).
+            esperar (bool): Bloquear hasta que la orden se escriba en el puerto.
+            timeout (float): Espera máxima en segundos.
+
+        Returns:
+            dict: Confirmación con 'comando' (el que se escribió realmente), 'cola_ms'
+            (espera en cola hasta escribirse), 'total_estimado_ms' (cola más la transmisión
+            calculada por baudios; el sketch no confirma la recepción), 'fusionado' y
+            'deduplicado'. Sin esperar, solo {'comando', 'encolado': True}.
+
+        Raises:
+            ConnectionError: Si el Arduino no está conectado o falló la escritura.
+            TimeoutError: Si la orden no se transmitió dentro del plazo.
+        """
+        if not self.conectado:
+            raise ConnectionError("Arduino no conectado")
+        clave, valor = _separar(comando)
+        evento = threading.Event()
+        resultado = {'comando': f"{clave}:{valor}"}
+
+        with self._condicion:
+            envio = self._pendientes.get(clave)
+            if envio is None and self._escrito.get(clave) == valor and clave == 'LED':
+                # El LED ya está en ese estado y no hay otra orden en cola que lo cambie
+                self.deduplicados += 1
+                resultado.update(cola_ms=0.0, total_estimado_ms=0.0, fusionado=False, deduplicado=True)
+                return resultado
+            if envio is None:
+                self._orden += 1
+                envio = Envio(clave, valor, self._orden)
+                self._pendientes[clave] = envio
+            else:
+                # Fusión: la orden en cola pasa a llevar el valor más reciente
+                envio.valor = valor
+                self.fusionados += 1
+            envio.esperas.append((evento, resultado))
+            self._condicion.notify()
+
+        if not esperar:
+            return {'comando': resultado['comando'], 'encolado': True}
+        if not evento.wait(timeout):
+            raise TimeoutError(f"Sin confirmación de '{resultado['comando']}' en {timeout}s")
+        if 'error' in resultado:
+            raise ConnectionError(resultado['error'])
+        return resultado
+
+    # --- Hilo escritor ---
+
+    def _siguiente(self):
+        """Saca la orden pendiente más prioritaria (y, a igual prioridad, la más antigua)."""
+        clave = min(self._pendientes, key=lambda c: (PRIORIDAD_COMANDOS.get(c, 9), self._pendientes[c].orden))
+        return self._pendientes.pop(clave)
+
+    def _bucle_escritor(self):
+        while True:
+            with self._condicion:
+                self._condicion.wait_for(lambda: self._pendientes)
+                # No escribir hasta que el sketch haya leído la orden anterior (lo que llegue
+                # mientras tanto se fusiona), sin llenar su buffer de 64 bytes
+                if self._escrito_en is not None:
+                    limite = self._escrito_en + ESPERA_MAXIMA_CONSUMO - time.monotonic()
+                    if not self._condicion.wait_for(self._sketch_listo, timeout=max(limite, 0.0)):
+                        self.sin_eco += 1
+                envio = self._siguiente()
+                puerto = self.puerto
+
+            datos = f"{envio.clave}:{envio.valor}\n".encode()
+            error = None
+            try:
+                puerto.write(datos)
+            except Exception as e:
+                error = str(e)
+                self.errores += 1
+                print(f"[ARDUINO ERROR] No se pudo escribir '{datos.strip().decode()}': {e}")
+
+            duracion = len(datos) * BITS_POR_BYTE / self.baudios  # Estimada: no hay confirmación
+            with self._condicion:
+                self._escrito_en = time.monotonic()
+                self._lineas_al_escribir = self._lineas
+                if error is None:
+                    self._escrito[envio.clave] = envio.valor
+                    self.escritos += 1
+
+            fin = time.perf_counter() + duracion
+            escrito = f"{envio.clave}:{envio.valor}"
+            for evento, resultado in envio.esperas:
+                if error is not None:
+                    resultado['error'] = error
+                else:
+                    fusionado = resultado['comando'] != escrito or len(envio.esperas) > 1
+                    resultado.update(comando=escrito,
+                                     cola_ms=round((time.perf_counter() - envio.encolado) * 1000, 2),
+                                     total_estimado_ms=round((fin - envio.encolado) * 1000, 2),
+                                     fusionado=fusionado, deduplicado=False)
+                evento.set()
+
+    def estado(self):
+        with self._condicion:
+            return {
+                'conectado': self.conectado,
+                'pendientes': {c: e.valor for c, e in self._pendientes.items()},
+                'escritos': self.escritos,
+                'fusionados': self.fusionados,
+                'deduplicados': self.deduplicados,
+                'sin_eco': self.sin_eco,
+                'errores': self.errores,
+            }
+
+
+# Instancia única para todo el proceso
+escritor_arduino = EscritorArduino()
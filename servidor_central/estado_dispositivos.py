@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo con la "sombra" en memoria del estado de los dispositivos de la maqueta.
+
+Guarda el último estado conocido de cada ambiente del ESP32, del LED de alarma y del
+servo de la puerta. Se actualiza con el resultado de cada orden enviada y, en segundo
+plano, un reconciliador lo contrasta con lo que reporta la pasarela. Con ella el
+despachador puede omitir órdenes que no cambiarían nada y /api/state responde sin
+tocar el hardware (el JSON se serializa una vez por cambio, no por consulta).
+"""
+
+import json
+import threading
+import time
+
+# --- Constantes de Configuración de la Sombra ---
+# Mismos ambientes que AMBIENTES_ESP32 en control_red.py
+AMBIENTES_SOMBRA = ['descanso', 'cocina', 'principal', 'cochera', 'habitacion']
+INTERVALO_RECONCILIACION = 30    # Segundos entre lecturas del estado real de la pasarela
+# Pasado este tiempo sin confirmar, un estado deja de usarse para omitir órdenes
+VIGENCIA_ESTADO = 300
+
+
+class SombraDispositivos:
+    """
+    Último estado conocido de cada dispositivo (None = desconocido).
+    """
+
+    def __init__(self, ambientes=AMBIENTES_SOMBRA):
+        self.ambientes = list(ambientes)
+        self._estados = {lugar: {'estado': None, 'actualizado': None, 'origen': None}
+                         for lugar in self.ambientes + ['alarma', 'puerta']}
+        self._lock = threading.Lock()
+        self._hilo = None
+        self.version = 0
+        self.omitidas = 0
+        self.reconciliaciones = 0
+        self.discrepancias = 0
+        self._json = self._serializar()
+
+    def _serializar(self):
+        return json.dumps({'status': 'success', 'version': self.version, 'dispositivos': self._estados})
+
+    def _destinos(self, lugar):
+        lugar = lugar.lower()
+        return self.ambientes if lugar == 'todas' else [lugar]
+
+    def actualizar(self, lugar, estado, origen='comando'):
+        """
+        Registra el estado de un dispositivo ('todas' se aplica a cada ambiente).
+
+        Args:
+            lugar (str): Ambiente, 'todas', 'alarma' o 'puerta'.
+            estado: 'on'/'off' para ambientes y alarma, ángulo (int) para la puerta,
+                o None si el resultado de la orden es incierto.
+            origen (str): 'comando', 'reconciliacion' o 'regla'.
+        """
+        if isinstance(estado, str):
+            estado = estado.lower()
+        ahora = time.time()
+        with self._lock:
+            cambio = False
+            for destino in self._destinos(lugar):
+                registro = self._estados.get(destino)
+                if registro is None:
+                    continue
+                cambio = cambio or registro['estado'] != estado
+                registro.update(estado=estado, actualizado=ahora, origen=origen)
+            if cambio:
+                self.version += 1
+            self._json = self._serializar()
+
+    def es_redundante(self, lugar, estado):
+        """True si todos los destinos ya están en `estado` según un dato reciente."""
+        limite = time.time() - VIGENCIA_ESTADO
+        estado = estado.lower() if isinstance(estado, str) else estado
+        with self._lock:
+            for destino in self._destinos(lugar):
+                registro = self._estados.get(destino)
+                if registro is None or registro['estado'] != estado or (registro['actualizado'] or 0) < limite:
+                    return False
+            self.omitidas += 1
+            return True
+
+    def obtener(self, lugar):
+        with self._lock:
+            registro = self._estados.get(lugar.lower())
+            return registro['estado'] if registro else None
+
+    def json(self):
+        """Instantánea ya serializada (la misma cadena hasta el próximo cambio)."""
+        return self._json
+
+    # --- Reconciliación con el hardware ---
+
+    def reconciliar(self, estados_reales):
+        """
+        Sustituye la sombra de los ambientes por lo que reporta la pasarela.
+
+        Args:
+            estados_reales (dict): Ej: {'cocina': 'on', 'cochera': 'off'}.
+        """
+        with self._lock:
+            self.reconciliaciones += 1
+            self.discrepancias += sum(1 for lugar, estado in estados_reales.items()
+                                      if lugar in self._estados and self._estados[lugar]['estado'] not in (None, estado))
+        for lugar, estado in estados_reales.items():
+            self.actualizar(lugar, estado, origen='reconciliacion')
+
+    def iniciar_reconciliacion(self, lector, intervalo=INTERVALO_RECONCILIACION):
+        """
+        Arranca el hilo que refresca la sombra periódicamente.
+
+        Args:
+            lector (callable): Función sin argumentos que devuelve {ambiente: 'on'/'off'}
+                o None si la pasarela no respondió.
+        """
+        if self._hilo is not None:
+            return
+
+        def bucle():
+            while True:
+                try:
+                    estados = lector()
+                    if estados:
+                        self.reconciliar(estados)
+                except Exception as e:
+                    print(f"[SOMBRA] Error reconciliando con la pasarela: {e}")
+                time.sleep(intervalo)
+
+        self._hilo = threading.Thread(target=bucle, daemon=True)
+        self._hilo.start()
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'version': self.version,
+                'omitidas': self.omitidas,
+                'reconciliaciones': self.reconciliaciones,
+                'discrepancias': self.discrepancias,
+            }
+
+
+# Instancia única para todo el proceso
+sombra_dispositivos = SombraDispositivos()
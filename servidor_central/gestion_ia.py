@@ -4,22 +4,58 @@ Módulo para la gestión de la inteligencia artificial, incluyendo la comunicaci
 con el modelo de lenguaje local (Ollama con Llama 3).
 """
 
+import atexit
+import os
 import requests
 import json
-from datetime import datetime
+
+from parser_intenciones import ParserIntenciones
+from cache_intenciones import CacheIntenciones
+from clasificador_intenciones import ClasificadorIntenciones
+from cliente_ollama import ClienteOllama, ErrorOllama
+from metricas import metricas
+from registro_eventos import DEPURACION, INFO, ADVERTENCIA, ERROR, registrar
+from subsistemas import Subsistema, SubsistemaNoDisponible
 
 # --- Constantes de Configuración de IA ---
-URL_OLLAMA_API = "http://localhost:11434/api/generate"
+URL_OLLAMA_API = os.environ.get("WASI_URL_OLLAMA", "http://localhost:11434/api/generate")
 MODELO_LLAMA = "llama3"
+LUGARES_VALIDOS = ['descanso', 'cocina', 'principal', 'cochera', 'habitacion', 'puerta', 'alarma']
+
+# Vacía (WASI_RUTA_CACHE_INTENCIONES=) desactiva la persistencia: la caché vive solo en memoria
+RUTA_CACHE_INTENCIONES = os.environ.get("WASI_RUTA_CACHE_INTENCIONES",
+                                        os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache_intenciones.json")) or None
+
+# Gramática compilada para las órdenes simples (evita la llamada al LLM)
+parser_rapido = ParserIntenciones(LUGARES_VALIDOS)
+
+# Clasificador por similitud para las variaciones que la gramática no admite (índice precalculado)
+clasificador = ClasificadorIntenciones(LUGARES_VALIDOS).cargar()
+
+# Cliente con sesión persistente y modelo fijado en memoria. Es un subsistema opcional
+# (WASI_LLM): sin él la gramática, la caché y el clasificador siguen resolviendo órdenes
+llm = Subsistema('llm', lambda: ClienteOllama(URL_OLLAMA_API, MODELO_LLAMA), f"{MODELO_LLAMA} en Ollama")
+
+# Interpretaciones ya devueltas por el LLM, reutilizables mientras no cambie la configuración
+cache_intenciones = CacheIntenciones(ruta_disco=RUTA_CACHE_INTENCIONES)
+
+def firma_configuracion():
+    """
+    Identifica la configuración que determina la respuesta del LLM (modelo y lugares).
+    """
+    return f"{MODELO_LLAMA}|{','.join(LUGARES_VALIDOS)}"
+
+cache_intenciones.configurar_firma(firma_configuracion())
+cache_intenciones.cargar_disco()
+atexit.register(cache_intenciones.volcar_disco)
 
 # --- Funciones de Logging ---
 
-def log_ia(mensaje, logs):
+def log_ia(mensaje, logs, *args, nivel=INFO):
     """
-    Añade un mensaje de log específico de la IA a una lista de logs.
+    Registra un evento de la capa de IA en nombre de `logs` (formato % diferido).
     """
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    logs.append(f"[IA_LOG] [{timestamp}] {mensaje}")
+    registrar(logs, nivel, 'IA_LOG', mensaje, *args)
 
 # --- Funciones de Procesamiento de Lenguaje ---
 
@@ -34,10 +70,39 @@ def procesar_comando_voz(texto_usuario, logs):
     Returns:
         dict: Un diccionario con {'acciones': [{'accion': '...', 'lugar': '...'}, ...]}
     """
-    log_ia(f"Enviando consulta a {MODELO_LLAMA}: '{texto_usuario}'", logs)
+    # Ruta rápida: si la gramática entiende la orden completa no hace falta el LLM
+    resultado_rapido = parser_rapido.interpretar(texto_usuario)
+    if resultado_rapido is not None:
+        log_ia("Orden resuelta sin LLM (ruta rápida): %s", logs, resultado_rapido['acciones'])
+        metricas.contar("ia_resoluciones_total", ruta="parser")
+        return resultado_rapido
+
+    # Caché: la misma orden (normalizada) ya fue interpretada por el LLM
+    cache_intenciones.configurar_firma(firma_configuracion())
+    acciones_cacheadas = cache_intenciones.obtener(texto_usuario)
+    if acciones_cacheadas is not None:
+        log_ia("Orden resuelta desde la caché de intenciones: %s", logs, acciones_cacheadas)
+        metricas.contar("ia_resoluciones_total", ruta="cache")
+        return {'acciones': acciones_cacheadas}
+
+    # Clasificador: sinónimos y errores de transcripción; por debajo del umbral decide el LLM
+    resultado_clasificador = clasificador.clasificar(texto_usuario)
+    if resultado_clasificador is not None:
+        acciones = [{'accion': a['accion'], 'lugar': a['lugar']} for a in resultado_clasificador['acciones']]
+        log_ia("Orden resuelta por el clasificador (confianza %.2f): %s", logs, resultado_clasificador['confianza'], acciones)
+        metricas.contar("ia_resoluciones_total", ruta="clasificador")
+        return {'acciones': acciones}
+
+    try:
+        cliente_ollama = llm.obtener()
+    except SubsistemaNoDisponible as e:
+        log_ia("%s La orden no se pudo interpretar sin el LLM.", logs, e, nivel=ADVERTENCIA)
+        metricas.contar("ia_resoluciones_total", ruta="sin_llm")
+        return {'acciones': []}
+
+    log_ia("Enviando consulta a %s: '%s'", logs, MODELO_LLAMA, texto_usuario)
 
     # Prompt diseñado para devolver una LISTA de acciones.
-    lugares_validos = ['descanso', 'cocina', 'principal', 'cochera', 'habitacion', 'puerta', 'alarma']
     prompt_estructurado = (
         "Eres un asistente de domótica. Analiza la orden y desglósala en acciones individuales. "
         "Lugares disponibles (usa el código entre paréntesis): Dormitorio (descanso), Cocina (cocina), Sala principal (principal), Cochera (cochera), Sala de descanso (habitacion), Puerta (puerta), Alarma (alarma) y Todas (todas). "
@@ -51,88 +116,72 @@ def procesar_comando_voz(texto_usuario, logs):
         f"La orden es: '{texto_usuario}'"
     )
 
-    payload = {
-        "model": MODELO_LLAMA,
-        "prompt": prompt_estructurado,
-        "stream": False  # Para recibir la respuesta completa de una vez
-    }
-
-    # --- Log detallado para depuración en la consola del servidor ---
-    print("\n" + "="*50)
-    print("CONTACTANDO A LA API DE OLLAMA")
-    print(f"URL: {URL_OLLAMA_API}")
-    print("--- INICIO PAYLOAD OLLAMA ---")
-    print(json.dumps(payload, indent=2, ensure_ascii=False))
-    print("--- FIN PAYLOAD OLLAMA ---\n")
-    # ----------------------------------------------------------------
-
+    # Las reglas van antes que la orden: con el modelo fijado en memoria (keep_alive)
+    # Ollama reutiliza el prefijo ya procesado del prompt entre llamadas.
+    metricas.contar("ia_resoluciones_total", ruta="llm")
     try:
-        response = requests.post(URL_OLLAMA_API, json=payload, timeout=30)
-        
-        if response.status_code == 200:
-            respuesta_json = response.json()
-            
-            # --- Log detallado de la respuesta para depuración ---
-            print("--- INICIO RESPUESTA OLLAMA ---")
-            print(json.dumps(respuesta_json, indent=2, ensure_ascii=False))
-            print("--- FIN RESPUESTA OLLAMA ---")
-            print("="*50 + "\n")
-            # ----------------------------------------------------
-
-            # La respuesta de Ollama está en la clave 'response'
-            respuesta_modelo = respuesta_json.get("response", "").strip()
-            
-            log_ia(f"Respuesta del modelo: {respuesta_modelo}", logs)
-
-            # 1. Limpieza básica de markdown
-            limpio = respuesta_modelo.replace('```json', '').replace('```', '').strip()
-
-            # 2. Parche para error observado: si empieza con { y termina en ], le falta la } final
-            if limpio.startswith('{') and limpio.endswith(']'):
-                limpio += '}'
-
-            try:
-                datos = json.loads(limpio)
-            except json.JSONDecodeError:
-                # 3. Si falla, intentamos extracción estricta (útil si hay texto conversacional alrededor)
-                inicio = respuesta_modelo.find('{')
-                fin = respuesta_modelo.rfind('}')
-                if inicio != -1 and fin != -1:
-                    try:
-                        datos = json.loads(respuesta_modelo[inicio:fin+1])
-                    except json.JSONDecodeError as e:
-                        log_ia(f"Error JSON persistente: {e}. Texto: {limpio}", logs)
-                        return {'acciones': []}
-                else:
-                    log_ia(f"No se encontró JSON válido. Texto: {limpio}", logs)
-                    return {'acciones': []}
-
-            # Normalizamos la respuesta para asegurar que siempre sea una lista
-            acciones = datos.get('acciones', [])
-            
-            # Si el modelo devolvió el formato antiguo (solo un objeto), lo convertimos a lista
-            if not acciones and 'accion' in datos:
-                acciones = [{'accion': datos['accion'], 'lugar': datos.get('lugar', 'unknown')}]
-            
-            return {'acciones': acciones}
-
-        else:
-            log_ia(f"Error en la comunicación con la API de Ollama. Código: {response.status_code}", logs)
-            log_ia(f"Respuesta del servidor: {response.text}", logs)
-            if response.status_code == 404 and "model" in response.text and "not found" in response.text:
-                log_ia(f"[SOLUCION] El modelo '{MODELO_LLAMA}' no está instalado.", logs)
-                log_ia(f"[SOLUCION] Abre una terminal y ejecuta: ollama pull {MODELO_LLAMA}", logs)
+        with metricas.medir("etapa", etapa="llm"):
+            datos, respuesta_modelo, latencias = cliente_ollama.generar_json(prompt_estructurado)
+        log_ia("Respuesta del modelo: %s", logs, respuesta_modelo.strip(), nivel=DEPURACION)
+        log_ia("Latencia Ollama: TTFT %s ms, total %s ms", logs, latencias['ttft_ms'], latencias['total_ms'])
+
+        if datos is None:
+            # El modo JSON de Ollama debería evitarlo; último recurso por si el texto llegó truncado
+            log_ia("No se encontró JSON válido. Texto: %s", logs, respuesta_modelo.strip(), nivel=ADVERTENCIA)
             return {'acciones': []}
-            
+
+        # Normalizamos la respuesta para asegurar que siempre sea una lista
+        acciones = datos.get('acciones', [])
+
+        # Si el modelo devolvió el formato antiguo (solo un objeto), lo convertimos a lista
+        if not acciones and 'accion' in datos:
+            acciones = [{'accion': datos['accion'], 'lugar': datos.get('lugar', 'unknown')}]
+
+        cache_intenciones.guardar(texto_usuario, acciones)
+        return {'acciones': acciones}
+
+    except ErrorOllama as e:
+        log_ia("Error en la comunicación con la API de Ollama. Código: %s", logs, e.codigo, nivel=ERROR)
+        log_ia("Respuesta del servidor: %s", logs, e.texto, nivel=ERROR)
+        if e.codigo == 404 and "model" in e.texto and "not found" in e.texto:
+            log_ia("[SOLUCION] El modelo '%s' no está instalado.", logs, MODELO_LLAMA, nivel=ERROR)
+            log_ia("[SOLUCION] Abre una terminal y ejecuta: ollama pull %s", logs, MODELO_LLAMA, nivel=ERROR)
+        return {'acciones': []}
     except requests.exceptions.RequestException as e:
-        log_ia(f"Fallo crítico en la conexión con la API de Ollama. Error: {e}", logs)
-        # También imprimimos en consola en este caso crítico para el desarrollador
-        print(f"\n[ERROR] No se pudo conectar a Ollama. Asegúrate de que esté en ejecución y sea accesible en {URL_OLLAMA_API}\n")
+        log_ia("Fallo crítico en la conexión con la API de Ollama. Error: %s", logs, e, nivel=ERROR)
+        # Nivel ERROR: además de guardarse, el registro lo imprime en consola para el desarrollador
+        log_ia("No se pudo conectar a Ollama. Asegúrate de que esté en ejecución y sea accesible en %s",
+               logs, URL_OLLAMA_API, nivel=ERROR)
         return {'acciones': []}
     except json.JSONDecodeError as e:
-        log_ia(f"No se pudo decodificar la respuesta JSON de Ollama. Error: {e}", logs)
+        log_ia("No se pudo decodificar la respuesta JSON de Ollama. Error: %s", logs, e, nivel=ERROR)
         return {'acciones': []}
 
+def precargar_modelo_ia():
+    """
+    Carga el modelo en Ollama al arrancar para que la primera orden no pague la carga.
+    """
+    try:
+        cliente_ollama = llm.obtener()
+    except SubsistemaNoDisponible as e:
+        print(f"[IA] {e}")
+        return
+    if cliente_ollama.precargar():
+        print(f"[IA] Modelo '{MODELO_LLAMA}' cargado y fijado en Ollama (keep_alive={cliente_ollama.keep_alive})")
+    else:
+        print(f"[IA] No se pudo precargar '{MODELO_LLAMA}' en {URL_OLLAMA_API}. Se cargará con la primera orden.")
+
+def estadisticas_ia():
+    """
+    Devuelve los contadores de la capa de IA (cuánto tráfico se resuelve sin el LLM).
+    """
+    return {
+        'parser_rapido': parser_rapido.estadisticas(),
+        'cache_intenciones': cache_intenciones.estadisticas(),
+        'clasificador': clasificador.estadisticas(),
+        'ollama': llm.obtener().estadisticas() if llm.cargado else llm.estado(),
+    }
+
 # --- Ejemplo de uso (para pruebas directas del módulo) ---
 if __name__ == '__main__':
     logs_prueba = []
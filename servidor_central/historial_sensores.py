@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo con el historial en memoria de las lecturas de sensores.
+
+Cada canal (gas, temp, hum, distancia) guarda sus muestras en un buffer circular de
+capacidad fija respaldado por arrays de NumPy: escribir una muestra solo actualiza
+dos posiciones de los arrays, sin crear objetos Python por muestra. Las consultas
+reducen el rango pedido a N cubetas (mín/máx/media) con operaciones vectorizadas.
+
+Las muestras se marcan con time.monotonic(): las consultas buscan por bisección y
+necesitan instantes ordenados, y el reloj de pared del PC puede saltar hacia atrás
+(sincronización NTP, cambio de hora). La hora de pared solo aparece en la API.
+"""
+
+import threading
+import time
+
+import numpy as np
+
+# --- Constantes de Configuración del Historial ---
+CAPACIDAD_HISTORIAL = 1 << 19   # ~524k muestras por canal (24 h a ~6 muestras/s)
+CANALES_HISTORIAL = ('gas', 'temp', 'hum', 'distancia')
+MAX_PUNTOS_CONSULTA = 2000
+
+
+class BufferCircular:
+    """
+    Buffer circular de (instante, valor) con capacidad fija. Los instantes deben ser no
+    decrecientes (reloj monotónico). Los valores ausentes o erróneos (lecturas 'nan' del
+    DHT22) se guardan como NaN.
+    """
+
+    def __init__(self, capacidad=CAPACIDAD_HISTORIAL):
+        self.capacidad = capacidad
+        self._tiempos = np.zeros(capacidad, dtype=np.float64)
+        self._valores = np.full(capacidad, np.nan, dtype=np.float32)
+        self._posicion = 0
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def escribir(self, instante, valor):
+        """Añade una muestra (sobrescribe la más antigua cuando el buffer está lleno)."""
+        with self._lock:
+            i = self._posicion
+            self._tiempos[i] = instante
+            self._valores[i] = np.nan if valor is None else valor
+            self._posicion = i + 1 if i + 1 < self.capacidad else 0
+            self._total += 1
+
+    def __len__(self):
+        return min(self._total, self.capacidad)
+
+    def _rango(self, desde, hasta):
+        """Copia, en orden cronológico, solo las muestras con desde <= t < hasta."""
+        with self._lock:
+            if self._total <= self.capacidad:
+                segmentos = [(self._tiempos[:self._posicion], self._valores[:self._posicion])]
+            else:
+                # Lleno: lo más antiguo empieza en la posición de escritura
+                segmentos = [(self._tiempos[self._posicion:], self._valores[self._posicion:]),
+                             (self._tiempos[:self._posicion], self._valores[:self._posicion])]
+
+            tiempos, valores = [], []
+            for t, v in segmentos:
+                inicio, fin = np.searchsorted(t, (desde, hasta), side='left')
+                tiempos.append(t[inicio:fin].copy())
+                valores.append(v[inicio:fin].copy())
+        return np.concatenate(tiempos), np.concatenate(valores)
+
+    def consultar(self, desde, hasta, puntos):
+        """
+        Reduce las muestras de [desde, hasta) a `puntos` cubetas de igual duración.
+
+        Returns:
+            dict: Columnas 't' (inicio de cubeta), 'min', 'max', 'media' y 'n' (muestras),
+            solo para las cubetas con datos.
+        """
+        tiempos, valores = self._rango(desde, hasta)
+        vacio = {'t': [], 'min': [], 'max': [], 'media': [], 'n': []}
+        if tiempos.size == 0:
+            return vacio
+
+        bordes = np.linspace(desde, hasta, puntos + 1)
+        limites = np.searchsorted(tiempos, bordes[:-1], side='left')
+        cuentas = np.diff(np.append(limites, tiempos.size))
+        con_datos = cuentas > 0
+        inicios = limites[con_datos]
+
+        # fmin/fmax ignoran NaN; la media se calcula sobre los valores válidos
+        validos = ~np.isnan(valores)
+        suma = np.add.reduceat(np.where(validos, valores, 0).astype(np.float64), inicios)
+        n_validos = np.add.reduceat(validos.astype(np.int64), inicios)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            media = suma / n_validos
+
+        return {
+            't': np.round(bordes[:-1][con_datos], 3).tolist(),
+            'min': _a_lista(np.fmin.reduceat(valores, inicios)),
+            'max': _a_lista(np.fmax.reduceat(valores, inicios)),
+            'media': _a_lista(media),
+            'n': cuentas[con_datos].tolist(),
+        }
+
+
+def _a_lista(array):
+    """Convierte a lista JSON redondeando a 2 decimales; NaN -> None."""
+    return [None if v != v else v for v in np.round(array.astype(np.float64), 2).tolist()]
+
+
+class HistorialSensores:
+    """Un buffer circular por canal de sensor."""
+
+    def __init__(self, canales=CANALES_HISTORIAL, capacidad=CAPACIDAD_HISTORIAL):
+        self.canales = {canal: BufferCircular(capacidad) for canal in canales}
+
+    def registrar(self, lecturas, instante=None):
+        """
+        Guarda los campos presentes en una línea serial.
+
+        Args:
+            lecturas (dict): Campos presentes, ej: {'gas': 120, 'temp': None}.
+            instante (float): Recepción según time.monotonic() (por defecto, ahora).
+        """
+        instante = time.monotonic() if instante is None else instante
+        for canal, valor in lecturas.items():
+            buffer = self.canales.get(canal)
+            if buffer is not None:
+                buffer.escribir(instante, valor)
+
+    def consultar(self, canal, desde, hasta, puntos):
+        """
+        Historial reducido de un canal entre dos marcas epoch (segundos).
+
+        El rango se traduce al reloj monotónico con el desfase actual entre ambos relojes,
+        así "la última hora" sigue siendo la última hora aunque el reloj de pared haya
+        saltado; las marcas 't' devueltas vuelven a ser epoch.
+        """
+        desfase = time.time() - time.monotonic()
+        datos = self.canales[canal].consultar(desde - desfase, hasta - desfase,
+                                              min(max(puntos, 1), MAX_PUNTOS_CONSULTA))
+        datos['t'] = [round(t + desfase, 3) for t in datos['t']]
+        return datos
+
+
+# Instancia única para todo el proceso
+historial_sensores = HistorialSensores()
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo de métricas de latencia y contadores del servidor.
+
+Cada etapa del camino de un comando (decodificación, Whisper, IA, ESP32, Arduino) y
+el bucle serial se miden con perf_counter y alimentan histogramas de cubetas fijas:
+registrar una observación es una búsqueda binaria y un incremento bajo un lock, sin
+guardar las muestras. Los percentiles p50/p95/p99 se estiman interpolando dentro de
+las cubetas. Todo se expone en formato de texto de Prometheus en /metrics.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+# --- Constantes de Configuración de las Métricas ---
+# Límites superiores de las cubetas, en segundos (de 100 µs a 30 s)
+CUBETAS_LATENCIA = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                    0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CUANTILES = (0.5, 0.95, 0.99)
+VENTANA_TASA = 10   # Segundos de la ventana deslizante para las tasas (líneas/s)
+PREFIJO_METRICAS = "wasi_"
+
+
+def _etiquetas(pares):
+    """(('etapa', 'whisper'),) -> '{etapa="whisper"}'."""
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in pares) + "}"
+
+
+class Histograma:
+    """Cubetas acumulables al estilo Prometheus más suma y cuenta."""
+
+    def __init__(self, cubetas=CUBETAS_LATENCIA):
+        self.cubetas = cubetas
+        self.cuentas = [0] * (len(cubetas) + 1)  # La última es +Inf
+        self.suma = 0.0
+        self.cuenta = 0
+        self._lock = threading.Lock()
+
+    def observar(self, valor):
+        i = bisect_left(self.cubetas, valor)
+        with self._lock:
+            self.cuentas[i] += 1
+            self.suma += valor
+            self.cuenta += 1
+
+    def instantanea(self):
+        with self._lock:
+            return list(self.cuentas), self.suma, self.cuenta
+
+    def percentil(self, q, cuentas=None, total=None):
+        """Estimación lineal dentro de la cubeta que contiene el cuantil q."""
+        if cuentas is None:
+            cuentas, _, total = self.instantanea()
+        if not total:
+            return None
+        objetivo = q * total
+        acumulado = 0
+        for i, n in enumerate(cuentas):
+            if n and acumulado + n >= objetivo:
+                inferior = self.cubetas[i - 1] if i > 0 else 0.0
+                superior = self.cubetas[i] if i < len(self.cubetas) else self.cubetas[-1]
+                return inferior + (superior - inferior) * (objetivo - acumulado) / n
+            acumulado += n
+        return self.cubetas[-1]
+
+
+class Tasa:
+    """Eventos por segundo en una ventana deslizante (una cubeta por segundo)."""
+
+    def __init__(self, ventana=VENTANA_TASA):
+        self.ventana = ventana
+        self._segundos = deque()   # [segundo, eventos]
+        self._lock = threading.Lock()
+
+    def marcar(self, n=1):
+        segundo = int(time.monotonic())
+        with self._lock:
+            if self._segundos and self._segundos[-1][0] == segundo:
+                self._segundos[-1][1] += n
+            else:
+                self._segundos.append([segundo, n])
+                while self._segundos[0][0] <= segundo - self.ventana:
+                    self._segundos.popleft()
+
+    def valor(self):
+        ahora = int(time.monotonic())
+        with self._lock:
+            total = sum(n for s, n in self._segundos if s > ahora - self.ventana)
+        return total / self.ventana
+
+
+class Metricas:
+    """
+    Registro de histogramas, contadores y tasas identificados por nombre y etiquetas.
+    """
+
+    def __init__(self):
+        self._histogramas = {}   # (nombre, etiquetas) -> Histograma
+        self._contadores = {}    # (nombre, etiquetas) -> valor
+        self._tasas = {}         # nombre -> Tasa
+        self._ayuda = {}
+        self._lock = threading.Lock()
+
+    def describir(self, nombre, ayuda):
+        self._ayuda[nombre] = ayuda
+
+    def observar(self, nombre, segundos, **etiquetas):
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        histograma = self._histogramas.get(clave)
+        if histograma is None:
+            with self._lock:
+                histograma = self._histogramas.setdefault(clave, Histograma())
+        histograma.observar(segundos)
+
+    def contar(self, nombre, n=1, **etiquetas):
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            self._contadores[clave] = self._contadores.get(clave, 0) + n
+
+    def marcar(self, nombre, n=1):
+        tasa = self._tasas.get(nombre)
+        if tasa is None:
+            with self._lock:
+                tasa = self._tasas.setdefault(nombre, Tasa())
+        tasa.marcar(n)
+
+    @contextmanager
+    def medir(self, nombre, **etiquetas):
+        """
+        Mide la duración del bloque. Si el bloque lanza una excepción se cuenta en
+        `<nombre>_errores_total` (o `_timeouts_total` si es un timeout) y se relanza.
+        """
+        inicio = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            tipo = 'timeouts' if isinstance(e, TimeoutError) or 'Timeout' in type(e).__name__ else 'errores'
+            self.contar(f"{nombre}_{tipo}_total", **etiquetas)
+            raise
+        finally:
+            self.observar(f"{nombre}_segundos", time.perf_counter() - inicio, **etiquetas)
+
+    def percentiles(self, nombre, **etiquetas):
+        """{'p50': s, 'p95': s, 'p99': s} de un histograma (None si no hay datos)."""
+        histograma = self._histogramas.get((nombre, tuple(sorted(etiquetas.items()))))
+        if histograma is None:
+            return None
+        cuentas, _, total = histograma.instantanea()
+        return {f"p{int(q * 100)}": histograma.percentil(q, cuentas, total) for q in CUANTILES}
+
+    def exportar(self):
+        """Texto en el formato de exposición de Prometheus (versión 0.0.4)."""
+        lineas = []
+        with self._lock:
+            histogramas = sorted(self._histogramas.items())
+            contadores = sorted(self._contadores.items())
+            tasas = sorted(self._tasas.items())
+
+        vistos = set()
+        for (nombre, etiquetas), histograma in histogramas:
+            completo = PREFIJO_METRICAS + nombre
+            if nombre not in vistos:
+                vistos.add(nombre)
+                if nombre in self._ayuda:
+                    lineas.append(f"# HELP {completo} {self._ayuda[nombre]}")
+                lineas.append(f"# TYPE {completo} histogram")
+            cuentas, suma, total = histograma.instantanea()
+            acumulado = 0
+            for limite, n in zip(histograma.cubetas + (float('inf'),), cuentas):
+                acumulado += n
+                le = "+Inf" if limite == float('inf') else repr(limite)
+                lineas.append(f"{completo}_bucket{_etiquetas(etiquetas + (('le', le),))} {acumulado}")
+            lineas.append(f"{completo}_sum{_etiquetas(etiquetas)} {suma:.6f}")
+            lineas.append(f"{completo}_count{_etiquetas(etiquetas)} {total}")
+
+        # Percentiles estimados (gauge aparte: un histograma no admite la etiqueta quantile)
+        for (nombre, etiquetas), histograma in histogramas:
+            completo = f"{PREFIJO_METRICAS}{nombre}_percentil"
+            if (nombre, 'percentil') not in vistos:
+                vistos.add((nombre, 'percentil'))
+                lineas.append(f"# TYPE {completo} gauge")
+            cuentas, _, total = histograma.instantanea()
+            for q in CUANTILES:
+                valor = histograma.percentil(q, cuentas, total)
+                if valor is not None:
+                    lineas.append(f"{completo}{_etiquetas(etiquetas + (('quantile', str(q)),))} {valor:.6f}")
+
+        for (nombre, etiquetas), valor in contadores:
+            completo = PREFIJO_METRICAS + nombre
+            if nombre not in vistos:
+                vistos.add(nombre)
+                lineas.append(f"# TYPE {completo} counter")
+            lineas.append(f"{completo}{_etiquetas(etiquetas)} {valor}")
+
+        for nombre, tasa in tasas:
+            completo = f"{PREFIJO_METRICAS}{nombre}_por_segundo"
+            lineas.append(f"# TYPE {completo} gauge")
+            lineas.append(f"{completo} {tasa.valor():.3f}")
+        return "\n".join(lineas) + "\n"
+
+
+# Instancia única para todo el proceso
+metricas = Metricas()
+metricas.describir("etapa_segundos", "Duración de cada etapa del procesamiento de un comando")
+metricas.describir("esp32_peticion_segundos", "Ida y vuelta HTTP a la pasarela ESP32")
+metricas.describir("serial_linea_segundos", "Procesamiento de una línea serial del Arduino")
+metricas.describir("voz_fin_a_accion_segundos", "Desde el fin de la voz (streaming) hasta ejecutar la orden")
@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo con el motor de reglas de automatización que se evalúa en el propio servidor.
+
+Cada trama serial interpretada pasa por `evaluar()` en el hilo del reactor serial, sin
+esperar a que haya un panel abierto. Las reglas se compilan al cargarlas: el operador
+se resuelve a una función y se indexan por canal, así cada trama solo recorre las
+reglas de los canales que trae. Una regla se dispara cuando su condición se mantiene
+sin interrupción `duracion` segundos (si deja de cumplirse antes, vuelve a empezar),
+una vez activa se libera al cruzar el umbral de histéresis y no vuelve a dispararse
+antes de su `enfriamiento`.
+
+Las acciones no se ejecutan en el hilo serial: se encolan para un hilo propio que
+llama al actuador y mide la latencia desde la llegada de la línea hasta la escritura.
+
+Formato de una regla (lista JSON en el fichero de WASI_REGLAS, o las predeterminadas):
+    {"nombre": "gas_alto", "canal": "gas", "operador": ">", "umbral": 400,
+     "histeresis": 50, "duracion": 2, "enfriamiento": 30,
+     "acciones": ["LED:1", "SERVO:90"], "acciones_liberar": ["LED:0"]}
+Las acciones son órdenes del Arduino ("LED:1", "SERVO:90") o pares "lugar:accion"
+del ESP32 ("cochera:on"). Los canales de placas adicionales llevan su prefijo
+("sotano.gas").
+"""
+
+import json
+import operator
+import queue
+import threading
+import time
+
+# --- Constantes de Configuración del Motor de Reglas ---
+OPERADORES = {'>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le}
+MAX_DISPAROS_EN_COLA = 64   # Si el actuador se atasca se descartan disparos, no líneas
+
+REGLAS_PREDETERMINADAS = [
+    # Fuga de gas: alarma y puerta abierta para ventilar; la alarma se apaga al bajar de 350
+    {"nombre": "gas_alto", "canal": "gas", "operador": ">", "umbral": 400, "histeresis": 50,
+     "duracion": 2, "enfriamiento": 30, "acciones": ["LED:1", "SERVO:90"],
+     "acciones_liberar": ["LED:0"]},
+    # Presencia frente al sensor de distancia: luz de la cochera
+    {"nombre": "presencia_cochera", "canal": "distancia", "operador": "<", "umbral": 10,
+     "histeresis": 5, "duracion": 0.5, "enfriamiento": 60, "acciones": ["cochera:on"]},
+]
+
+
+class Regla:
+    """
+    Regla compilada con su máquina de estados: inactiva -> pendiente -> activa.
+    """
+
+    def __init__(self, nombre, canal, operador, umbral, acciones, histeresis=0.0,
+                 duracion=0.0, enfriamiento=0.0, acciones_liberar=None):
+        if operador not in OPERADORES:
+            raise ValueError(f"Regla '{nombre}': operador '{operador}' no soportado {list(OPERADORES)}")
+        if not acciones:
+            raise ValueError(f"Regla '{nombre}': no tiene acciones")
+        self.nombre = nombre
+        self.canal = canal
+        self.operador = operador
+        self.umbral = float(umbral)
+        self.histeresis = float(histeresis)
+        self.duracion = float(duracion)
+        self.enfriamiento = float(enfriamiento)
+        self.acciones = list(acciones)
+        self.acciones_liberar = list(acciones_liberar or [])
+
+        # Precompilación: la condición de activación y la de liberación (con histéresis)
+        self._cumple = OPERADORES[operador]
+        sube = operador.startswith('>')
+        self._umbral_liberar = self.umbral - self.histeresis if sube else self.umbral + self.histeresis
+        self._libera = operator.le if sube else operator.ge
+
+        self.estado = 'inactiva'
+        self._desde = None          # Instante (monotonic) en que empezó a cumplirse
+        self._ultimo_disparo = None
+        self.disparos = 0
+        self.liberaciones = 0
+        self.ultima_latencia_ms = None
+
+    def evaluar(self, valor, ahora):
+        """
+        Avanza la máquina de estados con una lectura.
+
+        Returns:
+            list: Acciones a ejecutar (vacía casi siempre).
+        """
+        if self.estado == 'inactiva':
+            if not self._cumple(valor, self.umbral):
+                return []
+            self.estado = 'pendiente'
+            self._desde = ahora
+
+        if self.estado == 'activa':
+            # Activa: solo se suelta al cruzar el umbral de liberación (histéresis)
+            if self._libera(valor, self._umbral_liberar):
+                self.estado = 'inactiva'
+                self._desde = None
+                self.liberaciones += 1
+                return self.acciones_liberar
+            return []
+
+        # Pendiente: la condición debe mantenerse sin interrupción durante `duracion`
+        if not self._cumple(valor, self.umbral):
+            self.estado = 'inactiva'
+            self._desde = None
+            return []
+        if ahora - self._desde >= self.duracion:
+            if self._ultimo_disparo is not None and ahora - self._ultimo_disparo < self.enfriamiento:
+                return []  # Sigue pendiente: se dispara al acabar el enfriamiento si persiste
+            self.estado = 'activa'
+            self._ultimo_disparo = ahora
+            self.disparos += 1
+            return self.acciones
+        return []
+
+    def resumen(self):
+        return {
+            'nombre': self.nombre,
+            'condicion': f"{self.canal} {self.operador} {self.umbral:g} durante {self.duracion:g}s",
+            'liberacion': f"{self.canal} {'<=' if self.operador.startswith('>') else '>='} {self._umbral_liberar:g}",
+            'enfriamiento': self.enfriamiento,
+            'estado': self.estado,
+            'disparos': self.disparos,
+            'liberaciones': self.liberaciones,
+            'ultima_latencia_ms': self.ultima_latencia_ms,
+        }
+
+
+def cargar_reglas(ruta=None):
+    """
+    Lee las reglas de un fichero JSON (lista de objetos) o devuelve las predeterminadas.
+
+    Raises:
+        ValueError: Si el fichero o alguna regla no son válidos.
+    """
+    if not ruta:
+        return REGLAS_PREDETERMINADAS
+    with open(ruta, encoding='utf-8') as f:
+        definiciones = json.load(f)
+    if not isinstance(definiciones, list):
+        raise ValueError(f"{ruta} debe contener una lista de reglas")
+    return definiciones
+
+
+class MotorReglas:
+    """
+    Evalúa las reglas sobre cada trama y ejecuta sus acciones en un hilo aparte.
+
+    Args:
+        actuador (callable): f(accion) -> dict {'accion', 'lugar', 'exito'}; puede bloquear.
+        al_ejecutar (callable): f(regla, resultados) tras ejecutar las acciones; opcional.
+        al_medir (callable): f(regla, segundos) con la latencia línea -> escritura; opcional.
+    """
+
+    def __init__(self, actuador, al_ejecutar=None, al_medir=None):
+        self.actuador = actuador
+        self.al_ejecutar = al_ejecutar
+        self.al_medir = al_medir
+        self.reglas = []
+        self._indice = {}       # canal -> tuple(Regla)
+        self._cola = queue.Queue(MAX_DISPAROS_EN_COLA)
+        self._hilo = None
+        self.descartados = 0
+
+    def cargar(self, definiciones):
+        """
+        Compila las reglas y reconstruye el índice por canal.
+
+        Raises:
+            ValueError: Si alguna regla no es válida (no se cambia nada).
+        """
+        reglas = []
+        for d in definiciones:
+            try:
+                reglas.append(Regla(**d))
+            except TypeError as e:
+                raise ValueError(f"Regla mal definida {d.get('nombre', d)}: {e}")
+        indice = {}
+        for regla in reglas:
+            indice.setdefault(regla.canal, []).append(regla)
+        self.reglas = reglas
+        self._indice = {canal: tuple(lista) for canal, lista in indice.items()}
+
+    def iniciar(self):
+        """Arranca el hilo que ejecuta las acciones (idempotente)."""
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._bucle_acciones, daemon=True, name="reglas")
+            self._hilo.start()
+
+    def evaluar(self, lecturas, instante_linea):
+        """
+        Evalúa las reglas de los canales presentes en la trama. No bloquea.
+
+        Args:
+            lecturas (dict): {'gas': 420, 'sotano.temp': 21.5, ...}; los None se ignoran.
+            instante_linea (float): perf_counter() de la llegada de la línea.
+        """
+        indice = self._indice
+        ahora = time.monotonic()
+        for canal, valor in lecturas.items():
+            reglas = indice.get(canal)
+            if not reglas or valor is None:
+                continue
+            for regla in reglas:
+                acciones = regla.evaluar(valor, ahora)
+                if acciones:
+                    try:
+                        self._cola.put_nowait((regla, acciones, instante_linea))
+                    except queue.Full:
+                        self.descartados += 1
+
+    def _bucle_acciones(self):
+        while True:
+            regla, acciones, instante_linea = self._cola.get()
+            resultados = []
+            latencia = None
+            for accion in acciones:
+                try:
+                    resultado = self.actuador(accion)
+                except Exception as e:
+                    print(f"[REGLA ERROR] '{regla.nombre}' no pudo ejecutar '{accion}': {e}")
+                    resultado = {'accion': accion, 'lugar': None, 'exito': False}
+                if latencia is None:
+                    # Reacción = hasta que la primera acción llega al actuador
+                    latencia = time.perf_counter() - instante_linea
+                resultados.append(resultado)
+            regla.ultima_latencia_ms = round(latencia * 1000, 2)
+            print(f"[REGLA] '{regla.nombre}' -> {', '.join(acciones)} ({regla.ultima_latencia_ms} ms desde la lectura)")
+            if self.al_medir:
+                self.al_medir(regla, latencia)
+            if self.al_ejecutar:
+                self.al_ejecutar(regla, resultados)
+
+    def estado(self):
+        return {
+            'reglas': [regla.resumen() for regla in self.reglas],
+            'en_cola': self._cola.qsize(),
+            'descartados': self.descartados,
+        }
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo para el reconocimiento de voz (ASR) local con OpenAI Whisper.
+
+Mantiene los modelos cargados en memoria durante toda la vida del proceso para que
+ninguna petición pague el coste de cargar el modelo. Las transcripciones se sirven
+desde un pool acotado de instancias del modelo con una cola de espera limitada.
+
+Las órdenes cortas (la mayoría: "enciende la cocina") se transcriben con un segundo
+motor más pequeño y cuantizado a int8, bastante más rápido en CPU.
+"""
+
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+
+from registro_eventos import INFO, registrar
+
+# --- Constantes de Configuración de Voz ---
+MODELO_WHISPER = "base"
+TAMANO_POOL_ASR = 1        # Instancias del modelo cargadas en paralelo (cada una ocupa RAM)
+MAX_COLA_ASR = 8           # Peticiones que pueden esperar un modelo libre
+TIMEOUT_COLA_ASR = 30      # Segundos máximos esperando un modelo libre
+TIMEOUT_CARGA_ASR = 120    # Segundos máximos esperando a que termine la carga inicial
+FRECUENCIA_MUESTREO = 16000
+IDIOMA_WHISPER = "spanish"
+# Modelo para clips cortos (tras recortar el silencio); WASI_MODELO_WHISPER_CORTO="" lo desactiva
+MODELO_WHISPER_CORTO = os.environ.get('WASI_MODELO_WHISPER_CORTO', 'tiny')
+DURACION_AUDIO_CORTO = 2.0  # Segundos de voz hasta los que se usa el modelo corto
+
+
+class MotorASR:
+    """
+    Motor de transcripción residente: carga el modelo una sola vez, lo calienta y
+    reparte las peticiones entre un pool de instancias ya cargadas.
+    """
+
+    def __init__(self, nombre_modelo=MODELO_WHISPER, tamano_pool=TAMANO_POOL_ASR, max_cola=MAX_COLA_ASR, cuantizar=False):
+        self.nombre_modelo = nombre_modelo
+        self.tamano_pool = tamano_pool
+        self.max_cola = max_cola
+        self.cuantizar = cuantizar
+
+        self._modelos = queue.Queue()
+        self._listo = threading.Event()
+        self._lock = threading.Lock()
+        self._hilo_carga = None
+        self._en_espera = 0
+        self._en_uso = 0
+
+        self.tiempo_carga = None
+        self.tiempo_calentamiento = None
+        self.capas_cuantizadas = None   # Capas lineales int8 del modelo cuantizado (None si no aplica)
+        self.error_carga = None
+        self.transcripciones = 0
+        self.rechazadas = 0
+        self.inferencia_media = None   # Media móvil de los segundos de inferencia
+
+    @property
+    def disponible(self):
+        """True si el modelo ya está cargado y sin errores."""
+        return self._listo.is_set() and self.error_carga is None
+
+    @property
+    def libre(self):
+        """True si hay una instancia del modelo sin usar (nadie esperaría por ella)."""
+        return self.disponible and self._modelos.qsize() > 0 and self._en_espera == 0
+
+    def iniciar(self):
+        """Lanza la carga del modelo en segundo plano (idempotente)."""
+        with self._lock:
+            if self._hilo_carga is None:
+                self._hilo_carga = threading.Thread(target=self.cargar, daemon=True)
+                self._hilo_carga.start()
+
+    def cargar(self):
+        """Carga las instancias del pool y ejecuta una pasada de calentamiento en cada una."""
+        try:
+            # Importación diferida: whisper arrastra torch y solo la necesita el hilo de carga
+            import whisper
+
+            inicio = time.perf_counter()
+            modelos = [whisper.load_model(self.nombre_modelo) for _ in range(self.tamano_pool)]
+            if self.cuantizar:
+                modelos = [self._cuantizar(modelo) for modelo in modelos]
+            self.tiempo_carga = time.perf_counter() - inicio
+            print(f"[VOZ] Modelo Whisper '{self.nombre_modelo}' x{self.tamano_pool} cargado en {self.tiempo_carga:.2f}s")
+
+            # Un segundo de silencio basta para inicializar kernels y cachés internas
+            inicio = time.perf_counter()
+            silencio = np.zeros(FRECUENCIA_MUESTREO, dtype=np.float32)
+            for modelo in modelos:
+                modelo.transcribe(silencio, language=IDIOMA_WHISPER, fp16=False)
+                self._modelos.put(modelo)
+            self.tiempo_calentamiento = time.perf_counter() - inicio
+            print(f"[VOZ] Calentamiento de Whisper completado en {self.tiempo_calentamiento:.2f}s")
+        except Exception as e:
+            self.error_carga = e
+            print(f"[ERROR_VOZ] No se pudo cargar el modelo Whisper '{self.nombre_modelo}': {e}")
+            if "getaddrinfo failed" in str(e):
+                print("[ERROR_RED] Se requiere internet la primera vez para descargar el modelo Whisper.")
+        finally:
+            self._listo.set()
+
+    def _cuantizar(self, modelo):
+        """Cuantización dinámica int8 de las capas lineales (solo CPU); si falla, el modelo tal cual."""
+        try:
+            import torch
+            import whisper.model
+            try:
+                from torch.ao.nn.quantized.dynamic import Linear as LinearCuantizado
+            except ImportError:
+                from torch.nn.quantized.dynamic import Linear as LinearCuantizado
+
+            # quantize_dynamic compara el tipo exacto de cada módulo y las capas de Whisper son
+            # una subclase (whisper.model.Linear) que solo adapta el dtype en forward: sin esto
+            # el modelo "cuantizado" seguiría entero en float32
+            for modulo in modelo.modules():
+                if type(modulo) is whisper.model.Linear:
+                    modulo.__class__ = torch.nn.Linear
+            modelo = torch.quantization.quantize_dynamic(modelo, {torch.nn.Linear}, dtype=torch.qint8)
+            self.capas_cuantizadas = sum(isinstance(m, LinearCuantizado) for m in modelo.modules())
+            if not self.capas_cuantizadas:
+                print(f"[ADVERTENCIA] Whisper '{self.nombre_modelo}' no tiene capas cuantizadas: se usa en float32.")
+            else:
+                print(f"[VOZ] Whisper '{self.nombre_modelo}': {self.capas_cuantizadas} capas lineales cuantizadas a int8")
+            return modelo
+        except Exception as e:
+            print(f"[ADVERTENCIA] No se pudo cuantizar Whisper '{self.nombre_modelo}', se usa en float32: {e}")
+            return modelo
+
+    def transcribir(self, audio, logs):
+        """
+        Transcribe un array de audio usando una instancia libre del pool.
+
+        Args:
+            audio (numpy.ndarray): Muestras float32 mono a 16 kHz en el rango [-1, 1].
+            logs (list): La lista para registrar los logs.
+
+        Returns:
+            str: El texto transcrito.
+        """
+        self.iniciar()
+        if not self._listo.wait(TIMEOUT_CARGA_ASR):
+            raise RuntimeError("El modelo Whisper aún se está cargando.")
+        if self.error_carga is not None:
+            raise RuntimeError(f"Modelo Whisper no disponible: {self.error_carga}")
+
+        with self._lock:
+            if self._en_espera >= self.max_cola:
+                self.rechazadas += 1
+                raise RuntimeError("Cola de transcripción llena. Inténtalo de nuevo en unos segundos.")
+            self._en_espera += 1
+            cola_actual = self._en_espera
+
+        inicio_espera = time.perf_counter()
+        try:
+            modelo = self._modelos.get(timeout=TIMEOUT_COLA_ASR)
+        except queue.Empty:
+            raise RuntimeError("Tiempo de espera agotado esperando un modelo Whisper libre.")
+        finally:
+            with self._lock:
+                self._en_espera -= 1
+        espera = time.perf_counter() - inicio_espera
+
+        with self._lock:
+            self._en_uso += 1
+        try:
+            inicio = time.perf_counter()
+            resultado = modelo.transcribe(audio, language=IDIOMA_WHISPER, fp16=False)
+            duracion = time.perf_counter() - inicio
+        finally:
+            self._modelos.put(modelo)
+            with self._lock:
+                self._en_uso -= 1
+                self.transcripciones += 1
+
+        with self._lock:
+            previa = self.inferencia_media
+            self.inferencia_media = duracion if previa is None else 0.8 * previa + 0.2 * duracion
+        registrar(logs, INFO, 'VOZ', "Whisper '%s': %.2fs de inferencia, %.0f ms en cola (profundidad %d)",
+                  self.nombre_modelo, duracion, espera * 1000, cola_actual)
+        return resultado.get("text", "").strip()
+
+    def estado(self):
+        """Devuelve un resumen del estado del motor para el panel."""
+        with self._lock:
+            return {
+                "modelo": self.nombre_modelo,
+                "listo": self._listo.is_set() and self.error_carga is None,
+                "error": str(self.error_carga) if self.error_carga else None,
+                "tamano_pool": self.tamano_pool,
+                "modelos_libres": self._modelos.qsize(),
+                "en_uso": self._en_uso,
+                "profundidad_cola": self._en_espera,
+                "max_cola": self.max_cola,
+                "tiempo_carga_s": self.tiempo_carga,
+                "tiempo_calentamiento_s": self.tiempo_calentamiento,
+                "transcripciones": self.transcripciones,
+                "rechazadas": self.rechazadas,
+                "inferencia_media_s": self.inferencia_media,
+                "capas_cuantizadas": self.capas_cuantizadas,
+            }
+
+
+# Instancia única para todo el proceso
+motor_asr = MotorASR()
+motor_asr_corto = MotorASR(MODELO_WHISPER_CORTO, cuantizar=True) if MODELO_WHISPER_CORTO else None
+
+
+def elegir_motor(segundos_voz):
+    """Motor corto para clips breves si ya está cargado; el principal en otro caso."""
+    if motor_asr_corto is not None and segundos_voz <= DURACION_AUDIO_CORTO and motor_asr_corto.disponible:
+        return motor_asr_corto
+    return motor_asr
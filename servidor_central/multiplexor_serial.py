@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo con el reactor que atiende todas las placas Arduino conectadas por serial.
+
+Un único hilo vigila los descriptores de todos los puertos con `selectors` y solo se
+despierta cuando alguno tiene datos: sin sondeo de `in_waiting` ni `sleep`, y con el
+mismo número de hilos sea cual sea el número de placas. Cada placa tiene su propio
+buffer de línea, sus últimas lecturas (espacio de nombres propio) y su estado de
+conexión; si el puerto no existe o se desconecta se reintenta con espera exponencial.
+
+En Windows los puertos COM no admiten select(): cada placa tiene entonces su propio
+hilo con lecturas bloqueantes (con tiempo límite), que el sistema despierta al llegar
+datos, así que tampoco hay sondeo. Las líneas de todas las placas se entregan de una en
+una, igual que desde el reactor.
+"""
+
+import os
+import selectors
+import threading
+import time
+
+import serial
+import serial.tools.list_ports
+
+# --- Constantes de Configuración del Multiplexor ---
+ESPERA_RECONEXION_INICIAL = 0.5   # Segundos; se duplica en cada fallo
+ESPERA_RECONEXION_MAXIMA = 30.0
+MAX_BYTES_LINEA = 4096            # Descarta basura sin salto de línea (baudios mal configurados)
+TIMEOUT_LECTURA_WINDOWS = 1.0     # Lectura bloqueante: se despierta al llegar datos o al vencer
+SOPORTA_SELECT = os.name != 'nt'
+
+
+class Placa:
+    """Estado de una placa serial: conexión, buffer de línea y últimas lecturas."""
+
+    def __init__(self, nombre, puerto, baudios):
+        self.nombre = nombre
+        self.puerto = puerto
+        self.baudios = baudios
+        self.serial = None
+        self.buffer = bytearray()
+        self.lecturas = {}            # Espacio de nombres propio: {'gas': 120, ...}
+        self.lineas = 0
+        self.conexiones = 0
+        self.ultimo_error = None
+        self.espera = ESPERA_RECONEXION_INICIAL
+        self.reintento_en = 0.0
+        self.avisado = False          # La ayuda de puertos se imprime una vez por caída
+
+    @property
+    def conectada(self):
+        return self.serial is not None and self.serial.is_open
+
+    def estado(self):
+        return {
+            'puerto': self.puerto,
+            'conectada': self.conectada,
+            'lineas': self.lineas,
+            'conexiones': self.conexiones,
+            'ultimo_error': self.ultimo_error,
+            'lecturas': dict(self.lecturas),
+        }
+
+
+class MultiplexorSerial:
+    """
+    Reactor de un solo hilo para N placas serie (en Windows, un hilo bloqueado por placa).
+
+    Args:
+        al_recibir_linea (callable): f(placa, linea) por cada línea completa (str sin salto).
+        al_conectar (callable): f(placa) tras abrir (o reabrir) el puerto; opcional.
+    """
+
+    def __init__(self, al_recibir_linea, al_conectar=None):
+        self.al_recibir_linea = al_recibir_linea
+        self.al_conectar = al_conectar
+        self.placas = {}
+        self._selector = selectors.DefaultSelector() if SOPORTA_SELECT else None
+        self._lock = threading.Lock()
+        self._lock_entrega = threading.Lock()  # Con un hilo por placa, entrega de una en una
+        self._hilo = None
+        self._hilos_placa = {}
+        self._iniciado = False
+
+    def agregar_placa(self, nombre, puerto, baudios=9600):
+        with self._lock:
+            self.placas[nombre] = Placa(nombre, puerto, baudios)
+            if self._iniciado and not SOPORTA_SELECT:
+                self._arrancar_hilo_placa(self.placas[nombre])
+
+    def iniciar(self):
+        """Arranca el hilo del reactor, o uno por placa en Windows (idempotente)."""
+        with self._lock:
+            if self._iniciado:
+                return
+            self._iniciado = True
+            if SOPORTA_SELECT:
+                self._hilo = threading.Thread(target=self._bucle, daemon=True, name="serial")
+                self._hilo.start()
+            else:
+                for placa in self.placas.values():
+                    self._arrancar_hilo_placa(placa)
+
+    def _arrancar_hilo_placa(self, placa):
+        if placa.nombre not in self._hilos_placa:
+            hilo = threading.Thread(target=self._bucle_placa, args=(placa,), daemon=True,
+                                    name=f"serial-{placa.nombre}")
+            self._hilos_placa[placa.nombre] = hilo
+            hilo.start()
+
+    # --- Conexión y reconexión ---
+
+    def _conectar(self, placa):
+        try:
+            # Con select, timeout=0: read() devuelve solo lo ya recibido y el reactor decide
+            # cuándo leer. Sin select, read() bloquea hasta que llegan datos
+            timeout = 0 if SOPORTA_SELECT else TIMEOUT_LECTURA_WINDOWS
+            placa.serial = serial.Serial(placa.puerto, placa.baudios, timeout=timeout)
+        except (serial.SerialException, OSError) as e:
+            self._programar_reintento(placa, e)
+            return
+        placa.buffer.clear()
+        placa.conexiones += 1
+        placa.espera = ESPERA_RECONEXION_INICIAL
+        placa.ultimo_error = None
+        placa.avisado = False
+        if self._selector is not None:
+            self._selector.register(placa.serial.fileno(), selectors.EVENT_READ, placa)
+        print(f"[ARDUINO] Placa '{placa.nombre}' conectada en {placa.puerto}")
+        if self.al_conectar:
+            with self._lock_entrega:
+                self.al_conectar(placa)
+
+    def _programar_reintento(self, placa, error):
+        placa.ultimo_error = str(error)
+        placa.reintento_en = time.monotonic() + placa.espera
+        if not placa.avisado:
+            placa.avisado = True
+            print(f"[ADVERTENCIA] Error conectando la placa '{placa.nombre}' en {placa.puerto}: {error}")
+            if "Access is denied" in str(error) or "PermissionError" in str(error):
+                print(f"[SOLUCION] El puerto {placa.puerto} está ocupado. Cierra el 'Monitor Serie' del Arduino IDE o terminales anteriores.")
+            puertos_disponibles = [p.device for p in serial.tools.list_ports.comports()]
+            print(f"[AYUDA] Puertos COM detectados en tu PC: {puertos_disponibles}")
+            print(f"[ACCION] Se reintentará automáticamente; revisa 'ARDUINO_PORT' (o WASI_PLACAS_SERIAL).")
+        placa.espera = min(placa.espera * 2, ESPERA_RECONEXION_MAXIMA)
+
+    def _desconectar(self, placa, error):
+        print(f"[ARDUINO] Placa '{placa.nombre}' desconectada: {error}")
+        if self._selector is not None:
+            try:
+                self._selector.unregister(placa.serial.fileno())
+            except (KeyError, ValueError, OSError):
+                pass
+        try:
+            placa.serial.close()
+        except Exception:
+            pass
+        placa.serial = None
+        self._programar_reintento(placa, error)
+
+    # --- Lectura ---
+
+    def _leer(self, placa):
+        """Lee lo disponible y entrega las líneas completas. Devuelve los bytes leídos."""
+        try:
+            datos = placa.serial.read(max(placa.serial.in_waiting, 1))
+        except (serial.SerialException, OSError) as e:
+            self._desconectar(placa, e)
+            return 0
+        if not datos:
+            return 0
+        placa.buffer += datos
+        while True:
+            fin = placa.buffer.find(b'\n')
+            if fin < 0:
+                break
+            linea = placa.buffer[:fin].decode('utf-8', errors='ignore').strip()
+            del placa.buffer[:fin + 1]
+            if linea:
+                placa.lineas += 1
+                try:
+                    with self._lock_entrega:
+                        self.al_recibir_linea(placa, linea)
+                except Exception as e:
+                    print(f"[SERIAL ERROR] {placa.nombre}: {e}")
+        if len(placa.buffer) > MAX_BYTES_LINEA:
+            placa.buffer.clear()
+        return len(datos)
+
+    def _bucle(self):
+        while True:
+            ahora = time.monotonic()
+            with self._lock:
+                placas = list(self.placas.values())
+            for placa in placas:
+                if not placa.conectada and ahora >= placa.reintento_en:
+                    self._conectar(placa)
+
+            # Como mucho 1 s bloqueado, para recoger placas añadidas en caliente
+            pendientes = [p.reintento_en for p in placas if not p.conectada]
+            espera = min(max(min(pendientes) - time.monotonic(), 0.0), 1.0) if pendientes else 1.0
+
+            if not self._selector.get_map():
+                time.sleep(espera)
+                continue
+            # Bloquea hasta que un puerto tenga datos o toque reintentar una conexión
+            for clave, _ in self._selector.select(timeout=espera):
+                self._leer(clave.data)
+
+    def _bucle_placa(self, placa):
+        """Windows: hilo propio de una placa; duerme en read() o hasta el próximo reintento."""
+        while True:
+            if placa.conectada:
+                self._leer(placa)
+                continue
+            time.sleep(max(placa.reintento_en - time.monotonic(), 0.0))
+            self._conectar(placa)
+
+    def estado(self):
+        with self._lock:
+            return {nombre: placa.estado() for nombre, placa in self.placas.items()}
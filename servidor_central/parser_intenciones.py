@@ -0,0 +1,192 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo con el intérprete determinista de comandos (ruta rápida).
+
+Reconoce con una gramática compilada las órdenes simples ("enciende la cocina",
+"apaga todas menos cochera", "abre la puerta y enciende la alarma") y devuelve la
+misma estructura que el modelo de lenguaje: {'acciones': [{'accion', 'lugar'}, ...]}.
+Si la frase contiene algo que la gramática no entiende, no arriesga: devuelve None
+y la orden sigue su camino hacia Ollama.
+"""
+
+import re
+import threading
+import unicodedata
+
+# --- Vocabulario de la Gramática ---
+# Todas las entradas están ya normalizadas (minúsculas y sin tildes).
+VERBOS = {
+    'ON': ['enciende', 'enciendan', 'encienda', 'encender', 'prende', 'prendan', 'prenda', 'prender',
+           'activa', 'active', 'activar', 'conecta', 'conectar'],
+    'OFF': ['apaga', 'apaguen', 'apague', 'apagar', 'desactiva', 'desactive', 'desactivar',
+            'desconecta', 'desconectar'],
+    'ABRIR': ['abre', 'abra', 'abran', 'abrir'],
+    'CERRAR': ['cierra', 'cierre', 'cierren', 'cerrar'],
+}
+
+# Nombres con los que el usuario se refiere a cada código interno
+# (ver tabla "Visual vs Interno" de la guía: Dormitorio -> descanso, Sala de descanso -> habitacion)
+SINONIMOS_LUGARES = {
+    'descanso': ['dormitorio', 'descanso'],
+    'cocina': ['cocina'],
+    'principal': ['sala principal', 'principal', 'salon', 'sala'],
+    'cochera': ['cochera', 'garaje', 'garage'],
+    'habitacion': ['sala de descanso', 'habitacion'],
+    'puerta': ['puerta', 'servo'],
+    'alarma': ['alarmas', 'alarma'],
+    'todas': ['todas', 'todos', 'todo', 'toda la casa'],
+}
+
+# Lugares que controla el ESP32 y que abarca 'todas'
+LUGARES_LUCES = ['descanso', 'cocina', 'principal', 'cochera', 'habitacion']
+
+EXCLUSIONES = ['menos', 'excepto', 'salvo', 'excluyendo', 'sin']
+CONJUNCIONES = ['y', 'e', 'tambien', 'luego', 'despues', 'ademas']
+RELLENO = ['la', 'el', 'los', 'las', 'lo', 'luz', 'luces', 'foco', 'focos', 'lampara', 'lamparas',
+           'de', 'del', 'en', 'a', 'al', 'por', 'favor', 'porfa', 'porfavor', 'ahora', 'mi', 'me',
+           'casa', 'cuarto', 'zona', 'zonas', 'ambiente', 'ambientes', 'ya', 'porfis']
+
+
+def normalizar_texto(texto):
+    """Pasa a minúsculas, elimina tildes y signos de puntuación y colapsa espacios."""
+    sin_tildes = unicodedata.normalize('NFKD', texto.lower())
+    sin_tildes = ''.join(c for c in sin_tildes if not unicodedata.combining(c))
+    return ' '.join(re.sub(r'[^a-z0-9ñ]+', ' ', sin_tildes).split())
+
+
+def _alternativa(palabras):
+    # Las expresiones más largas primero para que "sala de descanso" gane a "sala"
+    return '|'.join(re.escape(p) for p in sorted(set(palabras), key=len, reverse=True))
+
+
+class ParserIntenciones:
+    """
+    Gramática compilada que traduce órdenes simples a acciones sin pasar por el LLM.
+    """
+
+    def __init__(self, lugares_validos):
+        self.lugares_validos = list(lugares_validos)
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+        # Índices inversos: palabra -> código
+        self._verbo_por_palabra = {p: v for v, palabras in VERBOS.items() for p in palabras}
+        self._lugar_por_nombre = {
+            nombre: codigo
+            for codigo, nombres in SINONIMOS_LUGARES.items()
+            if codigo in self.lugares_validos or codigo == 'todas'
+            for nombre in nombres
+        }
+        self._luces = [l for l in LUGARES_LUCES if l in self.lugares_validos]
+
+        # Un único patrón con grupos con nombre: una sola pasada de tokenización por frase
+        self._patron = re.compile(
+            r'\b(?:'
+            rf'(?P<lugar>{_alternativa(self._lugar_por_nombre)})'
+            rf'|(?P<verbo>{_alternativa(self._verbo_por_palabra)})'
+            rf'|(?P<exclusion>{_alternativa(EXCLUSIONES)})'
+            rf'|(?P<conjuncion>{_alternativa(CONJUNCIONES)})'
+            rf'|(?P<relleno>{_alternativa(RELLENO)})'
+            r'|(?P<otro>\S+)'
+            r')\b'
+        )
+
+    def interpretar(self, texto):
+        """
+        Intenta interpretar la orden de forma determinista.
+
+        Args:
+            texto (str): El comando en lenguaje natural.
+
+        Returns:
+            dict | None: {'acciones': [...]} si la gramática cubre la frase completa,
+            o None si no hay suficiente confianza y debe consultarse al LLM.
+        """
+        acciones = self._analizar(normalizar_texto(texto))
+        with self._lock:
+            if acciones:
+                self.aciertos += 1
+            else:
+                self.fallos += 1
+        return {'acciones': acciones} if acciones else None
+
+    def _analizar(self, texto):
+        grupos = []          # [accion, lugar, excluidos]
+        pendientes = []      # Lugares mencionados antes de su verbo
+        verbo = None
+        verbo_sin_lugar = False  # El último verbo aún no tiene ningún lugar
+        excluyendo = False
+
+        for token in self._patron.finditer(texto):
+            tipo = token.lastgroup
+            valor = token.group(tipo)
+
+            if tipo == 'otro':
+                return None
+            if tipo == 'verbo':
+                # "abre y cierra la puerta", "todas menos y apaga...": orden incompleta
+                if verbo_sin_lugar or (excluyendo and not grupos[-1][2]):
+                    return None
+                verbo = self._verbo_por_palabra[valor]
+                excluyendo = False
+                grupos.extend([verbo, lugar, set()] for lugar in pendientes)
+                verbo_sin_lugar = not pendientes
+                pendientes = []
+            elif tipo == 'exclusion':
+                # La exclusión solo tiene sentido justo después de 'todas'
+                if not grupos or grupos[-1][1] != 'todas':
+                    return None
+                excluyendo = True
+            elif tipo == 'lugar':
+                lugar = self._lugar_por_nombre[valor]
+                if excluyendo:
+                    if lugar not in self._luces:
+                        return None
+                    grupos[-1][2].add(lugar)
+                elif verbo is None:
+                    pendientes.append(lugar)
+                else:
+                    grupos.append([verbo, lugar, set()])
+                    verbo_sin_lugar = False
+            # Conjunciones y palabras de relleno no alteran el estado
+
+        # Un lugar sin verbo, un verbo sin lugar ("enciende la cocina y apaga") o una
+        # exclusión sin lugares ("apaga todas menos") no se completan a ciegas
+        if pendientes or not grupos or verbo_sin_lugar or (excluyendo and not grupos[-1][2]):
+            return None
+        return self._expandir(grupos)
+
+    def _expandir(self, grupos):
+        acciones = []
+        for accion, lugar, excluidos in grupos:
+            # Abrir/cerrar solo aplica a la puerta (ON/OFF sobre la puerta ya lo admite app.py)
+            if accion in ('ABRIR', 'CERRAR') and lugar != 'puerta':
+                return None
+            if lugar == 'todas':
+                if excluidos:
+                    destinos = [l for l in self._luces if l not in excluidos]
+                    if not destinos:
+                        return None
+                    acciones.extend({'accion': accion, 'lugar': l} for l in destinos)
+                else:
+                    acciones.append({'accion': accion, 'lugar': 'todas'})
+            else:
+                acciones.append({'accion': accion, 'lugar': lugar})
+
+        # Eliminar duplicados conservando el orden ("enciende la cocina y la cocina")
+        unicas = []
+        for accion in acciones:
+            if accion not in unicas:
+                unicas.append(accion)
+        return unicas
+
+    def estadisticas(self):
+        """Devuelve los contadores de aciertos/fallos y el tráfico ahorrado al LLM."""
+        with self._lock:
+            total = self.aciertos + self.fallos
+            return {
+                'aciertos': self.aciertos,
+                'fallos': self.fallos,
+                'tasa_aciertos': round(self.aciertos / total, 4) if total else 0.0,
+            }
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo para interpretar las tramas de texto que envía el Arduino por el puerto serial.
+
+Formato típico (ver documentacion/arduino.md):
+    "Distancia: 45cm | Gas: 120 | Temp: 24.50C | Hum: 60.00%"
+    "ALERTA | Gas: 512"
+    "Distancia: ---"
+
+Cada línea se recorre una sola vez con un patrón compilado y se convierte en un
+registro tipado. Los campos ausentes quedan en None; las lecturas 'nan' del DHT22
+se conservan como NaN para distinguir "sensor con error" de "campo no enviado".
+Un valor que no termina donde debe ("Gas: 12a0", "Temp: 24.5.3C") es ruido de la
+línea serie: el campo se descarta y se cuenta, en vez de quedarse con el prefijo.
+"""
+
+import math
+import re
+import time
+from typing import NamedTuple, Optional
+
+# Un único patrón para todos los campos: captura el valor y lo que lo sigue hasta el
+# separador (espacio o '|'), que solo puede ser la unidad del campo (C, %, cm)
+# (el sketch imprime las etiquetas con mayúscula inicial y los NaN del DHT22 como 'nan')
+_PATRON_CAMPO = re.compile(r'(Gas|Temp|Hum|Distancia): *(nan|-?[\d.]+)([^\s|]*)')
+_PATRON_NUMERO = re.compile(r'nan|-?\d+(?:\.\d+)?')
+
+# Etiqueta -> (nombre en el registro, es entero, unidad)
+_CAMPOS = {
+    'Gas': ('gas', True, ''),
+    'Temp': ('temp', False, 'C'),
+    'Hum': ('hum', False, '%'),
+    'Distancia': ('distancia', True, 'cm'),
+}
+
+
+class LecturaSerial(NamedTuple):
+    """
+    Lectura de una línea serial. Campos ausentes o descartados: None. Error del sensor: NaN.
+    `descartados` cuenta los campos con valor corrupto.
+    """
+    gas: Optional[int]
+    temp: Optional[float]
+    hum: Optional[float]
+    distancia: Optional[int]
+    timestamp: float
+    descartados: int = 0
+
+    def campos(self):
+        """Campos presentes en la línea, con NaN convertido a None (null en JSON)."""
+        presentes = {}
+        for nombre in ('gas', 'temp', 'hum', 'distancia'):
+            valor = getattr(self, nombre)
+            if valor is not None:
+                presentes[nombre] = None if isinstance(valor, float) and math.isnan(valor) else valor
+        return presentes
+
+
+def interpretar_linea(linea, timestamp=None):
+    """
+    Convierte una línea serial en un registro tipado.
+
+    Args:
+        linea (str): La línea recibida, ya decodificada y sin salto de línea.
+        timestamp (float): Marca de tiempo de recepción (por defecto, time.time()).
+
+    Returns:
+        LecturaSerial | None: None si la línea no contiene ningún campo reconocible
+        (mensajes informativos, líneas cortadas). Si todos sus campos eran corruptos
+        se devuelve el registro vacío con `descartados` > 0.
+    """
+    valores = {}
+    descartados = 0
+    for etiqueta, texto, resto in _PATRON_CAMPO.findall(linea):
+        nombre, entero, unidad = _CAMPOS[etiqueta]
+        if resto not in ('', unidad) or not _PATRON_NUMERO.fullmatch(texto):
+            descartados += 1  # "12a0", "24.5.3C": no se sabe qué parte del valor es buena
+        elif texto == 'nan':
+            # Solo el DHT22 (temp/hum) puede reportar NaN; en gas/distancia es basura
+            if entero:
+                descartados += 1
+            else:
+                valores[nombre] = math.nan
+        elif entero:
+            numero = float(texto)
+            if numero >= 0:  # Gas y distancia nunca son negativos: trama corrupta
+                valores[nombre] = int(numero)
+            else:
+                descartados += 1
+        else:
+            valores[nombre] = float(texto)
+
+    if not valores and not descartados:
+        return None
+    return LecturaSerial(
+        valores.get('gas'),
+        valores.get('temp'),
+        valores.get('hum'),
+        valores.get('distancia'),
+        time.time() if timestamp is None else timestamp,
+        descartados,
+    )
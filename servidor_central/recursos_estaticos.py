@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo con el pipeline de recursos estáticos del panel de control.
+
+El panel (index.html, style.css, script.js y alarm.mp3) se servía tal cual desde
+disco, sin comprimir y sin cabeceras de caché, así que cada tablet lo volvía a
+descargar entero por el WiFi de la pasarela. Ahora, al arrancar, cada recurso se
+minifica, se nombra con el hash de su contenido (`script.3f2a1b9c0d.js`) y se
+precomprime una sola vez con gzip (y brotli si está instalado). Como el nombre cambia
+con el contenido, los recursos se sirven con caché inmutable de un año; el índice se
+pre-renderiza con esas URLs y se revalida con su ETag (304 sin cuerpo si no cambió).
+
+Si un archivo fuente cambia en disco, el conjunto se reconstruye en la siguiente
+petición del índice, así que editar el panel no exige reiniciar el servidor.
+"""
+
+import gzip
+import hashlib
+import os
+import re
+import threading
+import time
+
+try:
+    import brotli  # Opcional: mejor compresión que gzip para los navegadores que lo aceptan
+except ImportError:
+    brotli = None
+
+# --- Constantes de Configuración de los Recursos ---
+RECURSOS_PANEL = ('style.css', 'script.js', 'alarm.mp3')
+PLANTILLA_INDICE = 'index.html'
+PREFIJO_URL = '/recursos/'
+LONGITUD_HASH = 10
+NIVEL_GZIP = 9
+CALIDAD_BROTLI = 11
+TIPOS_MIME = {
+    '.css': 'text/css; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+    '.html': 'text/html; charset=utf-8',
+    '.mp3': 'audio/mpeg',
+}
+CACHE_INMUTABLE = 'public, max-age=31536000, immutable'
+CACHE_INDICE = 'no-cache'  # Se guarda, pero se revalida siempre con If-None-Match
+
+
+# --- Minificación (conservadora: solo espacios y comentarios) ---
+
+def minificar_css(texto):
+    texto = re.sub(r'/\*.*?\*/', '', texto, flags=re.S)
+    texto = re.sub(r'\s+', ' ', texto)
+    texto = re.sub(r'\s*([{};,>])\s*', r'\1', texto)
+    texto = re.sub(r':\s+', ':', texto)
+    return texto.replace(';}', '}').strip()
+
+
+def minificar_js(texto):
+    """
+    Quita sangría, líneas vacías, comentarios de bloque y líneas que son solo comentario.
+    Conserva los saltos de línea (la inserción automática de ';' depende de ellos) y deja
+    intactas las líneas dentro de plantillas `...` de varias líneas. Las comillas y
+    comentarios se reconocen con un escáner sencillo que no distingue expresiones
+    regulares: una regex con comillas, acento grave o '/*' podría confundirlo.
+
+    Raises:
+        ValueError: Si el texto acaba dentro de una plantilla o un comentario de bloque
+            (señal de que el escáner se ha desincronizado); quien construye sirve entonces
+            el original sin minificar.
+    """
+    lineas = []
+    estado = None  # None: código, '`': plantilla, '*': comentario de bloque
+    for linea in texto.splitlines():
+        empieza_en_plantilla = estado == '`'
+        conservado = []
+        comillas = None
+        i = 0
+        while i < len(linea):
+            c = linea[i]
+            if estado == '*':
+                if linea.startswith('*/', i):
+                    estado = None
+                    i += 1
+            elif estado == '`':
+                conservado.append(c)
+                if c == '\\' and i + 1 < len(linea):
+                    conservado.append(linea[i + 1])
+                    i += 1
+                elif c == '`':
+                    estado = None
+            elif comillas is not None:
+                conservado.append(c)
+                if c == '\\' and i + 1 < len(linea):
+                    conservado.append(linea[i + 1])
+                    i += 1
+                elif c == comillas:
+                    comillas = None
+            elif linea.startswith('/*', i):
+                estado = '*'
+                i += 1
+            elif linea.startswith('//', i):
+                # Resto de la línea tal cual (podría ser parte de una regex: no se recorta)
+                conservado.append(linea[i:])
+                break
+            else:
+                conservado.append(c)
+                if c in '\'"':
+                    comillas = c
+                elif c == '`':
+                    estado = '`'
+            i += 1
+
+        resultado = ''.join(conservado)
+        if empieza_en_plantilla or estado == '`':
+            # Dentro de la plantilla la sangría y los espacios finales forman parte del texto
+            if not empieza_en_plantilla:
+                resultado = resultado.lstrip()
+            lineas.append(resultado)
+            continue
+        resultado = resultado.strip()
+        if resultado and not resultado.startswith('//'):
+            lineas.append(resultado)
+    if estado is not None:
+        raise ValueError("plantilla o comentario de bloque sin cerrar")
+    return '\n'.join(lineas)
+
+
+def minificar_html(texto):
+    # Sin <pre> ni <textarea> en el panel: la sangría no se ve. Se mantiene el salto de
+    # línea entre etiquetas porque entre elementos en línea equivale a un espacio.
+    texto = re.sub(r'<!--(?!\[).*?-->', '', texto, flags=re.S)
+    return '\n'.join(linea.strip() for linea in texto.splitlines() if linea.strip())
+
+
+MINIFICADORES = {'.css': minificar_css, '.js': minificar_js, '.html': minificar_html}
+
+
+class Recurso:
+    """Un recurso ya procesado: variantes por codificación ('identity', 'gzip', 'br')."""
+
+    def __init__(self, nombre, contenido, tipo_mime):
+        self.nombre = nombre
+        self.tipo_mime = tipo_mime
+        self.hash = hashlib.sha256(contenido).hexdigest()[:LONGITUD_HASH]
+        self.variantes = {'identity': contenido}
+        if tipo_mime.startswith(('text/', 'application/javascript')):
+            comprimidas = {'gzip': gzip.compress(contenido, NIVEL_GZIP, mtime=0)}
+            if brotli is not None:
+                comprimidas['br'] = brotli.compress(contenido, quality=CALIDAD_BROTLI)
+            # Solo se guardan las que realmente ahorran bytes
+            self.variantes.update({cod: datos for cod, datos in comprimidas.items() if len(datos) < len(contenido)})
+
+    @property
+    def nombre_versionado(self):
+        base, extension = os.path.splitext(self.nombre)
+        return f"{base}.{self.hash}{extension}"
+
+    def elegir(self, acepta):
+        """
+        Mejor variante aceptada por el cliente.
+
+        Args:
+            acepta (callable): f(codificacion) -> bool, según Accept-Encoding.
+
+        Returns:
+            tuple: (codificacion, datos, etag)
+        """
+        for codificacion in ('br', 'gzip'):
+            if codificacion in self.variantes and acepta(codificacion):
+                return codificacion, self.variantes[codificacion], f"{self.hash}-{codificacion}"
+        return 'identity', self.variantes['identity'], self.hash
+
+
+class RecursosEstaticos:
+    """
+    Conjunto de recursos del panel, construido en memoria y reconstruido si cambian las fuentes.
+
+    Args:
+        directorio_estatico (str): Carpeta `static/` con los recursos fuente.
+        directorio_plantillas (str): Carpeta `templates/` con el índice.
+        entorno_jinja: Entorno Jinja de Flask, para pre-renderizar el índice.
+    """
+
+    def __init__(self, directorio_estatico, directorio_plantillas, entorno_jinja, recursos=RECURSOS_PANEL):
+        self.directorio = directorio_estatico
+        self.entorno_jinja = entorno_jinja
+        self._rutas_fuente = [os.path.join(directorio_estatico, nombre) for nombre in recursos]
+        self._ruta_plantilla = os.path.join(directorio_plantillas, PLANTILLA_INDICE)
+        self._rutas_fuente.append(self._ruta_plantilla)
+        self.recursos_fuente = recursos
+        self._lock = threading.Lock()
+        self._por_nombre = {}
+        self._indice = None
+        self._firma_fuentes = None
+        self.construcciones = 0
+        self.tiempo_construccion = None
+
+    def _firma(self):
+        firma = []
+        for ruta in self._rutas_fuente:
+            try:
+                estado = os.stat(ruta)
+                firma.append((ruta, estado.st_mtime_ns, estado.st_size))
+            except OSError:
+                firma.append((ruta, None, None))
+        return tuple(firma)
+
+    def construir(self):
+        """Minifica, versiona y comprime todos los recursos y pre-renderiza el índice."""
+        inicio = time.perf_counter()
+        firma = self._firma()
+        recursos = {}
+        for nombre in self.recursos_fuente:
+            extension = os.path.splitext(nombre)[1]
+            with open(os.path.join(self.directorio, nombre), 'rb') as f:
+                contenido = f.read()
+            if extension in MINIFICADORES:
+                try:
+                    contenido = MINIFICADORES[extension](contenido.decode('utf-8')).encode('utf-8')
+                except ValueError as e:
+                    print(f"[ADVERTENCIA] No se pudo minificar {nombre} ({e}); se sirve sin minificar.")
+            recursos[nombre] = Recurso(nombre, contenido, TIPOS_MIME.get(extension, 'application/octet-stream'))
+
+        def url_for(endpoint, filename=None, **_):
+            # Sustituye al url_for de Flask al pre-renderizar: static/x -> /recursos/x.<hash>
+            if endpoint == 'static' and filename in recursos:
+                return PREFIJO_URL + recursos[filename].nombre_versionado
+            return f"/static/{filename}" if endpoint == 'static' else '/'
+
+        # Se lee del disco en cada construcción: la caché de plantillas de Jinja no se
+        # recarga fuera del modo depuración
+        with open(self._ruta_plantilla, encoding='utf-8') as f:
+            html = self.entorno_jinja.from_string(f.read()).render(url_for=url_for)
+        indice = Recurso(PLANTILLA_INDICE, minificar_html(html).encode('utf-8'), TIPOS_MIME['.html'])
+
+        with self._lock:
+            self._por_nombre = {r.nombre_versionado: r for r in recursos.values()}
+            self._indice = indice
+            self._firma_fuentes = firma
+            self.construcciones += 1
+            self.tiempo_construccion = time.perf_counter() - inicio
+        return self
+
+    def indice(self):
+        """Índice pre-renderizado; lo reconstruye todo antes si alguna fuente cambió."""
+        if self._indice is None or self._firma() != self._firma_fuentes:
+            self.construir()
+        return self._indice
+
+    def obtener(self, nombre_versionado):
+        """Recurso por su nombre con hash (None si no existe o es de una versión anterior)."""
+        if self._indice is None:
+            self.construir()
+        return self._por_nombre.get(nombre_versionado)
+
+    def estado(self):
+        with self._lock:
+            recursos = list(self._por_nombre.values()) + ([self._indice] if self._indice else [])
+            return {
+                'construcciones': self.construcciones,
+                'tiempo_construccion_ms': round(self.tiempo_construccion * 1000, 1) if self.tiempo_construccion else None,
+                'brotli': brotli is not None,
+                'recursos': {
+                    r.nombre: {
+                        'url': PREFIJO_URL + r.nombre_versionado if r.nombre != PLANTILLA_INDICE else '/',
+                        'bytes': {cod: len(datos) for cod, datos in r.variantes.items()},
+                    } for r in recursos
+                },
+            }
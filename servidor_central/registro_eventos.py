@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo con el registro de eventos estructurado del servidor.
+
+Antes cada petición construía una lista de líneas ya formateadas (con su
+`datetime.now().strftime`) y la devolvía entera en la respuesta, la leyera alguien o
+no. Ahora cada log es un evento tipado (nivel, categoría, mensaje con sus argumentos,
+id de petición y marca de tiempo monotónica) que se guarda en un buffer circular
+compartido por todas las peticiones. El texto solo se formatea cuando alguien lo lee
+(`/api/logs`, el flujo SSE, un trabajo seguido por el panel o una respuesta en modo
+detallado), y los eventos por debajo del nivel configurado ni siquiera se crean.
+"""
+
+import os
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from itertools import islice
+
+# --- Constantes de Configuración del Registro ---
+DEPURACION, INFO, ADVERTENCIA, ERROR = 10, 20, 30, 40
+NIVELES = {'depuracion': DEPURACION, 'info': INFO, 'advertencia': ADVERTENCIA, 'error': ERROR}
+NOMBRES_NIVEL = {valor: nombre for nombre, valor in NIVELES.items()}
+CAPACIDAD_REGISTRO = 2000       # Eventos que se conservan (los más antiguos se descartan)
+MAX_EVENTOS_CONSULTA = 1000     # Tope de eventos por página de /api/logs
+
+
+def nivel_desde_texto(texto, predeterminado=INFO):
+    """'depuracion' / 'info' / 'advertencia' / 'error' (o su número) -> nivel numérico."""
+    if texto is None or texto == '':
+        return predeterminado
+    texto = str(texto).strip().lower()
+    if texto.isdigit():
+        return int(texto)
+    if texto not in NIVELES:
+        raise ValueError(f"Nivel de log inválido: '{texto}'. Opciones: {list(NIVELES)}")
+    return NIVELES[texto]
+
+
+def _nivel_entorno(variable, predeterminado):
+    try:
+        return nivel_desde_texto(os.environ.get(variable), predeterminado)
+    except ValueError as e:
+        print(f"[ADVERTENCIA] {variable}: {e}; se usa '{NOMBRES_NIVEL[predeterminado]}'.")
+        return predeterminado
+
+
+# WASI_NIVEL_LOG: mínimo que se guarda; WASI_NIVEL_CONSOLA: mínimo que además se imprime
+NIVEL_REGISTRO = _nivel_entorno('WASI_NIVEL_LOG', INFO)
+NIVEL_CONSOLA = _nivel_entorno('WASI_NIVEL_CONSOLA', ERROR)
+
+# Los eventos guardan time.monotonic(); la hora de pared se calcula solo al mostrarlos
+_DESFASE_EPOCH = time.time() - time.monotonic()
+_PATRON_CATEGORIA = re.compile(r'\[([A-Z_]+)\]')
+
+
+class Evento:
+    """Un evento del registro; `texto` y `linea()` se formatean la primera vez que se piden."""
+
+    __slots__ = ('n', 't', 'nivel', 'categoria', 'mensaje', 'args', 'peticion', '_texto')
+
+    def __init__(self, nivel, categoria, mensaje, args, peticion):
+        self.n = None
+        self.t = time.monotonic()
+        self.nivel = nivel
+        self.categoria = categoria
+        self.mensaje = mensaje
+        self.args = args
+        self.peticion = peticion
+        self._texto = None
+
+    @property
+    def texto(self):
+        if self._texto is None:
+            self._texto = self.mensaje % self.args if self.args else str(self.mensaje)
+        return self._texto
+
+    @property
+    def epoch(self):
+        return self.t + _DESFASE_EPOCH
+
+    def categoria_efectiva(self):
+        # Las líneas ya formateadas ("[VOZ] Texto detectado...") llevan la categoría en el propio texto
+        if self.categoria is not None:
+            return self.categoria
+        coincidencia = _PATRON_CATEGORIA.match(self.mensaje)
+        return coincidencia.group(1) if coincidencia else 'SISTEMA'
+
+    def linea(self):
+        """Formato clásico de los logs del panel: "[CATEGORIA] [fecha hora] mensaje"."""
+        if self.categoria is None and self.mensaje.startswith('['):
+            return self.texto
+        marca = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.epoch))
+        return f"[{self.categoria_efectiva()}] [{marca}] {self.texto}"
+
+    def como_dict(self):
+        return {
+            'n': self.n,
+            't': round(self.epoch, 3),
+            'nivel': NOMBRES_NIVEL.get(self.nivel, self.nivel),
+            'categoria': self.categoria_efectiva(),
+            'peticion': self.peticion,
+            'texto': self.texto,
+        }
+
+
+class RegistroEventos:
+    """
+    Buffer circular de eventos compartido por todo el proceso, con espera de eventos nuevos.
+    """
+
+    def __init__(self, capacidad=CAPACIDAD_REGISTRO, nivel_minimo=NIVEL_REGISTRO, nivel_consola=NIVEL_CONSOLA):
+        self.capacidad = capacidad
+        self.nivel_minimo = nivel_minimo
+        self.nivel_consola = nivel_consola
+        self._eventos = deque(maxlen=capacidad)
+        self._condicion = threading.Condition()
+        self._siguiente = 0
+        self.filtrados = 0
+
+    def emitir(self, nivel, categoria, mensaje, args=(), peticion=None):
+        """
+        Guarda un evento (sin formatearlo) si alcanza el nivel mínimo.
+
+        Returns:
+            Evento | None: None si se filtró por nivel.
+        """
+        if nivel < self.nivel_minimo:
+            self.filtrados += 1
+            return None
+        evento = Evento(nivel, categoria, mensaje, args, peticion)
+        with self._condicion:
+            evento.n = self._siguiente
+            self._siguiente += 1
+            self._eventos.append(evento)
+            self._condicion.notify_all()
+        if nivel >= self.nivel_consola:
+            print(evento.linea())
+        return evento
+
+    def consultar(self, desde=0, nivel=DEPURACION, peticion=None, categoria=None, limite=MAX_EVENTOS_CONSULTA):
+        """
+        Página de eventos con número >= `desde` que cumplen los filtros.
+
+        Returns:
+            dict: {'eventos': [...], 'siguiente': cursor para la próxima página,
+                   'perdidos': eventos ya descartados del buffer antes de `desde`}
+        """
+        with self._condicion:
+            primero = self._siguiente - len(self._eventos)
+            inicio = max(desde - primero, 0)
+            candidatos = list(islice(self._eventos, inicio, None))
+            siguiente = self._siguiente
+
+        eventos = []
+        for evento in candidatos:
+            if evento.nivel < nivel or (peticion is not None and evento.peticion != peticion):
+                continue
+            if categoria is not None and evento.categoria_efectiva() != categoria:
+                continue
+            eventos.append(evento)
+            if len(eventos) >= limite:
+                siguiente = evento.n + 1
+                break
+        return {
+            'eventos': [evento.como_dict() for evento in eventos],
+            'siguiente': siguiente,
+            'perdidos': max(primero - desde, 0),
+        }
+
+    def esperar(self, desde, timeout):
+        """Bloquea hasta que exista algún evento con número >= `desde` o venza el plazo."""
+        with self._condicion:
+            return self._condicion.wait_for(lambda: self._siguiente > desde, timeout=timeout)
+
+    def estado(self):
+        with self._condicion:
+            return {
+                'capacidad': self.capacidad,
+                'guardados': len(self._eventos),
+                'emitidos': self._siguiente,
+                'filtrados': self.filtrados,
+                'nivel_minimo': NOMBRES_NIVEL.get(self.nivel_minimo, self.nivel_minimo),
+            }
+
+
+# Instancia única para todo el proceso
+registro_eventos = RegistroEventos()
+
+
+class RegistroPeticion(list):
+    """
+    Logs de una petición o trabajo. Cada línea va al registro compartido con el id de la
+    petición; la lista solo se rellena en modo detallado (para devolverla en la respuesta)
+    y `al_publicar(evento)` permite reenviar cada evento (p. ej. a los eventos de un trabajo).
+    """
+
+    def __init__(self, peticion=None, detallado=False, al_publicar=None, retener=False):
+        super().__init__()
+        self.peticion = peticion or uuid.uuid4().hex[:12]
+        self.detallado = detallado
+        self.al_publicar = al_publicar
+        # Con `retener` los eventos se guardan en `retenidos` en vez de publicarse (ver derivar)
+        self.retenidos = [] if retener else None
+
+    def evento(self, nivel, categoria, mensaje, *args):
+        evento = registro_eventos.emitir(nivel, categoria, mensaje, args, self.peticion)
+        if evento is not None:
+            self.reenviar(evento)
+
+    def reenviar(self, evento):
+        """Hace llegar a esta petición un evento ya guardado en el registro (sin volver a emitirlo)."""
+        if self.retenidos is not None:
+            self.retenidos.append(evento)
+            return
+        if self.detallado:
+            super().append(evento.linea())
+        if self.al_publicar is not None:
+            self.al_publicar(evento)
+
+    def append(self, texto):
+        # Líneas ya formateadas ("[VOZ] ..."): el nivel se deduce del prefijo
+        if texto.startswith('[ERROR'):
+            nivel = ERROR
+        elif texto.startswith('[ADVERTENCIA'):
+            nivel = ADVERTENCIA
+        else:
+            nivel = INFO
+        self.evento(nivel, None, texto)
+
+    def extend(self, textos):
+        for texto in textos:
+            self.append(texto)
+
+
+def registrar(logs, nivel, categoria, mensaje, *args):
+    """
+    Registra un evento en nombre de `logs`. Con una lista normal (módulos usados fuera de
+    una petición, pruebas) se sigue añadiendo la línea formateada, como antes.
+    """
+    if isinstance(logs, RegistroPeticion):
+        logs.evento(nivel, categoria, mensaje, *args)
+        return
+    evento = registro_eventos.emitir(nivel, categoria, mensaje, args)
+    if evento is not None:
+        logs.append(evento.linea())
+
+
+def derivar(logs):
+    """
+    Registro para una parte de la petición que corre en otro hilo: sus eventos van al
+    buffer con el mismo id y nivel, pero se retienen hasta `incorporar` para que los
+    logs de cada parte lleguen en orden y sin intercalarse.
+    """
+    if isinstance(logs, RegistroPeticion):
+        return RegistroPeticion(logs.peticion, retener=True)
+    return []
+
+
+def incorporar(logs, derivado):
+    """Vuelca en `logs` lo retenido por un registro de `derivar`."""
+    if isinstance(derivado, RegistroPeticion):
+        for evento in derivado.retenidos:
+            logs.reenviar(evento)
+    else:
+        logs.extend(derivado)
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo con las sesiones de voz en streaming (subida por trozos desde el navegador).
+
+El panel graba con MediaRecorder en fragmentos de ~200 ms y los envía en cuanto se
+generan. Cada sesión tiene un hilo que decodifica el contenedor WebM/Opus a medida que
+llegan los bytes (PyAV lee de un flujo que bloquea hasta el siguiente fragmento), pasa
+el audio por el segmentador de voz y, cuando detecta el fin del enunciado, cierra la
+sesión y entrega las muestras para transcribir y ejecutar la orden sin esperar a que
+termine la grabación. Mientras tanto puede ir produciendo transcripciones parciales.
+"""
+
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from decodificador_audio import iterar_audio, remuestrear
+from deteccion_voz import SegmentadorVoz
+
+# --- Constantes de Configuración de las Sesiones ---
+MAX_SESIONES_VOZ = 4          # Sesiones abiertas a la vez (cada una con su hilo decodificador)
+TTL_SESION_VOZ = 60           # Segundos sin fragmentos tras los que se descarta una sesión
+MAX_SEGUNDOS_SESION = 15      # Una orden más larga se cierra igualmente
+INTERVALO_PARCIAL = 1.0       # Segundos de audio nuevo entre transcripciones parciales
+TIMEOUT_DRENAJE = 2.0         # Espera máxima a que el decodificador procese lo recibido
+
+
+class FlujoEntrada:
+    """Objeto tipo archivo cuyo read() bloquea hasta que llegan más bytes o se cierra."""
+
+    def __init__(self):
+        self._datos = bytearray()
+        self._condicion = threading.Condition()
+        self._cerrado = False
+
+    def escribir(self, datos):
+        with self._condicion:
+            if not self._cerrado:
+                self._datos += datos
+                self._condicion.notify_all()
+
+    def cerrar(self):
+        with self._condicion:
+            self._cerrado = True
+            self._condicion.notify_all()
+
+    def read(self, n=-1):
+        with self._condicion:
+            self._condicion.wait_for(lambda: self._datos or self._cerrado)
+            n = len(self._datos) if n < 0 else min(n, len(self._datos))
+            datos = bytes(self._datos[:n])
+            del self._datos[:n]
+            return datos
+
+
+class SesionVoz:
+    """
+    Una orden hablada en curso: bytes recibidos, audio decodificado y estado del segmentador.
+    """
+
+    def __init__(self, al_finalizar, transcribir_parcial=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.creada = time.time()
+        self.actividad = time.monotonic()
+        self.fragmentos = 0
+        self.bytes_recibidos = 0
+        self.parcial = ""
+        self.motivo_fin = None       # 'fin_voz', 'cliente', 'duracion' o 'error'
+        self.error = None
+        self.job_id = None
+        self.rechazada = False       # La cola de trabajos estaba llena al cerrar
+
+        self._al_finalizar = al_finalizar
+        self._transcribir_parcial = transcribir_parcial
+        self._flujo = FlujoEntrada()
+        self._bloques = []
+        self._segmentador = SegmentadorVoz()
+        self._lock = threading.Lock()
+        self._decodificado = threading.Event()
+        self._finalizada = threading.Event()   # _al_finalizar ya volvió (job_id asignado o cola llena)
+        self._parcial_en_curso = False
+        self._segundos_ultimo_parcial = 0.0
+        self.fin_voz_en = None       # perf_counter() en que se detectó el fin del enunciado
+        threading.Thread(target=self._decodificar, daemon=True, name=f"voz-{self.id}").start()
+
+    @property
+    def segundos(self):
+        return self._segmentador.segundos
+
+    def agregar(self, datos, fin=False):
+        """
+        Añade un fragmento del navegador; con `fin` el cliente da la grabación por terminada.
+
+        Returns:
+            bool: True si la sesión ya está cerrada (por fin de voz, cliente o duración).
+        """
+        self.actividad = time.monotonic()
+        if datos and self.motivo_fin is None:
+            self.fragmentos += 1
+            self.bytes_recibidos += len(datos)
+            self._flujo.escribir(datos)
+        if fin:
+            self._cerrar('cliente')
+        if self.motivo_fin is None:
+            return False
+        # El cierre puede venir del hilo decodificador: se espera a que el trabajo esté
+        # encolado para que quien consulte job_id no lo vea aún sin asignar
+        self._finalizada.wait(TIMEOUT_DRENAJE)
+        return True
+
+    def _cerrar(self, motivo):
+        with self._lock:
+            if self.motivo_fin is not None:
+                return
+            self.motivo_fin = motivo
+            self.fin_voz_en = time.perf_counter()
+        self._flujo.cerrar()
+        try:
+            self._al_finalizar(self)
+        finally:
+            self._finalizada.set()
+
+    def muestras(self, timeout=TIMEOUT_DRENAJE):
+        """Audio completo a 16 kHz tras drenar lo ya recibido (llamar después del cierre)."""
+        self._decodificado.wait(timeout)
+        with self._lock:
+            return np.concatenate(self._bloques) if self._bloques else np.zeros(0, dtype=np.float32)
+
+    def _decodificar(self):
+        try:
+            for bloque, frecuencia in iterar_audio(self._flujo):
+                bloque = remuestrear(bloque, frecuencia)
+                with self._lock:
+                    self._bloques.append(bloque)
+                fin_voz = self._segmentador.agregar(bloque)
+                if self.motivo_fin is None:
+                    if fin_voz:
+                        self._cerrar('fin_voz')
+                    elif self._segmentador.segundos >= MAX_SEGUNDOS_SESION:
+                        self._cerrar('duracion')
+                    else:
+                        self._quizas_parcial()
+        except Exception as e:
+            # Un contenedor cortado al cerrar es normal; solo es error si no se había cerrado
+            if self.motivo_fin is None:
+                self.error = str(e)
+                print(f"[ERROR_VOZ] Sesión {self.id}: fallo decodificando el flujo: {e}")
+                self._cerrar('error')
+        finally:
+            self._decodificado.set()
+
+    def _quizas_parcial(self):
+        segmentador = self._segmentador
+        if (self._transcribir_parcial is None or self._parcial_en_curso or not segmentador.hubo_voz
+                or segmentador.segundos - self._segundos_ultimo_parcial < INTERVALO_PARCIAL):
+            return
+        self._parcial_en_curso = True
+        self._segundos_ultimo_parcial = segmentador.segundos
+        with self._lock:
+            audio = np.concatenate(self._bloques)
+        threading.Thread(target=self._parcial, args=(audio,), daemon=True).start()
+
+    def _parcial(self, audio):
+        try:
+            texto = self._transcribir_parcial(audio)
+            if texto is not None and self.motivo_fin is None:
+                self.parcial = texto
+        except Exception as e:
+            print(f"[ADVERTENCIA] Sesión {self.id}: transcripción parcial fallida: {e}")
+        finally:
+            self._parcial_en_curso = False
+
+    def resumen(self):
+        return {
+            'sesion': self.id,
+            'fragmentos': self.fragmentos,
+            'segundos': round(self.segundos, 2),
+            'voz': self._segmentador.hubo_voz,
+            'parcial': self.parcial,
+            'finalizada': self.motivo_fin is not None,
+            'motivo': self.motivo_fin,
+            'job_id': self.job_id,
+        }
+
+
+class GestorSesionesVoz:
+    """
+    Registro de sesiones abiertas con límite de concurrencia y caducidad.
+
+    Args:
+        al_finalizar (callable): f(sesion) al cerrarse una sesión; debe asignar `sesion.job_id`.
+        transcribir_parcial (callable): f(muestras) -> str | None; opcional.
+    """
+
+    def __init__(self, al_finalizar, transcribir_parcial=None, max_sesiones=MAX_SESIONES_VOZ):
+        self.al_finalizar = al_finalizar
+        self.transcribir_parcial = transcribir_parcial
+        self.max_sesiones = max_sesiones
+        self._sesiones = {}
+        self._lock = threading.Lock()
+        self.creadas = 0
+        self.rechazadas = 0
+        self.cierres = {}
+
+    def _al_finalizar(self, sesion):
+        self.cierres[sesion.motivo_fin] = self.cierres.get(sesion.motivo_fin, 0) + 1
+        self.al_finalizar(sesion)
+
+    def crear(self):
+        """Devuelve una sesión nueva o None si ya hay demasiadas abiertas."""
+        with self._lock:
+            self._purgar()
+            abiertas = sum(1 for s in self._sesiones.values() if s.motivo_fin is None)
+            if abiertas >= self.max_sesiones:
+                self.rechazadas += 1
+                return None
+            sesion = SesionVoz(self._al_finalizar, self.transcribir_parcial)
+            self._sesiones[sesion.id] = sesion
+            self.creadas += 1
+            return sesion
+
+    def obtener(self, id_sesion):
+        with self._lock:
+            return self._sesiones.get(id_sesion)
+
+    def _purgar(self):
+        limite = time.monotonic() - TTL_SESION_VOZ
+        for id_sesion in [i for i, s in self._sesiones.items() if s.actividad < limite]:
+            sesion = self._sesiones.pop(id_sesion)
+            sesion._flujo.cerrar()  # Libera el hilo decodificador si seguía esperando bytes
+
+    def estado(self):
+        with self._lock:
+            return {
+                'abiertas': sum(1 for s in self._sesiones.values() if s.motivo_fin is None),
+                'max_sesiones': self.max_sesiones,
+                'creadas': self.creadas,
+                'rechazadas': self.rechazadas,
+                'cierres': dict(self.cierres),
+            }
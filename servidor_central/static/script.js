@@ -12,13 +12,18 @@ document.addEventListener('DOMContentLoaded', () => {
     const logsOutput = document.getElementById('logs-output');
 
     // Usamos rutas relativas para que funcione igual en localhost o desde el móvil (IP)
-    const API_URL = '/api/command';
-    const VOICE_API_URL = '/api/voice-command';
+    const JOB_COMMAND_URL = '/api/jobs/command';
+    const JOB_VOICE_URL = '/api/jobs/voice';
+    const JOB_STATUS_URL = '/api/jobs';
+    const VOICE_STREAM_URL = '/api/voice/stream';
+    const VOICE_CHUNK_MS = 200; // Fragmentos de MediaRecorder que se suben mientras se habla
     const DEVICE_CONTROL_URL = '/api/device/control';
-    const GAS_API_URL = '/api/sensor/gas';
-    const DISTANCE_API_URL = '/api/distancia';
+    const SENSOR_STREAM_URL = '/api/sensor/stream';
+    const SENSOR_POLL_URL = '/api/sensor/poll';
     const SERVO_API_URL = '/api/servo';
     const ARDUINO_LED_API_URL = '/api/arduino/led';
+    const STATE_API_URL = '/api/state';
+    const GATEWAY_STATUS_URL = '/api/gateway/status';
     
     // Control de Audio
     const alarmAudio = document.getElementById('alarm-sound');
@@ -84,6 +89,56 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     };
 
+    /**
+     * Aplica el resultado de una acción ejecutada (indicadores y sonido de alarma).
+     */
+    const applyActionResult = (res) => {
+        if (!res.exito) return;
+        updateIndicators(res.accion, res.lugar);
+        // Si la IA activó la alarma, encender sonido
+        if (res.lugar === 'alarma' || res.lugar === 'alarmas') {
+            isAlarmActive = (res.accion === 'ON');
+            toggleAlarmSound(isAlarmActive);
+        }
+    };
+
+    /**
+     * Envía un trabajo asíncrono y sigue sus eventos por long-polling hasta que termina.
+     * Los logs y las acciones se muestran a medida que el servidor los publica.
+     * @returns {Promise<object>} El resultado final del trabajo.
+     */
+    const runJob = async (url, options) => {
+        const response = await fetch(url, { method: 'POST', ...options });
+        const accepted = await response.json();
+        if (response.status !== 202) throw new Error(accepted.message || `HTTP ${response.status}`);
+        return followJob(accepted.job_id);
+    };
+
+    /**
+     * Sigue los eventos de un trabajo ya creado hasta que termina.
+     */
+    const followJob = async (jobId) => {
+        let next = 0;
+        while (true) {
+            const poll = await fetch(`${JOB_STATUS_URL}/${jobId}?desde=${next}&espera=20`);
+            if (!poll.ok) throw new Error(`HTTP ${poll.status} consultando el trabajo`);
+            const job = await poll.json();
+            job.eventos.forEach(ev => {
+                if (ev.tipo === 'log') {
+                    logsOutput.innerHTML += `${ev.texto}\n`;
+                } else if (ev.tipo === 'etapa' && ev.etapa === 'transcrito') {
+                    commandInput.value = ev.datos.texto;
+                    logToConsole(`Transcripción local: "${ev.datos.texto}"`, 'success');
+                } else if (ev.tipo === 'etapa' && ev.etapa === 'accion') {
+                    applyActionResult(ev.datos);
+                }
+            });
+            logsOutput.scrollTop = logsOutput.scrollHeight;
+            next = job.siguiente;
+            if (job.estado === 'completado' || job.estado === 'error') return job.resultado || {};
+        }
+    };
+
     /**
      * Envía el comando al backend a través de la API.
      */
@@ -101,42 +156,19 @@ document.addEventListener('DOMContentLoaded', () => {
         logToConsole(`Enviando comando: "${command}"`, 'info');
 
         try {
-            const response = await fetch(API_URL, {
-                method: 'POST',
+            const result = await runJob(JOB_COMMAND_URL, {
                 headers: {
                     'Content-Type': 'application/json',
                 },
                 body: JSON.stringify({ command: command }),
             });
 
-            const result = await response.json();
-
-            // Mostrar logs del backend
-            if (result.logs && Array.isArray(result.logs)) {
-                result.logs.forEach(log => {
-                    logsOutput.innerHTML += `${log}\n`;
-                });
-                logsOutput.scrollTop = logsOutput.scrollHeight;
-            }
-
-            // Actualizar indicadores visuales
-            if (result.resultados && Array.isArray(result.resultados)) {
-                result.resultados.forEach(res => {
-                    if (res.exito) {
-                        updateIndicators(res.accion, res.lugar);
-                        
-                        // Si la IA activó la alarma, encender sonido
-                        if (res.lugar === 'alarma' || res.lugar === 'alarmas') {
-                            isAlarmActive = (res.accion === 'ON');
-                            toggleAlarmSound(isAlarmActive);
-                        }
-                    }
-                });
-            } else if (result.status === 'failed') {
+            if (result.status === 'failed') {
                 logToConsole('No se ejecutaron acciones o hubo un error.', 'error');
+            } else if (result.status === 'error') {
+                logToConsole(`Error: ${result.message || 'fallo al procesar el comando'}`, 'error');
             }
 
-
         } catch (error) {
             logToConsole(`Error de conexión con el servidor: ${error.message}`, 'error');
             console.error('Error en la petición fetch:', error);
@@ -175,46 +207,80 @@ document.addEventListener('DOMContentLoaded', () => {
                     mediaRecorder = new MediaRecorder(stream);
                     audioChunks = [];
 
+                    // Sesión de streaming: cada fragmento se sube al instante y el servidor
+                    // decodifica y detecta el fin de la voz mientras se sigue grabando
+                    let sessionId = null;
+                    let uploads = Promise.resolve(null);
+                    try {
+                        const res = await fetch(VOICE_STREAM_URL, { method: 'POST' });
+                        if (res.status === 201) sessionId = (await res.json()).sesion;
+                    } catch (e) {
+                        sessionId = null;
+                    }
+
+                    const stopRecording = (message) => {
+                        if (mediaRecorder.state !== 'recording') return;
+                        clearTimeout(recordingTimeout);
+                        mediaRecorder.stop();
+                        micBtn.classList.remove('recording', 'btn-danger');
+                        micBtn.classList.add('btn-secondary');
+                        micBtn.innerHTML = '<i class="bi bi-mic"></i>';
+                        logToConsole(message, 'info');
+                        sendBtn.disabled = true;
+                        loadingSpinner.classList.remove('d-none');
+                    };
+
+                    // Los fragmentos se envían en orden; devuelve el job_id cuando el servidor cierra la orden.
+                    // Si una subida falla se abandona la sesión (sessionId = null) y, al parar, se envía
+                    // la grabación completa; la cadena nunca queda rechazada
+                    const uploadChunk = (data, fin) => {
+                        uploads = uploads.then(async (jobId) => {
+                            if (jobId || !sessionId) return jobId;
+                            try {
+                                const res = await fetch(`${VOICE_STREAM_URL}/${sessionId}${fin ? '?fin=1' : ''}`, { method: 'POST', body: data });
+                                const info = await res.json();
+                                if (res.status === 202) {
+                                    stopRecording('Fin de la voz detectado. Procesando...');
+                                    return info.job_id;
+                                }
+                                if (!res.ok) throw new Error(info.message || `HTTP ${res.status}`);
+                                if (info.parcial) commandInput.value = info.parcial;
+                            } catch (error) {
+                                sessionId = null;
+                                logToConsole(`Streaming de voz interrumpido (${error.message}); se enviará la grabación completa.`, 'warning');
+                            }
+                            return null;
+                        });
+                        return uploads;
+                    };
+
                     mediaRecorder.ondataavailable = event => {
                         audioChunks.push(event.data);
+                        if (sessionId && event.data.size > 0) uploadChunk(event.data, false);
                     };
 
                     mediaRecorder.onstop = async () => {
-                        const audioBlob = new Blob(audioChunks, { type: 'audio/webm' });
-                        const formData = new FormData();
-                        formData.append('audio', audioBlob, 'recording.webm');
-
+                        stream.getTracks().forEach(track => track.stop());
                         try {
-                            const response = await fetch(VOICE_API_URL, {
-                                method: 'POST',
-                                body: formData
-                            });
-                            const result = await response.json();
-
-                            if (result.transcription) {
-                                commandInput.value = result.transcription;
-                                logToConsole(`Transcripción local: "${result.transcription}"`, 'success');
+                            let result;
+                            // El último fragmento ya está en la cola; fin=1 cierra si el servidor no lo hizo
+                            const jobId = sessionId ? await uploadChunk(new Blob([]), true) : null;
+                            if (jobId) {
+                                result = await followJob(jobId);
+                            } else {
+                                // Sin streaming disponible (o interrumpido): se sube la grabación completa
+                                const audioBlob = new Blob(audioChunks, { type: 'audio/webm' });
+                                const formData = new FormData();
+                                formData.append('audio', audioBlob, 'recording.webm');
+                                // El servidor responde al instante; la transcripción y cada acción llegan como eventos
+                                result = await runJob(JOB_VOICE_URL, { body: formData });
                             }
-                            
-                            // Mostrar logs y actualizar estado (reutilizando lógica visual)
-                            if (result.logs) result.logs.forEach(l => logsOutput.innerHTML += `${l}\n`);
-                            
-                            if (result.resultados && Array.isArray(result.resultados)) {
-                                result.resultados.forEach(res => {
-                                    if (res.exito) {
-                                        updateIndicators(res.accion, res.lugar);
-                                        if (res.lugar === 'alarma' || res.lugar === 'alarmas') {
-                                            isAlarmActive = (res.accion === 'ON');
-                                            toggleAlarmSound(isAlarmActive);
-                                        }
-                                    }
-                                });
-                                
-                            } else if (result.status === 'failed') {
+
+                            if (result.status === 'failed') {
                                 logToConsole('Error: El hardware no respondió.', 'error');
+                            } else if (result.status === 'error') {
+                                logToConsole(`Error al procesar audio: ${result.message}`, 'error');
                             }
-                            
-                            logsOutput.scrollTop = logsOutput.scrollHeight;
 
                         } catch (error) {
                             logToConsole(`Error al enviar audio: ${error.message}`, 'error');
@@ -224,24 +290,13 @@ document.addEventListener('DOMContentLoaded', () => {
                         }
                     };
 
-                    mediaRecorder.start();
+                    mediaRecorder.start(sessionId ? VOICE_CHUNK_MS : undefined);
                     micBtn.classList.add('recording', 'btn-danger');
                     micBtn.classList.remove('btn-secondary');
                     micBtn.innerHTML = '<i class="bi bi-mic-fill"></i>';
-                    logToConsole('Grabando audio (máx 3s)...', 'info');
-
-                    recordingTimeout = setTimeout(() => {
-                        if (mediaRecorder.state === 'recording') {
-                            mediaRecorder.stop();
-                            micBtn.classList.remove('recording', 'btn-danger');
-                            micBtn.classList.add('btn-secondary');
-                            micBtn.innerHTML = '<i class="bi bi-mic"></i>';
-                            logToConsole('Tiempo límite alcanzado. Procesando...', 'info');
-                            
-                            sendBtn.disabled = true;
-                            loadingSpinner.classList.remove('d-none');
-                        }
-                    }, 5000);
+                    logToConsole(sessionId ? 'Escuchando... (se enviará al terminar de hablar)' : 'Grabando audio (máx 5s)...', 'info');
+
+                    recordingTimeout = setTimeout(() => stopRecording('Tiempo límite alcanzado. Procesando...'), 5000);
 
                 } catch (err) {
                     logToConsole(`No se pudo acceder al micrófono: ${err}`, 'error');
@@ -266,7 +321,8 @@ document.addEventListener('DOMContentLoaded', () => {
                 const response = await fetch(DEVICE_CONTROL_URL, {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ lugar: lugar, accion: accion })
+                    // verbose: la consola del panel muestra los logs de la orden
+                    body: JSON.stringify({ lugar: lugar, accion: accion, verbose: true })
                 });
                 
                 const result = await response.json();
@@ -355,99 +411,172 @@ document.addEventListener('DOMContentLoaded', () => {
         });
     });
 
-    // --- Lógica de Monitoreo de Gas (Polling) ---
-    const updateGasIndicator = async () => {
-        try {
-            const response = await fetch(GAS_API_URL);
-            const data = await response.json();
-            
-            if (data.status === 'success') {
-                const level = data.level;
-                const temp = data.temp;
-                const hum = data.hum;
-
-                // Actualizar Temperatura y Humedad
-                const tempBadge = document.getElementById('temp-value');
-                const humBadge = document.getElementById('hum-value');
-                
-                if (tempBadge) {
-                    // Verificamos si temp es válido (no es null ni texto)
-                    if (temp === null || isNaN(temp)) {
-                        tempBadge.textContent = "Error";
-                        tempBadge.classList.replace('bg-primary', 'bg-danger');
-                    } else {
-                        // Ajuste visual: Restamos 5 grados solo si el dato es válido
-                        tempBadge.textContent = `${(temp - 5).toFixed(2)} °C`;
-                        tempBadge.classList.replace('bg-danger', 'bg-primary');
-                    }
-                }
-                
-                if (humBadge) humBadge.textContent = (hum === null || isNaN(hum)) ? "-- %" : `${hum} %`;
+    // --- Lógica de Monitoreo de Gas ---
+    const renderGas = (level, temp, hum) => {
+        // Actualizar Temperatura y Humedad
+        const tempBadge = document.getElementById('temp-value');
+        const humBadge = document.getElementById('hum-value');
+
+        if (tempBadge && temp !== undefined) {
+            // Verificamos si temp es válido (no es null ni texto)
+            if (temp === null || isNaN(temp)) {
+                tempBadge.textContent = "Error";
+                tempBadge.classList.replace('bg-primary', 'bg-danger');
+            } else {
+                // Ajuste visual: Restamos 5 grados solo si el dato es válido
+                tempBadge.textContent = `${(temp - 5).toFixed(2)} °C`;
+                tempBadge.classList.replace('bg-danger', 'bg-primary');
+            }
+        }
 
-                // Asumiendo lectura analógica de 0 a 1023
-                const percentage = Math.min((level / 1023) * 100, 100);
-                
-                const progressBar = document.getElementById('gas-progress');
-                const valueBadge = document.getElementById('gas-value');
-                
-                if (progressBar && valueBadge) {
-                    progressBar.style.width = `${percentage}%`;
-                    valueBadge.textContent = level;
-                    
-                    // Cambiar color según nivel de peligro
-                    progressBar.classList.remove('bg-success', 'bg-warning', 'bg-danger');
-                    if (level < 300) progressBar.classList.add('bg-success');       // Seguro
-                    else if (level < 600) progressBar.classList.add('bg-warning');  // Precaución
-                    else progressBar.classList.add('bg-danger');                    // Peligro
-                }
+        if (humBadge && hum !== undefined) humBadge.textContent = (hum === null || isNaN(hum)) ? "-- %" : `${hum} %`;
 
-                // Lógica de Sonido Automático por Gas (> 400) con memoria (Histéresis)
-                // Si detectamos gas alto, guardamos el momento actual
-                if (level > 400) {
-                    lastGasAlarmTime = Date.now();
-                }
+        if (level === undefined) return;
 
-                // La alarma suena si hay gas AHORA o si hubo gas hace menos de 5 segundos
-                const shouldPlayGasAlarm = (Date.now() - lastGasAlarmTime < 5000);
-                
-                toggleAlarmSound(shouldPlayGasAlarm || isAlarmActive);
-            }
-        } catch (error) {
-            // Fallo silencioso para no saturar logs si el servidor cae momentáneamente
+        // Asumiendo lectura analógica de 0 a 1023
+        const percentage = Math.min((level / 1023) * 100, 100);
+
+        const progressBar = document.getElementById('gas-progress');
+        const valueBadge = document.getElementById('gas-value');
+
+        if (progressBar && valueBadge) {
+            progressBar.style.width = `${percentage}%`;
+            valueBadge.textContent = level;
+
+            // Cambiar color según nivel de peligro
+            progressBar.classList.remove('bg-success', 'bg-warning', 'bg-danger');
+            if (level < 300) progressBar.classList.add('bg-success');       // Seguro
+            else if (level < 600) progressBar.classList.add('bg-warning');  // Precaución
+            else progressBar.classList.add('bg-danger');                    // Peligro
+        }
+
+        // Lógica de Sonido Automático por Gas (> 400) con memoria (Histéresis)
+        // Si detectamos gas alto, guardamos el momento actual
+        if (level > 400) {
+            lastGasAlarmTime = Date.now();
         }
+        updateAlarmSound();
+    };
+
+    // La alarma suena si hay gas AHORA o si hubo gas hace menos de 5 segundos.
+    // Se reevalúa localmente cada segundo porque el servidor solo envía cambios.
+    const updateAlarmSound = () => {
+        const shouldPlayGasAlarm = (Date.now() - lastGasAlarmTime < 5000);
+        toggleAlarmSound(shouldPlayGasAlarm || isAlarmActive);
     };
 
     // --- Lógica de Monitoreo de Distancia (HC-SR04) ---
-    const updateDistanceIndicator = async () => {
-        try {
-            const response = await fetch(DISTANCE_API_URL);
-            const data = await response.json();
+    const renderDistance = (distance) => {
+        const badge = document.getElementById('distance-badge');
 
-            if (data.status === 'success') {
-                const distance = data.distance; 
-                const badge = document.getElementById('distance-badge');
+        if (badge && distance !== undefined && distance !== null) {
+            badge.textContent = `Distancia al objeto: ${distance} cm`;
 
-                if (badge) {
-                    badge.textContent = `Distancia al objeto: ${distance} cm`;
-                    
-                    // Cambio de color según proximidad
-                    if (distance < 10) {
-                        badge.className = "badge bg-danger"; // Muy cerca
-                    } else if (distance < 50) {
-                        badge.className = "badge bg-warning text-dark"; // Cerca
-                    } else {
-                        badge.className = "badge bg-success"; // Lejos
-                    }
-                }
+            // Cambio de color según proximidad
+            if (distance < 10) {
+                badge.className = "badge bg-danger"; // Muy cerca
+            } else if (distance < 50) {
+                badge.className = "badge bg-warning text-dark"; // Cerca
+            } else {
+                badge.className = "badge bg-success"; // Lejos
+            }
+        }
+    };
+
+    // Aplica una instantánea combinada de sensores enviada por el servidor
+    let sensorVersion = -1;
+    const applySensorSnapshot = (data) => {
+        if (data.version !== undefined) sensorVersion = data.version;
+        renderGas(data.gas, data.temp, data.hum);
+        renderDistance(data.distancia);
+    };
+
+    // --- Recepción de Sensores en Tiempo Real ---
+    // El servidor empuja cada lectura nueva (SSE). Si el navegador no soporta
+    // EventSource o el flujo no llega a abrirse, se usa long-polling.
+    const startSensorLongPolling = async () => {
+        while (true) {
+            try {
+                const response = await fetch(`${SENSOR_POLL_URL}?version=${sensorVersion}`);
+                const data = await response.json();
+                if (data.status === 'success') applySensorSnapshot(data);
+            } catch (error) {
+                // Fallo silencioso para no saturar logs si el servidor cae momentáneamente
+                await new Promise(resolve => setTimeout(resolve, 2000));
+            }
+        }
+    };
+
+    const startSensorStream = () => {
+        if (!window.EventSource) {
+            startSensorLongPolling();
+            return;
+        }
+        const source = new EventSource(SENSOR_STREAM_URL);
+        let opened = false;
+        source.onopen = () => { opened = true; };
+        source.onmessage = (event) => applySensorSnapshot(JSON.parse(event.data));
+        source.onerror = () => {
+            // Si nunca llegó a abrirse (servidor lleno o proxy sin soporte), pasamos a long-polling.
+            // Si ya estaba abierto, EventSource reconecta solo.
+            if (!opened) {
+                source.close();
+                startSensorLongPolling();
+            }
+        };
+    };
+
+    // --- Estado Inicial de los Dispositivos ---
+    // El servidor guarda el último estado conocido (sombra); así los indicadores no
+    // empiezan "apagados" si la maqueta ya tenía luces encendidas.
+    const loadDeviceState = async () => {
+        try {
+            const response = await fetch(STATE_API_URL);
+            const data = await response.json();
+            Object.entries(data.dispositivos || {}).forEach(([lugar, info]) => {
+                const el = document.getElementById(`status-${lugar}`);
+                if (!el || (info.estado !== 'on' && info.estado !== 'off')) return;
+                el.classList.toggle('on', info.estado === 'on');
+            });
+            const puerta = data.dispositivos && data.dispositivos.puerta;
+            if (servoSlider && puerta && typeof puerta.estado === 'number') {
+                servoSlider.value = puerta.estado;
+                servoValue.textContent = `${puerta.estado}°`;
             }
         } catch (error) {
-            console.error("Error obteniendo distancia:", error);
+            console.error('No se pudo leer el estado de los dispositivos:', error);
         }
     };
 
-    // Consultar sensor cada 2 segundos
-    setInterval(updateGasIndicator, 1000);
-    setInterval(updateDistanceIndicator, 1000); 
+    loadDeviceState();
+
+    // --- Estado de la Pasarela ESP32 ---
+    const gatewayBadge = document.getElementById('gateway-badge');
+    const GATEWAY_BADGES = {
+        activo: ['bg-success', 'Pasarela: en línea'],
+        degradado: ['bg-warning', 'Pasarela: lenta'],
+        caido: ['bg-danger', 'Pasarela: sin conexión'],
+        desconocido: ['bg-secondary', 'Pasarela: --'],
+    };
+    const updateGatewayStatus = async () => {
+        if (!gatewayBadge) return;
+        try {
+            const response = await fetch(GATEWAY_STATUS_URL);
+            const data = await response.json();
+            const salud = data.pasarela ? data.pasarela.salud : 'desconocido';
+            const [cls, text] = GATEWAY_BADGES[salud] || GATEWAY_BADGES.desconocido;
+            gatewayBadge.className = `badge ${cls}`;
+            gatewayBadge.textContent = text;
+            const ms = data.pasarela && data.pasarela.latencia_ewma_ms;
+            gatewayBadge.title = ms !== null && ms !== undefined ? `Latencia media: ${ms} ms` : 'Estado de la pasarela ESP32';
+        } catch (error) {
+            // El servidor puede estar reiniciándose; se reintenta en el próximo ciclo
+        }
+    };
+    updateGatewayStatus();
+    setInterval(updateGatewayStatus, 5000);
+    startSensorStream();
+    setInterval(updateAlarmSound, 1000);
 
     // --- Event Listeners ---
     sendBtn.addEventListener('click', sendCommand);
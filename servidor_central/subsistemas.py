@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo con los subsistemas opcionales del servidor (voz, serial y LLM).
+
+Cada subsistema pesado se importa e inicializa la primera vez que se usa, o al
+arrancar si así se configura, en lugar de cargarse siempre al importar `app.py`. Así
+un nodo que solo atiende botones y sensores arranca en una fracción de segundo y con
+poca memoria, y la falta de una dependencia (PyAV, pyserial, Whisper...) desactiva
+solo su subsistema en vez de impedir el arranque.
+
+El modo de cada uno se elige con una variable de entorno `WASI_<NOMBRE>`:
+    si        se carga al arrancar (predeterminado)
+    diferido  se carga con la primera petición que lo necesite
+    no        desactivado; sus rutas responden 503
+"""
+
+import os
+import threading
+import time
+
+# --- Constantes de Configuración de los Subsistemas ---
+MODOS = ('si', 'diferido', 'no')
+MODO_PREDETERMINADO = 'si'
+
+
+def memoria_residente_mb():
+    """RSS actual del proceso en MB (None si el sistema no lo expone)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        # Windows/macOS: psutil si está instalado
+        import psutil
+        return psutil.Process().memory_info().rss / (1024 * 1024)
+    except Exception:
+        return None
+
+
+class SubsistemaNoDisponible(RuntimeError):
+    """El subsistema está desactivado por configuración o falló al cargarse."""
+
+
+class Subsistema:
+    """
+    Backend opcional con carga diferida e idempotente.
+
+    Args:
+        nombre (str): Nombre corto ('voz', 'serial', 'llm'); da nombre a la variable WASI_<NOMBRE>.
+        cargador (callable): f() -> objeto del subsistema; importa e inicializa lo necesario.
+        descripcion (str): Para el informe de arranque.
+        verificar (callable): f(objeto) -> str | None, opcional. Fallos que aparecen después
+            de cargar (p. ej. un modelo que termina de cargarse en segundo plano).
+    """
+
+    def __init__(self, nombre, cargador, descripcion="", verificar=None):
+        self.nombre = nombre
+        self.descripcion = descripcion
+        self._cargador = cargador
+        self._verificar = verificar
+        self._lock = threading.Lock()
+        self._objeto = None
+        self.variable = f"WASI_{nombre.upper()}"
+        self.modo = os.environ.get(self.variable, MODO_PREDETERMINADO).strip().lower()
+        if self.modo not in MODOS:
+            print(f"[ADVERTENCIA] {self.variable}='{self.modo}' no es válido ({'/'.join(MODOS)}); se usa '{MODO_PREDETERMINADO}'.")
+            self.modo = MODO_PREDETERMINADO
+
+        self.cargado = False
+        self.error = None
+        self.tiempo_carga = None
+        self.memoria_mb = None
+        self.cargado_en = None       # 'arranque' o 'primer_uso'
+        registro_subsistemas.append(self)
+
+    @property
+    def activo(self):
+        return self.modo != 'no'
+
+    def obtener(self, al_arrancar=False):
+        """
+        Devuelve el objeto del subsistema, cargándolo la primera vez.
+
+        Raises:
+            SubsistemaNoDisponible: Si está desactivado o su carga falló.
+        """
+        if self.cargado:
+            self._comprobar()
+            if self.error is not None:
+                raise SubsistemaNoDisponible(f"Subsistema '{self.nombre}' no disponible: {self.error}")
+            return self._objeto
+        if not self.activo:
+            raise SubsistemaNoDisponible(f"Subsistema '{self.nombre}' desactivado ({self.variable}=no).")
+        with self._lock:
+            if not self.cargado and self.error is None:
+                memoria_previa = memoria_residente_mb()
+                inicio = time.perf_counter()
+                try:
+                    self._objeto = self._cargador()
+                    self.cargado = True
+                except Exception as e:
+                    # ImportError de una dependencia ausente, puerto inválido...: solo cae este subsistema
+                    self.error = f"{type(e).__name__}: {e}"
+                    print(f"[ERROR] No se pudo cargar el subsistema '{self.nombre}': {self.error}")
+                self.tiempo_carga = time.perf_counter() - inicio
+                memoria = memoria_residente_mb()
+                if memoria is not None and memoria_previa is not None:
+                    self.memoria_mb = memoria - memoria_previa
+                self.cargado_en = 'arranque' if al_arrancar else 'primer_uso'
+        if self.error is not None:
+            raise SubsistemaNoDisponible(f"Subsistema '{self.nombre}' no disponible: {self.error}")
+        return self._objeto
+
+    def _comprobar(self):
+        if self.error is None and self.cargado and self._verificar is not None:
+            error = self._verificar(self._objeto)
+            if error:
+                self.error = error
+                print(f"[ERROR] El subsistema '{self.nombre}' falló tras cargarse: {error}")
+
+    def iniciar(self):
+        """Carga al arrancar si el modo es 'si'; los fallos quedan en el informe, no detienen el servidor."""
+        if self.modo == 'si':
+            try:
+                self.obtener(al_arrancar=True)
+            except SubsistemaNoDisponible:
+                pass
+
+    def estado(self):
+        self._comprobar()
+        if not self.activo:
+            estado = 'desactivado'
+        elif self.error is not None:
+            estado = 'error'
+        else:
+            estado = 'cargado' if self.cargado else 'pendiente'
+        return {
+            'modo': self.modo,
+            'estado': estado,
+            'descripcion': self.descripcion,
+            'cargado_en': self.cargado_en,
+            'tiempo_carga_s': round(self.tiempo_carga, 4) if self.tiempo_carga is not None else None,
+            'memoria_mb': round(self.memoria_mb, 1) if self.memoria_mb is not None else None,
+            'error': self.error,
+        }
+
+
+def informe_subsistemas():
+    """Estado de todos los subsistemas registrados: {nombre: estado}."""
+    return {s.nombre: s.estado() for s in registro_subsistemas}
+
+
+def imprimir_informe_arranque(segundos_nucleo):
+    """Resumen en consola del arranque: núcleo y cada subsistema con su tiempo y memoria."""
+    memoria = memoria_residente_mb()
+    print(f"[ARRANQUE] Núcleo listo en {segundos_nucleo:.2f}s"
+          + (f", {memoria:.0f} MB de RSS" if memoria is not None else ""))
+    for subsistema in registro_subsistemas:
+        estado = subsistema.estado()
+        detalle = estado['estado']
+        if estado['tiempo_carga_s'] is not None:
+            detalle += f" en {estado['tiempo_carga_s']:.2f}s"
+        if estado['memoria_mb'] is not None:
+            detalle += f" (+{estado['memoria_mb']:.0f} MB)"
+        if estado['error']:
+            detalle += f": {estado['error']}"
+        print(f"[ARRANQUE]   {subsistema.nombre:<7} {subsistema.variable + '=' + subsistema.modo:<21} {detalle}")
+
+
+# Registro de todos los subsistemas del proceso (cada Subsistema se añade al crearse)
+registro_subsistemas = []
@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+"""Configuración común de las pruebas: los módulos del servidor se importan por nombre."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
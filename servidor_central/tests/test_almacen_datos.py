@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Pruebas del almacén persistente por lotes (sin hilo escritor: se vuelca a mano)."""
+
+import sqlite3
+from collections import deque
+
+import pytest
+
+from almacen_datos import AlmacenDatos
+
+
+@pytest.fixture
+def almacen(tmp_path):
+    return AlmacenDatos(ruta=str(tmp_path / "registro.db"))
+
+
+def test_consultar_antes_de_iniciar_no_falla(almacen):
+    assert almacen.consultar_muestras(0, 1e12) == []
+    assert almacen.consultar_comandos(0, 1e12) == []
+
+
+def test_volcado_por_lotes_y_consulta(almacen):
+    for i in range(5):
+        almacen.registrar_muestra(100.0 + i, {'gas': 100 + i, 'temp': 20.5})
+    almacen.registrar_comando('texto', 'enciende la cocina', [{'lugar': 'cocina', 'accion': 'on', 'exito': True}])
+    conexion = almacen._conectar()
+    try:
+        almacen._volcar(conexion)
+    finally:
+        conexion.close()
+
+    muestras = almacen.consultar_muestras(101, 104)
+    assert [m['gas'] for m in muestras] == [101, 102, 103]
+    assert almacen.consultar_muestras(0, 1e12, limite=-1)[0]['ts'] == 100.0  # Acotado a 1, no "sin límite"
+    comandos = almacen.consultar_comandos(0, 1e12)
+    assert comandos[0]['lugar'] == 'cocina' and comandos[0]['exito'] == 1
+    assert almacen.estado()['muestras_escritas'] == 5
+    assert almacen.estado()['lotes'] == 1
+
+
+def test_lote_fallido_vuelve_a_la_cola(almacen):
+    almacen.registrar_muestra(1.0, {'gas': 1})
+    almacen.registrar_muestra(2.0, {'gas': 2})
+    conexion = sqlite3.connect(":memory:")  # Sin tablas: el INSERT falla
+    with pytest.raises(sqlite3.Error):
+        almacen._volcar(conexion)
+    assert [fila[0] for fila in almacen._muestras] == [1.0, 2.0]
+    assert almacen.estado()['lotes_fallidos'] == 1
+
+
+def test_devolver_con_la_cola_llena_descarta_las_mas_antiguas(almacen):
+    almacen._muestras = deque(maxlen=4)
+    lote = [(1.0,), (2.0,), (3.0,)]
+    # Mientras se escribía el lote llegaron tres filas nuevas
+    for instante in (4.0, 5.0, 6.0):
+        almacen._encolar(almacen._muestras, (instante,))
+    almacen._devolver(almacen._muestras, lote)
+    assert [fila[0] for fila in almacen._muestras] == [3.0, 4.0, 5.0, 6.0]
+    assert almacen.filas_descartadas == 2
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Pruebas del clasificador de intenciones por n-gramas (capa previa al LLM)."""
+
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+from clasificador_intenciones import ClasificadorIntenciones, firma_frases
+
+LUGARES = ['descanso', 'cocina', 'principal', 'cochera', 'habitacion', 'puerta', 'alarma']
+
+
+@pytest.fixture(scope='module')
+def clasificador(tmp_path_factory):
+    ruta = str(tmp_path_factory.mktemp('indice') / 'indice_intenciones.npz')
+    return ClasificadorIntenciones(LUGARES, ruta_indice=ruta).cargar()
+
+
+def acciones(resultado):
+    return [(a['accion'], a['lugar']) for a in resultado['acciones']]
+
+
+@pytest.mark.parametrize('texto, esperado', [
+    ("encinde la cosina", [('ON', 'cocina')]),               # Errores de Whisper
+    ("pon la luz del living", [('ON', 'principal')]),        # Sinónimo y nombre coloquial
+    ("quita la luz de la recamara", [('OFF', 'descanso')]),
+    ("apaga la cochera y la cocina", [('OFF', 'cochera'), ('OFF', 'cocina')]),
+    ("abre el porton", [('ABRIR', 'puerta')]),
+])
+def test_reconoce_variaciones(clasificador, texto, esperado):
+    resultado = clasificador.clasificar(texto)
+    assert resultado is not None
+    assert acciones(resultado) == esperado
+    assert resultado['confianza'] >= clasificador.umbral
+
+
+@pytest.mark.parametrize('texto', [
+    "que hora es",               # Palabras sin explicar
+    "enciende",                  # Sin lugar
+    "abre la cocina",            # Abrir/cerrar solo aplica a la puerta
+    "todas menos la cocina",     # Las exclusiones no se adivinan
+])
+def test_deja_al_llm_lo_que_no_reconoce(clasificador, texto):
+    assert clasificador.clasificar(texto) is None
+
+
+def test_indice_se_reutiliza_y_se_regenera_si_cambia_el_vocabulario(clasificador, tmp_path):
+    assert os.path.exists(clasificador.ruta_indice)
+    ruta = str(tmp_path / 'indice_intenciones.npz')
+    shutil.copy(clasificador.ruta_indice, ruta)
+    with np.load(ruta) as datos:
+        assert str(datos['firma']) == firma_frases(LUGARES)
+
+    otros = ClasificadorIntenciones(LUGARES + ['sotano'], ruta_indice=ruta).cargar()
+    with np.load(ruta) as datos:
+        assert str(datos['firma']) == firma_frases(LUGARES + ['sotano'])
+    assert acciones(otros.clasificar("enciende el sotano")) == [('ON', 'sotano')]
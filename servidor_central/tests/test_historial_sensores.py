@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+"""Pruebas del historial de sensores en buffers circulares."""
+
+import time
+
+import historial_sensores
+from historial_sensores import BufferCircular, HistorialSensores
+
+
+def test_buffer_lleno_conserva_el_orden_cronologico():
+    buffer = BufferCircular(capacidad=4)
+    for i in range(6):
+        buffer.escribir(float(i), i * 10)
+    datos = buffer.consultar(0.0, 10.0, 10)
+    assert datos['min'] == [20.0, 30.0, 40.0, 50.0]
+    assert sum(datos['n']) == 4
+
+
+def test_cubetas_ignoran_nan():
+    buffer = BufferCircular(capacidad=8)
+    for instante, valor in ((0.0, 1), (0.5, None), (1.0, 3), (1.5, 5)):
+        buffer.escribir(instante, valor)
+    datos = buffer.consultar(0.0, 2.0, 2)
+    assert datos['media'] == [1.0, 4.0]
+    assert datos['n'] == [2, 2]
+
+
+def test_salto_del_reloj_de_pared_no_rompe_las_consultas(monkeypatch):
+    historial = HistorialSensores(canales=('gas',), capacidad=16)
+    reloj = {'mono': 1000.0, 'pared': 1_700_000_000.0}
+    monkeypatch.setattr(historial_sensores.time, 'monotonic', lambda: reloj['mono'])
+    monkeypatch.setattr(historial_sensores.time, 'time', lambda: reloj['pared'])
+
+    for valor in (100, 110, 120):
+        historial.registrar({'gas': valor})
+        reloj['mono'] += 10
+        reloj['pared'] += 10
+    # El reloj de pared retrocede una hora (NTP / cambio de hora); el monotónico no
+    reloj['pared'] -= 3600
+    historial.registrar({'gas': 130})
+
+    ahora = reloj['pared']
+    datos = historial.consultar('gas', ahora - 60, ahora + 1, 60)
+    assert sum(datos['n']) == 4
+    assert datos['max'][-1] == 130.0
+    assert datos['t'] == sorted(datos['t'])
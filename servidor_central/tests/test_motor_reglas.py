@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""Pruebas de la máquina de estados de las reglas de automatización."""
+
+from motor_reglas import Regla
+
+
+def regla_gas(**opciones):
+    parametros = dict(nombre='g', canal='gas', operador='>', umbral=400, acciones=['sala:on'],
+                      histeresis=50, duracion=2, acciones_liberar=['sala:off'])
+    parametros.update(opciones)
+    return Regla(**parametros)
+
+
+def test_se_dispara_si_la_condicion_se_mantiene():
+    regla = regla_gas()
+    assert regla.evaluar(410, 0) == []
+    assert regla.evaluar(420, 1) == []
+    assert regla.evaluar(430, 2) == ['sala:on']
+    assert regla.estado == 'activa'
+
+
+def test_bajar_del_umbral_mientras_esta_pendiente_reinicia_la_espera():
+    regla = regla_gas()
+    assert regla.evaluar(410, 0) == []
+    # 360 no llega a liberar (<= 350) pero ya no cumple '> 400': se vuelve a empezar
+    assert regla.evaluar(360, 1) == []
+    assert regla.evaluar(360, 2) == []
+    assert regla.estado == 'inactiva'
+    assert regla.evaluar(410, 3) == []
+    assert regla.evaluar(410, 4.5) == []
+    assert regla.evaluar(410, 5) == ['sala:on']
+
+
+def test_activa_solo_se_libera_al_cruzar_la_histeresis():
+    regla = regla_gas(duracion=0)
+    assert regla.evaluar(410, 0) == ['sala:on']
+    assert regla.evaluar(360, 1) == []
+    assert regla.estado == 'activa'
+    assert regla.evaluar(350, 2) == ['sala:off']
+    assert regla.estado == 'inactiva'
+    assert regla.liberaciones == 1
+
+
+def test_enfriamiento_retrasa_el_segundo_disparo():
+    regla = regla_gas(duracion=0, enfriamiento=30)
+    assert regla.evaluar(410, 0) == ['sala:on']
+    assert regla.evaluar(300, 1) == ['sala:off']
+    assert regla.evaluar(410, 2) == []
+    assert regla.estado == 'pendiente'
+    assert regla.evaluar(410, 30) == ['sala:on']
+    assert regla.disparos == 2
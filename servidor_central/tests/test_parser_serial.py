@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+"""Pruebas del intérprete de tramas seriales del Arduino."""
+
+import math
+
+from parser_serial import interpretar_linea
+
+
+def test_trama_completa():
+    lectura = interpretar_linea("Distancia: 45cm | Gas: 120 | Temp: 24.50C | Hum: 60.00%", timestamp=1.0)
+    assert (lectura.distancia, lectura.gas, lectura.temp, lectura.hum) == (45, 120, 24.5, 60.0)
+    assert lectura.timestamp == 1.0
+    assert lectura.descartados == 0
+
+
+def test_nan_del_dht22_se_conserva():
+    lectura = interpretar_linea("Distancia: 12cm | Gas: 135 | Temp: nanC | Hum: nan%")
+    assert math.isnan(lectura.temp) and math.isnan(lectura.hum)
+    assert lectura.campos() == {'gas': 135, 'temp': None, 'hum': None, 'distancia': 12}
+
+
+def test_lineas_sin_campos():
+    assert interpretar_linea("--- Puerta Abierta por Proximidad ---") is None
+    assert interpretar_linea("Distancia: ---") is None
+
+
+def test_valor_corrupto_se_descarta_sin_quedarse_con_el_prefijo():
+    lectura = interpretar_linea("Gas: 12a0 | Temp: 24.5.3C | Hum: 55.00%")
+    assert lectura.gas is None
+    assert lectura.temp is None
+    assert lectura.hum == 55.0
+    assert lectura.descartados == 2
+
+
+def test_unidad_de_otro_campo_o_negativos_son_corruptos():
+    lectura = interpretar_linea("Distancia: 45% | Gas: -3 | Temp: 21.0cm")
+    assert lectura.campos() == {}
+    assert lectura.descartados == 3
+
+
+def test_nan_en_campos_enteros_es_corrupto():
+    lectura = interpretar_linea("ALERTA | Gas: nan")
+    assert lectura.gas is None
+    assert lectura.descartados == 1
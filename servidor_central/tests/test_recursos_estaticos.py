@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""Pruebas del pipeline de recursos estáticos del panel (minificación y versionado)."""
+
+import gzip
+
+import pytest
+
+from recursos_estaticos import Recurso, minificar_css, minificar_js
+
+
+def test_js_quita_sangria_y_comentarios_pero_conserva_saltos():
+    fuente = """
+    // Comentario de línea
+    const a = 1;   /* bloque */ const b = 2;
+    /* bloque
+       de varias líneas */
+    const url = 'http://x/y'; // comentario final
+    """
+    assert minificar_js(fuente) == "const a = 1;    const b = 2;\nconst url = 'http://x/y'; // comentario final"
+
+
+def test_js_no_toca_plantillas_de_varias_lineas():
+    fuente = "const html = `\n    <li>\n    // no es un comentario\n    /* tampoco */\n`;\n    siguiente();"
+    assert minificar_js(fuente) == "const html = `\n    <li>\n    // no es un comentario\n    /* tampoco */\n`;\nsiguiente();"
+
+
+def test_js_comillas_con_escapes_y_marcadores_de_comentario():
+    fuente = "    const s = \"a \\\" /* no */ b\"; const t = 'x // y';"
+    assert minificar_js(fuente) == "const s = \"a \\\" /* no */ b\"; const t = 'x // y';"
+
+
+@pytest.mark.parametrize('fuente', ["const t = `sin cerrar\nx;", "f(); /* sin cerrar\nx;"])
+def test_js_desincronizado_lanza_error(fuente):
+    with pytest.raises(ValueError):
+        minificar_js(fuente)
+
+
+def test_css_compacta():
+    assert minificar_css("a {\n  color: red;\n  /* x */ margin: 0 ;\n}\n") == "a{color:red;margin:0}"
+
+
+def test_recurso_versionado_y_variantes():
+    contenido = b"body{color:red}" * 50
+    recurso = Recurso('style.css', contenido, 'text/css; charset=utf-8')
+    assert recurso.nombre_versionado.startswith('style.') and recurso.nombre_versionado.endswith('.css')
+    assert gzip.decompress(recurso.variantes['gzip']) == contenido
+
+    codificacion, datos, etag = recurso.elegir(lambda c: c == 'gzip')
+    assert (codificacion, datos) == ('gzip', recurso.variantes['gzip'])
+    assert etag == f"{recurso.hash}-gzip"
+    assert recurso.elegir(lambda c: False)[0] == 'identity'
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+Módulo para ejecutar comandos de voz y de texto como trabajos asíncronos.
+
+La petición HTTP solo encola el trabajo y responde al instante con su id; un grupo
+acotado de hilos hace la cadena larga (decodificar, Whisper, IA, hardware). Cada log
+y cada etapa completada se publican como eventos numerados del trabajo, que el
+panel recoge por long-polling (`?desde=N`) o por un flujo SSE a medida que ocurren.
+"""
+
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from registro_eventos import ERROR, RegistroPeticion, registrar
+
+# --- Constantes de Configuración de los Trabajos ---
+MAX_TRABAJADORES = 2      # Whisper y Ollama ya serializan internamente; más hilos solo esperan
+MAX_EN_COLA = 16
+MAX_TRABAJOS_GUARDADOS = 200
+TTL_TRABAJOS = 600        # Segundos que se conserva un trabajo terminado para consultarlo
+
+
+class Trabajo:
+    """Un comando en curso: estado, etapa actual y la secuencia de eventos emitidos."""
+
+    def __init__(self, tipo):
+        self.id = uuid.uuid4().hex[:12]
+        self.tipo = tipo
+        self.estado = 'en_cola'   # en_cola -> en_proceso -> completado | error
+        self.etapa = None
+        self.resultado = None
+        self.creado = time.time()
+        self.terminado = None
+        self.eventos = []
+        # Cada log va al registro compartido (con el id del trabajo) y se publica como evento
+        self.logs = RegistroPeticion(self.id, al_publicar=lambda ev: self.publicar({'tipo': 'log', 'texto': ev.linea()}))
+        self._condicion = threading.Condition()
+
+    def publicar(self, evento):
+        with self._condicion:
+            evento['n'] = len(self.eventos)
+            evento['t'] = round(time.time() - self.creado, 3)
+            self.eventos.append(evento)
+            self._condicion.notify_all()
+
+    def progreso(self, etapa, datos=None):
+        """Callback de etapa para las funciones del pipeline ('transcrito', 'intencion', 'accion'...)."""
+        self.etapa = etapa
+        self.publicar({'tipo': 'etapa', 'etapa': etapa, 'datos': datos})
+
+    def finalizar(self, estado, resultado):
+        self.resultado = resultado
+        self.terminado = time.time()
+        self.estado = estado
+        self.publicar({'tipo': 'fin', 'estado': estado})
+
+    @property
+    def activo(self):
+        return self.estado in ('en_cola', 'en_proceso')
+
+    def esperar_eventos(self, desde, timeout):
+        """
+        Bloquea hasta que haya eventos con número >= `desde` o venza el plazo.
+
+        Returns:
+            list: Los eventos nuevos (posiblemente vacía).
+        """
+        with self._condicion:
+            self._condicion.wait_for(lambda: len(self.eventos) > desde or not self.activo, timeout=timeout)
+            return self.eventos[desde:]
+
+    def resumen(self, desde=0):
+        return {
+            'job_id': self.id,
+            'tipo': self.tipo,
+            'estado': self.estado,
+            'etapa': self.etapa,
+            'eventos': self.eventos[desde:],
+            'siguiente': len(self.eventos),
+            'resultado': self.resultado,
+            'duracion_s': round((self.terminado or time.time()) - self.creado, 3),
+        }
+
+
+class GestorTrabajos:
+    """
+    Cola acotada de trabajos atendida por un grupo fijo de hilos.
+    """
+
+    def __init__(self, max_trabajadores=MAX_TRABAJADORES, max_en_cola=MAX_EN_COLA):
+        self.max_en_cola = max_en_cola
+        self._ejecutor = ThreadPoolExecutor(max_workers=max_trabajadores, thread_name_prefix="trabajo")
+        self._trabajos = OrderedDict()
+        self._lock = threading.Lock()
+        self._pendientes = 0
+
+        self.completados = 0
+        self.fallidos = 0
+        self.rechazados = 0
+
+    def enviar(self, tipo, funcion, *args):
+        """
+        Encola `funcion(*args, logs, progreso)`, que debe devolver (estado, resultado).
+
+        Returns:
+            Trabajo | None: None si la cola está llena.
+        """
+        trabajo = Trabajo(tipo)
+        with self._lock:
+            if self._pendientes >= self.max_en_cola:
+                self.rechazados += 1
+                return None
+            self._pendientes += 1
+            self._purgar()
+            self._trabajos[trabajo.id] = trabajo
+        self._ejecutor.submit(self._ejecutar, trabajo, funcion, args)
+        return trabajo
+
+    def _ejecutar(self, trabajo, funcion, args):
+        trabajo.estado = 'en_proceso'
+        trabajo.publicar({'tipo': 'estado', 'estado': 'en_proceso'})
+        try:
+            estado, resultado = funcion(*args, trabajo.logs, trabajo.progreso)
+            trabajo.finalizar('completado' if estado != 'error' else 'error', resultado)
+            with self._lock:
+                self.completados += 1
+        except Exception as e:
+            traceback.print_exc()
+            registrar(trabajo.logs, ERROR, 'ERROR_TRABAJO', "%r", e)
+            trabajo.finalizar('error', {'status': 'error', 'message': str(e)})
+            with self._lock:
+                self.fallidos += 1
+        finally:
+            with self._lock:
+                self._pendientes -= 1
+
+    def _purgar(self):
+        """Descarta trabajos terminados caducados o que exceden el máximo guardado."""
+        limite = time.time() - TTL_TRABAJOS
+        for id_trabajo, trabajo in list(self._trabajos.items()):
+            caducado = trabajo.terminado is not None and trabajo.terminado < limite
+            if not (caducado or (len(self._trabajos) >= MAX_TRABAJOS_GUARDADOS and not trabajo.activo)):
+                continue
+            del self._trabajos[id_trabajo]
+
+    def obtener(self, id_trabajo):
+        with self._lock:
+            return self._trabajos.get(id_trabajo)
+
+    def estado(self):
+        with self._lock:
+            return {
+                'pendientes': self._pendientes,
+                'guardados': len(self._trabajos),
+                'completados': self.completados,
+                'fallidos': self.fallidos,
+                'rechazados': self.rechazados,
+            }
+
+
+# Instancia única para todo el proceso
+gestor_trabajos = GestorTrabajos()